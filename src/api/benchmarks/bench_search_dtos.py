@@ -0,0 +1,87 @@
+"""
+Micro-benchmark for the search response path in `dtos.py`.
+
+Loads `--rows` titles into an in-memory SQLite database and serializes them to JSON two ways:
+
+    orm   session.query(Titles).all(), FastAPI's jsonable_encoder, json.dumps (the old endpoints)
+    dto   Core select into TitleRow slots dataclasses, orjson.dumps (search_rows + rows_response)
+
+Database time is included in both, so the difference is the per-row allocation and
+serialization cost. Run it from `src/api`:
+
+    python -m benchmarks.bench_search_dtos --rows 50000
+"""
+
+import argparse
+import json
+import time
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from dtos import search_rows
+from models import Titles
+
+
+def make_engine(rows):
+    """
+    An in-memory SQLite engine with a `relational.titles` table of `rows` synthetic titles.
+    """
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+
+    @event.listens_for(engine, "connect")
+    def attach_relational(dbapi_connection, connection_record):
+        dbapi_connection.execute("ATTACH DATABASE ':memory:' AS relational")
+
+    Titles.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(Titles.__table__.insert(), [{
+            'content_id': f'tm{i}', 'title': f'Title {i}', 'content_type': 'movie' if i % 3 else 'show',
+            'release_year': 1950 + i % 73, 'age_certification': 'PG-13', 'runtime': 30 + i % 150,
+            'number_of_seasons': None if i % 3 else 1 + i % 8, 'imdb_id': f'tt{i:07d}',
+            'imdb_score': round(1 + (i % 90) / 10, 1), 'imdb_votes': i * 7, 'is_year_best': i % 50 == 0,
+            'is_all_time_best': i % 200 == 0,
+        } for i in range(rows)])
+    return engine
+
+
+def orm_response(engine):
+    with Session(engine) as session:
+        results = session.query(Titles).all()
+        return json.dumps(jsonable_encoder(results)).encode()
+
+
+def dto_response(engine):
+    with Session(engine) as session:
+        return orjson.dumps(search_rows(session, Titles, {}))
+
+
+def best_time(fn, engine, repeat):
+    """Return the best wall time of `fn(engine)` in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(engine)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    engine = make_engine(args.rows)
+    assert json.loads(orm_response(engine)) == json.loads(dto_response(engine))
+    orm_s = best_time(orm_response, engine, args.repeat)
+    dto_s = best_time(dto_response, engine, args.repeat)
+    print(f'rows={args.rows}, best of {args.repeat}')
+    print(f'titles search    orm {orm_s * 1000:9.2f} ms   dto {dto_s * 1000:9.2f} ms   {orm_s / dto_s:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
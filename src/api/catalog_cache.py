@@ -0,0 +1,213 @@
+"""
+In-process read-through cache of the catalog tables: titles, genres and prod_countries.
+
+The catalog changes rarely and is read on almost every search and recommendation. The cache
+keeps an immutable, versioned `CatalogSnapshot` of the three tables, keyed by content_id.
+Refreshing builds a new snapshot and swaps it in with one assignment, so readers never see
+a half-loaded catalog and never wait on a lock.
+
+Writes invalidate single keys. An invalidated key is read from the database on its next
+lookup (read-through) and served from a small overlay until the next full refresh. Whole
+tables can be invalidated too, and the next lookup then reloads the snapshot. Only one lookup
+reloads at a time; the others keep serving the current snapshot meanwhile. Hits, misses and
+refreshes are counted for `stats()`.
+"""
+
+import logging
+import threading
+import time
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+CATALOG_TABLES = ('titles', 'genres', 'prod_countries')
+
+# Rows are grouped by content_id; titles has one row per key, the others a list.
+SNAPSHOT_QUERIES = {
+    'titles': "SELECT * FROM relational.titles;",
+    'genres': "SELECT * FROM relational.genres ORDER BY content_id, genre;",
+    'prod_countries': "SELECT * FROM relational.prod_countries ORDER BY content_id, country;",
+}
+KEY_QUERIES = {
+    'titles': "SELECT * FROM relational.titles WHERE content_id = :content_id;",
+    'genres': "SELECT * FROM relational.genres WHERE content_id = :content_id ORDER BY genre;",
+    'prod_countries': "SELECT * FROM relational.prod_countries WHERE content_id = :content_id ORDER BY country;",
+}
+
+
+def group_rows(table, rows):
+    """
+    Key rows by content_id: a row per title, a tuple of rows per title for the other tables.
+
+    Parameters:
+        table (str): One of `CATALOG_TABLES`.
+        rows (iterable): Row mappings.
+
+    Returns:
+        dict: content_id -> row dict (titles) or tuple of row dicts.
+    """
+    if table == 'titles':
+        return {row['content_id']: dict(row) for row in rows}
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row['content_id'], []).append(dict(row))
+    return {content_id: tuple(group) for content_id, group in grouped.items()}
+
+
+class CatalogSnapshot:
+    """
+    One consistent copy of the catalog tables. Never modified after it is built.
+
+    Parameters:
+        version (int): Increases with every refresh.
+        tables (dict): Table name -> content_id -> row(s), see `group_rows`.
+    """
+
+    __slots__ = ('version', 'tables', 'loaded_at')
+
+    def __init__(self, version, tables):
+        self.version = version
+        self.tables = tables
+        self.loaded_at = time.time()
+
+
+class CatalogCache:
+    """
+    Read-through cache over a `CatalogSnapshot`.
+
+    Parameters:
+        engine (Engine): SQLAlchemy engine used to load snapshots and invalidated keys.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.snapshot = CatalogSnapshot(0, {table: {} for table in CATALOG_TABLES})
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        # Held by the lookup that reloads the snapshot, see `_refresh_once`.
+        self._refreshing = threading.Lock()
+        # Invalidation sequence numbers let a refresh keep invalidations that arrive while it loads.
+        self._sequence = 0
+        self._stale = {table: {} for table in CATALOG_TABLES}
+        self._overlay = {table: {} for table in CATALOG_TABLES}
+        self._stale_tables = {}
+
+    def _load_tables(self):
+        with self.engine.connect() as conn:
+            return {table: group_rows(table, conn.execute(text(query)).mappings())
+                    for table, query in SNAPSHOT_QUERIES.items()}
+
+    def _load_key(self, table, content_id):
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(KEY_QUERIES[table]), {'content_id': content_id}).mappings().all()
+        return group_rows(table, rows).get(content_id, None if table == 'titles' else ())
+
+    def refresh(self):
+        """
+        Load a new snapshot from the database and swap it in.
+
+        Returns:
+            int: The version of the new snapshot.
+        """
+        with self._lock:
+            started_at = self._sequence
+        tables = self._load_tables()
+        with self._lock:
+            snapshot = CatalogSnapshot(self.snapshot.version + 1, tables)
+            for table in CATALOG_TABLES:
+                self._stale[table] = {key: seq for key, seq in self._stale[table].items() if seq > started_at}
+                self._overlay[table] = {key: value for key, value in self._overlay[table].items()
+                                        if key in self._stale[table]}
+            self._stale_tables = {table: seq for table, seq in self._stale_tables.items() if seq > started_at}
+            self.snapshot = snapshot
+            self.loaded = True
+            self.refreshes += 1
+        logger.info(f"Catalog snapshot v{snapshot.version} loaded: "
+                    + ", ".join(f"{len(rows)} {table}" for table, rows in tables.items()) + ".")
+        return snapshot.version
+
+    def _refresh_once(self):
+        """
+        Refresh unless another lookup already is. Before the first load there is nothing to
+        serve, so lookups then wait for the refresh instead.
+        """
+        if not self._refreshing.acquire(blocking=not self.loaded):
+            return
+        try:
+            # The lookup may have waited on one that already refreshed.
+            if not self.loaded or self._stale_tables:
+                self.refresh()
+        finally:
+            self._refreshing.release()
+
+    def invalidate(self, table, content_id=None):
+        """
+        Mark one key, or a whole table, as changed in the database.
+
+        Parameters:
+            table (str): One of `CATALOG_TABLES`; other tables are ignored.
+            content_id (str, optional): The changed key. None invalidates the whole table.
+        """
+        if table not in CATALOG_TABLES:
+            return
+        with self._lock:
+            self._sequence += 1
+            if content_id is None:
+                self._stale_tables[table] = self._sequence
+            else:
+                self._stale[table][content_id] = self._sequence
+                self._overlay[table].pop(content_id, None)
+
+    def get(self, table, content_id):
+        """
+        Look up the row(s) of `content_id` in `table`.
+
+        Parameters:
+            table (str): One of `CATALOG_TABLES`.
+            content_id (str): The key.
+
+        Returns:
+            dict or tuple: The title row, or the tuple of genre / prod_country rows. None (titles)
+                or an empty tuple if there are none. Do not modify the returned rows.
+        """
+        if not self.loaded or self._stale_tables:
+            self._refresh_once()
+        overlay = self._overlay[table]
+        if content_id in overlay:
+            self.hits += 1
+            return overlay[content_id]
+        sequence = self._stale[table].get(content_id)
+        if sequence is not None:
+            self.misses += 1
+            value = self._load_key(table, content_id)
+            with self._lock:
+                # Keep the value only if the key was not invalidated again while it loaded.
+                if self._stale[table].get(content_id) == sequence:
+                    self._overlay[table][content_id] = value
+            return value
+        self.hits += 1
+        return self.snapshot.tables[table].get(content_id, None if table == 'titles' else ())
+
+    def stats(self):
+        """
+        Cache metrics for monitoring.
+
+        Returns:
+            dict: Snapshot version and age, entry counts, hits, misses, hit rate and refreshes.
+        """
+        snapshot = self.snapshot
+        lookups = self.hits + self.misses
+        return {
+            'version': snapshot.version,
+            'age_seconds': round(time.time() - snapshot.loaded_at, 1),
+            'entries': {table: len(rows) for table, rows in snapshot.tables.items()},
+            'invalidated_keys': sum(len(keys) for keys in self._stale.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'refreshes': self.refreshes,
+        }
@@ -0,0 +1,160 @@
+"""
+Cross-worker cache invalidation through Postgres LISTEN/NOTIFY.
+
+Migration 007 makes every write to the cached relational tables NOTIFY the relational_changes
+channel with the table and key that changed. Each web API worker runs one `ChangeListener`: an
+asyncio task on its own connection that waits for the socket to become readable and passes
+each notification to a handler, which evicts the entry from the worker's caches. A write made
+by any worker is therefore seen by all of them within one notification round trip, and
+cached reads no longer have to be checked against the database.
+
+Notifications sent while a listener is disconnected are lost. After a reconnect the handler
+is therefore called with table None, which means "drop everything".
+"""
+
+import asyncio
+import json
+import logging
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'relational_changes'
+
+
+def parse_notification(payload):
+    """
+    Decode a relational_changes payload.
+
+    Parameters:
+        payload (str): JSON with table, op and key, as sent by relational.notify_change().
+
+    Returns:
+        tuple: (table, key). key is None for a TRUNCATE; table is None if the payload is not
+            understood, so the caller drops everything rather than keep stale entries.
+    """
+    try:
+        change = json.loads(payload)
+        return change['table'], change.get('key')
+    except (ValueError, TypeError, KeyError):
+        logger.warning(f"Unreadable change notification {payload!r}, invalidating everything.")
+        return None, None
+
+
+class ChangeListener:
+    """
+    Listens on a NOTIFY channel and calls `handler(table, key)` for every change.
+
+    Parameters:
+        engine (Engine): SQLAlchemy engine whose URL the listener connects with. The listener
+            uses its own connection, not one from the engine's pool.
+        handler (callable): Called with (table, key); (table, None) for a whole table and
+            (None, None) for everything.
+        channel (str, optional): The channel to LISTEN on. Default is `CHANNEL`.
+        reconnect_delay (float, optional): Seconds between reconnect attempts, doubled up to
+            a minute while the database stays unreachable. Default is 1.0.
+        keepalive (float, optional): Ping the connection after this many quiet seconds. Default is 30.
+    """
+
+    def __init__(self, engine, handler, channel=CHANNEL, reconnect_delay=1.0, keepalive=30.0):
+        self.engine = engine
+        self.handler = handler
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.keepalive = keepalive
+        self.connection = None
+        self.task = None
+        self.received = 0
+
+    def _connect(self):
+        connection = psycopg2.connect(**self.engine.url.translate_connect_args(username='user', database='dbname'))
+        connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel};")
+        return connection
+
+    async def start(self):
+        """
+        Connect, LISTEN and start the listener task.
+
+        The first LISTEN is done before returning, so a cache loaded after `start` cannot miss
+        a change. If the database is unreachable the task keeps retrying in the background.
+        """
+        try:
+            self.connection = await asyncio.to_thread(self._connect)
+        except psycopg2.Error as e:
+            logger.error(f"Change listener could not connect, retrying in the background: {e}")
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self._close()
+
+    def _close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except psycopg2.Error:
+                pass
+        self.connection = None
+
+    def _ping(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT 1;")
+
+    def dispatch(self):
+        """
+        Read pending notifications from the connection and hand them to the handler.
+        """
+        self.connection.poll()
+        while self.connection.notifies:
+            notification = self.connection.notifies.pop(0)
+            self.received += 1
+            self._handle(*parse_notification(notification.payload))
+
+    def _handle(self, table, key):
+        # A failing handler must not take the listener down with it.
+        try:
+            self.handler(table, key)
+        except Exception as e:
+            logger.error(f"Change handler failed for {table} {key}: {e}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        delay = self.reconnect_delay
+        while True:
+            if self.connection is None:
+                try:
+                    self.connection = await asyncio.to_thread(self._connect)
+                except psycopg2.Error as e:
+                    logger.warning(f"Change listener reconnect failed, next try in {delay:.0f}s: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 60)
+                    continue
+                logger.info(f"Change listener reconnected to {self.channel}.")
+                self._handle(None, None)
+            delay = self.reconnect_delay
+            readable = asyncio.Event()
+            fileno = self.connection.fileno()
+            loop.add_reader(fileno, readable.set)
+            try:
+                while True:
+                    try:
+                        await asyncio.wait_for(readable.wait(), timeout=self.keepalive)
+                    except asyncio.TimeoutError:
+                        # A quiet channel and a dead connection look the same; a ping tells them apart.
+                        await asyncio.to_thread(self._ping)
+                    readable.clear()
+                    self.dispatch()
+            except psycopg2.Error as e:
+                logger.error(f"Change listener lost its connection: {e}")
+                self._close()
+            finally:
+                loop.remove_reader(fileno)
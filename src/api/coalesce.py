@@ -0,0 +1,146 @@
+"""
+Single-flight coalescing of identical concurrent queries.
+
+During a traffic spike many clients send the same search filter at the same moment. A
+`SingleFlight` makes the first request for a key run the query. Requests with the same key that
+arrive while it runs wait for it and share its result, or its exception, instead of sending
+their own query to Postgres. With a `ttl`, a result is also reused for that many seconds after
+it completes. Keep the ttl short; `clear` drops the kept results when the data changes.
+
+The web API's sync endpoints run in a thread pool, so the coordination uses threads.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_filter(non_none_filter):
+    """
+    A canonical string for a search filter: keys sorted and `_in` lists treated as sets.
+
+    Parameters:
+        non_none_filter (dict): The filter without its None fields.
+
+    Returns:
+        str: Equal for filters that select the same rows.
+    """
+    normalized = {key: sorted(set(value), key=str) if isinstance(value, list) else value
+                  for key, value in non_none_filter.items()}
+    return json.dumps(normalized, sort_keys=True, default=str)
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Shares one in-flight execution, and optionally its recent result, per key.
+
+    Parameters:
+        ttl (float, optional): Seconds a completed result keeps being served. Default is 0, i.e.
+            only requests that overlap the running query share it.
+        max_entries (int, optional): Completed results kept for the ttl, oldest evicted first.
+            Default is 1024.
+    """
+
+    def __init__(self, ttl=0.0, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.executed = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._results = OrderedDict()
+        # Bumped by `clear`, so a query that started before a change does not keep its result.
+        self._generation = 0
+        self.cleared_at = None
+
+    def run(self, endpoint, non_none_filter, query, scope=None, keep=True):
+        """
+        Run `query()` for this endpoint and filter, or share a running or recent identical one.
+
+        Parameters:
+            endpoint (str): Namespace of the key, e.g. '/title/search/'.
+            non_none_filter (dict): The filter; `normalize_filter` turns it into the key.
+            query (callable): Runs the query and returns its result.
+            scope (optional): Also part of the key, e.g. the engine the query reads from, so
+                results read from different sources are not shared. Default is None.
+            keep (bool, optional): Keep the result for the ttl. If False it is only shared with
+                requests that overlap the query. Default is True.
+
+        Returns:
+            The result of `query()`, possibly from another request.
+        """
+        key = (endpoint, scope, normalize_filter(non_none_filter))
+        with self._lock:
+            if self.ttl > 0 and key in self._results:
+                expires_at, result = self._results[key]
+                if expires_at > time.monotonic():
+                    self.cache_hits += 1
+                    return result
+                del self._results[key]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                generation = self._generation
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = query()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                if keep and self.ttl > 0 and call.error is None and generation == self._generation:
+                    self._results[key] = (time.monotonic() + self.ttl, call.result)
+                    self._results.move_to_end(key)
+                    while len(self._results) > self.max_entries:
+                        self._results.popitem(last=False)
+            call.done.set()
+        return call.result
+
+    def clear(self):
+        """
+        Drop all completed results kept for the ttl. Queries in flight may have read the old
+        data: later requests do not join them, and their results are not kept.
+        """
+        with self._lock:
+            self._generation += 1
+            self.cleared_at = time.monotonic()
+            self._results.clear()
+            self._calls.clear()
+
+    def cleared_within(self, seconds):
+        """
+        Whether `clear` was called in the last `seconds`.
+        """
+        return self.cleared_at is not None and time.monotonic() - self.cleared_at < seconds
+
+    def stats(self):
+        """
+        Returns:
+            dict: Queries executed, requests that shared an in-flight query, ttl hits.
+        """
+        return {'executed': self.executed, 'coalesced': self.coalesced, 'cache_hits': self.cache_hits,
+                'in_flight': len(self._calls), 'ttl': self.ttl}
@@ -0,0 +1,34 @@
+"""
+Engines for the batch jobs and command-line tools (reco_batch, two_stage, similarity, evaluate,
+sketches), which connect as ds_user with a small pool of their own instead of through
+db_local_api.
+"""
+
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+
+from routing import read_engine
+
+load_dotenv()
+
+
+def connect_to_db(pool_size=1, replica=False):
+    """
+    Create an engine for the ds_user account using information from environment variables.
+
+    Parameters:
+        pool_size (int, optional): Connections kept open by the engine. Default is 1.
+        replica (bool, optional): Connect to a healthy replica from DB_REPLICA_URLS, if there
+            is one, for reads only (see routing.py). Default is False, the primary.
+
+    Returns:
+        Engine object: SQLAlchemy engine.
+    """
+    db_url = f"postgresql+psycopg2://{os.getenv('DS_USER')}:{os.getenv('DS_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
+    options = dict(pool_size=pool_size, max_overflow=0, pool_pre_ping=True,
+                   connect_args={'options': '-c search_path=relational'})
+    if replica:
+        return read_engine(db_url, **options)
+    return create_engine(os.getenv('DB_PRIMARY_URL') or db_url, **options)
@@ -12,11 +12,18 @@ import logging
 
 from dotenv import load_dotenv
 import pandas as pd
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
 
 from tabulate import tabulate
 
+from prepared import PreparedStatement
+from profiling import QueryProfiler
+from result_cache import ResultCache
+from routing import ReplicaRouter
+from schema_dtypes import compact_dtypes
+import sketches
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -31,42 +38,57 @@ class _db_api:
         """
         Initialize the _db_api class and connect to the database.
         """
-        self.engine = self.connect_to_db()
-        self.set_search_path()
+        self.router = self.connect_to_db()
+        self.engine = self.router.primary
+        self.router.start()
 
     def connect_to_db(self):
         """
-        Connect to the PostgreSQL database using information from environment variables.
+        Connect to the PostgreSQL primary, and any replicas in DB_REPLICA_URLS, using information
+        from environment variables. Every connection uses the 'relational' schema.
 
         Returns:
-            Engine object: SQLAlchemy engine.
+            ReplicaRouter: Router over the primary and replica engines, see routing.py.
         """
         db_url = f"postgresql+psycopg2://{os.getenv('DS_USER')}:{os.getenv('DS_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
-        return create_engine(db_url)
+        return ReplicaRouter.from_env(db_url, pool_pre_ping=True,
+                                      connect_args={'options': '-c search_path=relational'})
 
-    def set_search_path(self):
+    @staticmethod
+    def _execute(conn, query, params=None):
         """
-        Set the search path for the current connection to use the 'relational' schema.
+        Execute a query string through `text()`, or a `PreparedStatement` by name.
         """
-        with self.engine.begin() as conn:
-            conn.execute(text("SET search_path TO relational;"))
+        if isinstance(query, PreparedStatement):
+            return query.execute(conn, params)
+        return conn.execute(text(query).bindparams(**params if params else {}))
 
-    def _read(self, query, params=None):
+    def _read(self, query, params=None, primary=False):
         """
-        Execute a SQL read query and return the result.
+        Execute a SQL read query on a replica, or on the primary if there is no healthy one or
+        this process wrote within the DB_READ_YOUR_WRITES window, and return the result.
 
         Parameters:
-            query (str): The SQL query to execute.
+            query (str or PreparedStatement): The SQL query to execute.
             params (dict, optional): Parameters for the SQL query.
+            primary (bool, optional): Read from the primary regardless. Default is False.
 
         Returns:
             Tuple: Result data and columns names.
         """
+        engine = self.engine if primary else self.router.reader()
         try:
-            with self.engine.connect() as conn:
-                result = conn.execute(text(query).bindparams(**params if params else {}))
+            with engine.connect() as conn:
+                result = self._execute(conn, query, params)
                 data = result.fetchall()
                 columns = result.keys()
+        except DBAPIError as e:
+            if engine is self.engine or not e.connection_invalidated:
+                logger.error(f"Query caused this error: {e}")
+                return None, None
+            # The replica went away; take it out of rotation and read from another.
+            self.router.mark_failed(engine)
+            return self._read(query, params)
         except SQLAlchemyError as e:
             logger.error(f"Query caused this error: {e}")
             data, columns = None, None
@@ -77,47 +99,180 @@ class _db_api:
         Execute a SQL write query.
 
         Parameters:
-            query (str): The SQL query to execute.
+            query (str or PreparedStatement): The SQL query to execute.
             params (dict, optional): Parameters for the SQL query.
+
+        Returns:
+            list: Rows returned by the statement (e.g. INSERT ... RETURNING), None if it returned none.
         """
+        rows = None
+        self.router.record_write()
         try:
             with self.engine.begin() as conn:
-                conn.execute(text(query).bindparams(**params if params else {}))
+                result = self._execute(conn, query, params)
+                if result.returns_rows:
+                    rows = result.fetchall()
             logger.info("Data written to database.")
         except SQLAlchemyError as e:
             logger.error(f"Failed to write to database due to this error: {e}")
+        return rows
 
 _api = _db_api()
 
+# Opt-in statement profiling of the primary and the replicas, see profiling.py. DB_PROFILE=1
+# enables it at import.
+profiler = QueryProfiler(_api.router.engines, slow_ms=float(os.getenv('DB_PROFILE_SLOW_MS', 100)))
+if os.getenv('DB_PROFILE'):
+    profiler.enable()
+
+# Optional result cache for `read`, see result_cache.py. DB_RESULT_CACHE=1 turns it on for every read.
+result_cache = ResultCache(max_entries=int(os.getenv('DB_RESULT_CACHE_SIZE', 128)),
+                           ttl=float(os.getenv('DB_RESULT_CACHE_TTL', 300)),
+                           persist_dir=os.getenv('DB_RESULT_CACHE_DIR'))
+
 def read(query, **kwargs):
     """
     Read data from the database and return it as a DataFrame.
 
     Parameters:
-        query (str): The SQL query to execute.
+        query (str or PreparedStatement): The SQL query to execute.
         **kwargs:
             params (dict, optional): Parameters for the SQL query.
             verbose (bool, optional): If True, print the result. Default is True.
+            compact (bool, optional): If True, cast relational columns to the categorical and
+                downcast dtypes in `schema_dtypes`. Default is False.
+            cache (bool, optional): If True, serve the result from `result_cache` when an
+                identical query was read recently. Default is True if DB_RESULT_CACHE is set.
 
     Returns:
         DataFrame: The result of the query.
     """
-    data, columns = _api._read(query, params=kwargs.get('params'))
-    if data is None or columns is None:
-        logger.error("Query returned None.")
-        return None
-    df = pd.DataFrame(data, columns=columns)
+    params = kwargs.get('params')
+    use_cache = kwargs.get('cache', bool(os.getenv('DB_RESULT_CACHE')))
+    sql = getattr(query, 'query', query)
+    df = result_cache.get(sql, params) if use_cache else None
+    if df is None:
+        # A replica may be up to DB_REPLICA_MAX_LAG seconds behind. Caching what it returns
+        # right after a write would serve the pre-write result for the whole TTL, so cached
+        # reads use the primary for that long after any write.
+        primary = use_cache and _api.router.wrote_within(_api.router.max_lag)
+        data, columns = _api._read(query, params=params, primary=primary)
+        if data is None or columns is None:
+            logger.error("Query returned None.")
+            return None
+        df = pd.DataFrame(data, columns=columns)
+        if use_cache:
+            result_cache.put(sql, params, df)
+    if kwargs.get('compact', False):
+        df = compact_dtypes(df)
     if kwargs.get('verbose', True):
         print(tabulate(df, headers='keys', tablefmt='rounded_outline'))
     return df
 
 def write(query, **kwargs):
     """
-    Write data to the database.
+    Write data to the database, invalidating cached reads of the tables it touches.
 
     Parameters:
-        query (str): The SQL query to execute.
+        query (str or PreparedStatement): The SQL query to execute.
         **kwargs:
             params (dict, optional): Parameters for the SQL query.
+
+    Returns:
+        list: Rows returned by the statement, None if it returned none or failed.
+    """
+    rows = _api._write(query, params=kwargs.get('params'))
+    result_cache.invalidate_for(getattr(query, 'query', query))
+    return rows
+
+def popular_titles(limit=10, genre=None, **kwargs):
+    """
+    Read the titles with the most time-decayed views, overall or within one genre.
+
+    The popularity tables are maintained by a trigger on `sessions` (migration 006), so this is
+    an indexed read rather than an aggregate over all sessions.
+
+    Parameters:
+        limit (int, optional): Number of titles to return. Default is 10.
+        genre (str, optional): Restrict to titles of this genre.
+        **kwargs: Passed on to `read`, e.g. verbose or compact.
+
+    Returns:
+        DataFrame: content_id, title, content_type, decayed_views, mean_rating, views and
+            last_view, most popular first.
+    """
+    source = "relational.popular_titles" if genre is None else "relational.popular_titles_by_genre WHERE genre = :genre"
+    query = f"""
+        SELECT content_id, title, content_type, decayed_views, mean_rating, views, last_view
+        FROM {source}
+        ORDER BY score DESC
+        LIMIT :limit;
+    """
+    params = {'limit': limit} if genre is None else {'limit': limit, 'genre': genre}
+    return read(query, params=params, **kwargs)
+
+def distinct_users_per_title(start, end, content_ids=None, verbose=True):
+    """
+    Estimate distinct users per title between two dates from the HyperLogLog sketches.
+
+    Reads the per-day sketches maintained by `sketches.py update` (migration 008) rather than
+    the sessions. Each estimate is within `std_error` of the true count about two times in three
+    and within [low, high] 95% of the time; at the default precision std_error is 1.6% of it.
+
+    Parameters:
+        start (date): First day.
+        end (date): Last day, inclusive.
+        content_ids (list, optional): Only these titles. Default is every title with sessions.
+        verbose (bool, optional): If True, print the result. Default is True.
+
+    Returns:
+        DataFrame: content_id, estimate, std_error, low and high, largest estimate first.
     """
-    _api._write(query, params=kwargs.get('params'))
+    df = sketches.distinct_users_per_title(_api.router.reader(), start, end, content_ids=content_ids)
+    if verbose:
+        print(tabulate(df, headers='keys', tablefmt='rounded_outline'))
+    return df
+
+def distinct_titles_per_user(start, end, user_ids=None, verbose=True):
+    """
+    Estimate distinct titles watched per user in the weeks overlapping two dates, from the
+    per-week HyperLogLog sketches. See `distinct_users_per_title` for the error bounds.
+
+    Parameters:
+        start (date): A day in the first week.
+        end (date): A day in the last week.
+        user_ids (list, optional): Only these users. Default is every user with sessions.
+        verbose (bool, optional): If True, print the result. Default is True.
+
+    Returns:
+        DataFrame: user_id, estimate, std_error, low and high, largest estimate first.
+    """
+    df = sketches.distinct_titles_per_user(_api.router.reader(), start, end, user_ids=user_ids)
+    if verbose:
+        print(tabulate(df, headers='keys', tablefmt='rounded_outline'))
+    return df
+
+def distinct_users(start, end, content_ids=None):
+    """
+    Estimate the distinct users who watched any title, or any of `content_ids`, between two dates.
+
+    Returns:
+        dict: estimate, std_error, low and high, see `distinct_users_per_title`.
+    """
+    return sketches.distinct_users(_api.router.reader(), start, end, content_ids=content_ids)
+
+def profile_report(top=20, verbose=True):
+    """
+    Report the statements recorded by `profiler`, grouped by normalized query text.
+
+    Parameters:
+        top (int, optional): Number of queries to show, by total time. Default is 20.
+        verbose (bool, optional): If True, print the report without the plans. Default is True.
+
+    Returns:
+        DataFrame: See `QueryProfiler.report`.
+    """
+    df = profiler.report(top=top)
+    if verbose:
+        print(tabulate(df.drop(columns='plan'), headers='keys', tablefmt='rounded_outline'))
+    return df
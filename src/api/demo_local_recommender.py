@@ -1,17 +1,20 @@
 """
 This module aids in generating content recommendations based on users' viewing history.
 
-It fetches the last five viewed content by the user and then finds similar content
-based on genres. These recommendations are then written into a `recommendations` database table.
+It looks at the last five titles each user viewed, ranks unviewed titles by how many genres
+they share with that history, and writes the best ones into the `recommendations` table. All
+of it runs server-side in `relational.make_recommendations` (migrations/005), so one user or a
+whole batch of users costs a single round trip. `RecoMaker(..., strategy='similar')` uses the
+content-based neighbours from `similarity.py` instead.
 """
 
 import logging
 
 from dotenv import load_dotenv
-from sqlalchemy.exc import IntegrityError, OperationalError, StatementError, DataError
 from typing import List
 
 from db_local_api import read, write
+from prepared import PreparedStatement
 
 load_dotenv()
 
@@ -20,121 +23,114 @@ logging.basicConfig(level=logging.INFO,
                     datefmt='%Y-%m-%d %H:%M:%S')
 logger = logging.getLogger(__name__)
 
+# Prepared once per connection and then run by name, see prepared.py.
+MAKE_RECOMMENDATIONS_QUERY = PreparedStatement('make_recommendations', """
+    SELECT user_id, content_id
+    FROM relational.make_recommendations(CAST(:user_ids AS int[]), :history, :max_recos);
+""")
+
+USER_HISTORY_QUERY = PreparedStatement('user_history', """
+    SELECT content_id
+    FROM relational.sessions
+    WHERE user_id = :user_id
+    ORDER BY start_timestamp DESC;
+""")
+
+INSERT_RECOMMENDATIONS_QUERY = PreparedStatement('insert_recommendations', """
+    INSERT INTO relational.recommendations (user_id, content_id)
+    SELECT :user_id, unnest(CAST(:content_ids AS varchar[]))
+    ON CONFLICT (content_id, user_id) DO NOTHING
+    RETURNING user_id, content_id;
+""")
+
+
+def make_recommendations(user_ids, history=5, max_recos=10):
+    """
+    Generate and store recommendations for one or many users in a single statement.
+
+    Parameters:
+        user_ids (list): IDs of the users to recommend for.
+        history (int, optional): How many of each user's latest sessions to base the genres on. Default is 5.
+        max_recos (int, optional): Maximum recommendations per user. Default is 10.
+
+    Returns:
+        list: (user_id, content_id) rows newly written, None if the statement failed.
+    """
+    rows = write(MAKE_RECOMMENDATIONS_QUERY,
+                 params={'user_ids': [int(user_id) for user_id in user_ids], 'history': history, 'max_recos': max_recos})
+    return None if rows is None else [tuple(row) for row in rows]
+
 
 class RecoMaker:
     """
     A class responsible for generating content recommendations based on a user's viewing history.
+
+    Two strategies are available:
+        'genre'    ranks unviewed titles by genre overlap, server-side (`make_recommendations`).
+        'similar'  looks up the titles most similar to the last five viewed in a content-based
+                   `SimilarityIndex` held in memory.
+    Users without any history get the most popular titles with either strategy.
     """
 
-    def __init__(self, user_id: str):
+    def __init__(self, user_id: str, strategy: str = 'genre', similarity_index=None):
         """
         Constructor method to initialize the RecoMaker class.
 
         Parameters:
             user_id (str): ID of the user for whom the recommendations are to be made.
+            strategy (str, optional): 'genre' or 'similar'. Default is 'genre'.
+            similarity_index (SimilarityIndex, optional): Index for the 'similar' strategy.
+                Loaded from `similarity.DEFAULT_INDEX_PATH` when not given.
         """
+        if strategy not in ('genre', 'similar'):
+            raise ValueError(f"Unknown strategy {strategy!r}, expected 'genre' or 'similar'.")
         self.user_id = user_id
-        self.content_id_list: List = []
+        self.strategy = strategy
+        self.similarity_index = similarity_index
         self.reco_list: List = []
-        self.genre: str = ''
 
-        self.get_last_5()
-        self.get_similar_genre()
         self.write_reco()
 
-    def get_last_5(self):
-        try:
-            user_id = self.user_id
-            query = f"""
-                SELECT content_id 
-                FROM relational.sessions
-                WHERE user_id = {user_id}
-                ORDER BY start_timestamp DESC
-                LIMIT 5;
-            """
-            df = read(query)
-            self.content_id_list = df['content_id'].tolist()
-            if len(self.content_id_list) == 0:
-                logger.error(f"User {user_id} has not viewed any content.")
-        except OperationalError as oe:
-            logger.error(f"Operational Error fetching last 5 viewing sessions for user {user_id}: {oe}")
-        except IntegrityError as ie:
-            logger.error(f"Integrity Error: Maybe there's a constraint being violated while fetching data for user {user_id}: {ie}")
-        except StatementError as se:
-            logger.error(f"Statement Error: Maybe there's an issue with SQL statement for user {user_id}: {se}")
-        except DataError as de:
-            logger.error(f"Data Error: Maybe there's an issue with the returned data or its format for user {user_id}: {de}")
-        except Exception as e:
-            logger.error(f"Unexpected error occurred while fetching last 5 viewing sessions for user {user_id}: {e}")
-
-
-    def get_similar_genre(self):
+    def similar_titles(self, history=5, max_recos=10):
         """
-        Identify content with similar genres to those in the user's viewing history.
+        Recommend the titles most similar to the user's latest views, skipping everything viewed.
 
-        This method avoids recommending any content that the user has already viewed.
+        Returns:
+            list: content_ids, most similar first, or None if the user has no history.
         """
-        try:
-            ids = str(self.content_id_list).split('[')[1].split(']')[0]
-            query=f"""
-                WITH genre_list AS (
-                    SELECT genre
-                    FROM relational.genres
-                    WHERE content_id IN ({ids})
-                )
-                SELECT DISTINCT content_id
-                FROM relational.genres
-                WHERE genre IN (SELECT genre FROM genre_list)
-                AND content_id NOT IN ({ids})
-                LIMIT 10;
-            """
-            df = read(query)
-            self.reco_list = df['content_id'].tolist()
-            if len(self.reco_list) == 0:
-                logger.error(f"No other titles similar to {self.user_id}'s viewing history that are unviewed by user.")
-        except OperationalError as oe:
-            logger.error(f"Operational Error fetching similar genre content for user {self.user_id}: {oe}")
-        except IntegrityError as ie:
-            logger.error(f"Integrity Error: Maybe there's a constraint being violated while fetching similar genre content for user {self.user_id}: {ie}")
-        except StatementError as se:
-            logger.error(f"Statement Error: Maybe there's an issue with SQL statement for user {self.user_id}: {se}")
-        except DataError as de:
-            logger.error(f"Data Error: Maybe there's an issue with the returned data or its format for user {self.user_id}: {de}")
-        except Exception as e:
-            logger.error(f"Unexpected error occurred while fetching similar genre content for user {self.user_id}: {e}")
+        df = read(USER_HISTORY_QUERY, params={'user_id': int(self.user_id)}, verbose=False)
+        if df is None or df.empty:
+            return None
+        if self.similarity_index is None:
+            # Imported here so the 'genre' strategy does not need scipy.
+            from similarity import SimilarityIndex
 
+            self.similarity_index = SimilarityIndex.load()
+        viewed = df['content_id'].tolist()
+        return self.similarity_index.more_like(viewed[:history], k=max_recos, exclude=viewed)
 
     def write_reco(self):
         """
-        Save the generated content recommendations to the `recommendations` database table.
+        Generate the user's recommendations and save them to the `recommendations` table.
+
+        Titles already recommended to the user are left as they are, so only new ones end up in
+        `reco_list`.
         """
         user_id = self.user_id
-        if len(self.reco_list) > 0:        
-            for content_id in self.reco_list:
-                try:
-                    query = f""" 
-                    INSERT INTO recommendations (user_id, content_id)
-                    VALUES ({user_id}, '{content_id}');
-                    """
-                    write(query)
-                    logger.info(f"Successfully wrote recommendation {content_id} for user {user_id}.")
-                except OperationalError as oe:
-                    logger.error(f"Operational Error writing recommendation {content_id} for user {user_id}: {oe}")
-                    continue
-                except IntegrityError as ie:
-                    logger.error(f"Integrity Error: Maybe there's a constraint being violated while writing recommendation {content_id} for user {user_id}: {ie}")
-                    continue
-                except StatementError as se:
-                    logger.error(f"Statement Error: Maybe there's an issue with SQL statement for recommendation {content_id} for user {self.user_id}: {se}")
-                    continue
-                except DataError as de:
-                    logger.error(f"Data Error: Maybe there's an issue with the data format for recommendation {content_id} for user {self.user_id}: {de}")
-                    continue
-                except Exception as e:
-                    logger.error(f"Unexpected error occurred while writing recommendation {content_id} for user {user_id}: {e}")
-                    continue
+        content_ids = self.similar_titles() if self.strategy == 'similar' else None
+        if content_ids is None:
+            rows = make_recommendations([user_id])
+        else:
+            rows = write(INSERT_RECOMMENDATIONS_QUERY, params={'user_id': int(user_id), 'content_ids': content_ids})
+        if rows is None:
+            logger.error(f"Failed to write recommendations for user {user_id}.")
+            return
+        self.reco_list = [content_id for _, content_id in rows]
+        if len(self.reco_list) > 0:
+            logger.info(f"Successfully wrote {len(self.reco_list)} recommendations for user {user_id}: {self.reco_list}.")
         else:
-            logger.error(f"No recommendations to write for user {user_id}.")
+            logger.error(f"No new recommendations to write for user {user_id}.")
 
 
-recommendation = RecoMaker(280)
+if __name__ == '__main__':
+    recommendation = RecoMaker(280)
@@ -1,17 +1,26 @@
+import asyncio
 import os
 import logging
+from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
 from fastapi.exceptions import RequestValidationError
 from pydantic import BaseModel
-from sqlalchemy import create_engine, event, text
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError, OperationalError, StatementError, DataError
+from sqlalchemy import text
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError, StatementError, DataError
 from typing import Optional, List
 
 from models import (Titles, Genres, ProdCountries, Credits, Users, ViewSessions, TitleFilter,
-                    GenreFilter, CreditFilter, UserFilter, ProdCountryFilter, ViewSessionFilter)
+                    GenreFilter, CreditFilter, UserFilter, ProdCountryFilter, ViewSessionFilter,
+                    TitleSearchQuery, PopularityQuery, filter_predicates)
+from session_ingest import SESSION_COLUMNS, IngestQueueFull, SessionIngestBuffer
+from catalog_cache import CATALOG_TABLES, CatalogCache
+from change_listener import ChangeListener
+from coalesce import SingleFlight
+from dtos import rows_response, search_rows
+from routing import ReplicaRouter
 
 load_dotenv()
 
@@ -21,26 +30,106 @@ logging.basicConfig(level=logging.INFO,
                     datefmt='%Y-%m-%d %H:%M:%S')
 logger = logging.getLogger(__name__)
 
-# Initialize FastAPI app.
-app = FastAPI()
-
-# Set up database connection.
+# Set up database connection. The engine itself is built in the lifespan, see lifespan().
 db_url = f"postgresql+psycopg2://{os.getenv('DS_USER')}:{os.getenv('DS_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
-engine = create_engine(db_url)
 
-def set_search_path(dbapi_connection, connection_record):
+def engine_options() -> dict:
     """
-    Set the search path for the current connection to use the 'relational' schema.
-    
+    Build the create_engine keyword arguments from the DB_* environment variables.
+
+    FastAPI runs the sync endpoints on a thread pool of 40, so the defaults of 20 pooled
+    connections plus 20 overflow let every thread hold one instead of queueing on the default
+    5 + 10. search_path and statement_timeout are sent as connection options in the startup
+    packet, which saves a round trip per new connection. DB_STATEMENT_TIMEOUT_MS=0 turns the
+    timeout off.
+
+    Returns:
+        dict: Pool and connect_args settings for create_engine.
+    """
+    options = "-c search_path=relational,public"
+    statement_timeout = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30000))
+    if statement_timeout:
+        options += f" -c statement_timeout={statement_timeout}"
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 20)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 20)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1").lower() not in ("0", "false", "no"),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "connect_args": {"options": options},
+    }
+
+# Sessions for the write endpoints, and read-only ones for the search endpoints. Read-only
+# transactions start with BEGIN READ ONLY, so Postgres rejects writes and skips taking a
+# transaction ID. Write sessions are bound to the primary in the lifespan; read sessions are
+# bound per request to the engine the replica router picks (see routing.py).
+SessionLocal = sessionmaker(class_=Session)
+ReadSessionLocal = sessionmaker(class_=Session, autoflush=False)
+
+# Write-behind buffer behind /view_session/ingest/, flushed on shutdown.
+session_ingest = SessionIngestBuffer.from_env(engine=None)
+
+# Snapshot of titles, genres and prod_countries, loaded at startup. This worker's create/delete
+# endpoints invalidate it directly; writes by other workers or clients arrive through the
+# change listener (NOTIFY triggers from migration 007).
+catalog_cache = CatalogCache(engine=None)
+
+def evict_changed(table: Optional[str], key: Optional[str]):
+    """
+    Evict a changed row from the in-process caches.
+
     Args:
-        dbapi_connection: The current raw database connection.
-        connection_record: The connection record associated with the connection.
+        table (str): The changed table, None when every table may have changed.
+        key (str): The changed content_id, None when the whole table may have changed.
     """
-    cursor = dbapi_connection.cursor()
-    cursor.execute("SET search_path TO relational;")
-    cursor.close()
+    for cached_table in (CATALOG_TABLES if table is None else [table]):
+        catalog_cache.invalidate(cached_table, key)
+    if table in (None, "titles", "genres"):
+        search_coalescer.clear()
 
-event.listen(engine, "connect", set_search_path)
+change_listener = ChangeListener(engine=None, handler=evict_changed)
+
+# Identical concurrent /title/search/ and /genre/search/ filters share one query. A result is
+# reused for SEARCH_COALESCE_TTL seconds afterwards (default 0: only overlapping requests share).
+search_coalescer = SingleFlight(ttl=float(os.getenv("SEARCH_COALESCE_TTL", 0)))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Build the primary and replica engines and bind the sessions and caches to them, start the
+    replica health checks and the change listener and load the catalog; on shutdown flush the
+    ingest buffer and close the pools.
+
+    The catalog cache, the ingest buffer and the change listener stay on the primary: NOTIFY is
+    not delivered on replicas, and a read-through after a notification must see the change.
+
+    Args:
+        app (FastAPI): The application, whose state keeps the engines and the router.
+    """
+    router = ReplicaRouter.from_env(db_url, **engine_options())
+    engine = router.primary
+    app.state.engine = engine
+    app.state.router = router
+    app.state.read_only_engines = {routed: routed.execution_options(postgresql_readonly=True)
+                                   for routed in router.engines}
+    SessionLocal.configure(bind=engine)
+    session_ingest.engine = catalog_cache.engine = change_listener.engine = engine
+    await asyncio.to_thread(router.start)
+    # Listen before loading, so no change between the load and the LISTEN is missed.
+    await change_listener.start()
+    try:
+        await asyncio.to_thread(catalog_cache.refresh)
+    except Exception as e:
+        logger.error(f"Catalog cache not loaded at startup, it will load on first use: {e}")
+    logger.info("FastAPI application started")
+    yield
+    await session_ingest.stop()
+    await change_listener.stop()
+    router.dispose()
+    logger.info("FastAPI application stopped")
+
+# Initialize FastAPI app.
+app = FastAPI(lifespan=lifespan)
 
 @app.exception_handler(IntegrityError)
 def handle_integrity_error(request, exc):
@@ -123,21 +212,101 @@ want to expose the search parameters in the URL and delete endpoints won't
 allow a JSON payload in the body.
 """
 
-def get_session():
+def cached_catalog_rows(table: str, non_none_filter: dict) -> Optional[list]:
     """
-    Generate a new SQLAlchemy session.
-    
+    Serve a search that filters on content_id or content_id_in alone from the catalog cache.
+
+    Args:
+        table (str): 'titles', 'genres' or 'prod_countries'.
+        non_none_filter (dict): The search filter without its None fields.
+
+    Returns:
+        list: The matching rows, or None if the filter needs the database.
+    """
+    if set(non_none_filter) == {"content_id"}:
+        content_ids = [non_none_filter["content_id"]]
+    elif set(non_none_filter) == {"content_id_in"}:
+        content_ids = non_none_filter["content_id_in"]
+    else:
+        return None
+    rows = []
+    for content_id in content_ids:
+        cached = catalog_cache.get(table, content_id)
+        if table != "titles":
+            rows.extend(cached)
+        elif cached is not None:
+            rows.append(cached)
+    return rows
+
+def get_session(request: Request, x_user_id: Optional[int] = Header(None)):
+    """
+    Generate a new SQLAlchemy session on the primary for the write endpoints.
+
+    Args:
+        request (Request): The current request.
+        x_user_id (int): The X-User-Id header. If given, this user's reads go to the primary for
+            the DB_READ_YOUR_WRITES window.
+
     Returns:
-        session: An active SQLAlchemy session. The session is automatically closed after use.
+        session: An active SQLAlchemy session. Closing it after the request rolls back anything
+            left uncommitted, also when the endpoint raised.
     """
-    session = Session(engine)
-    try:
+    if x_user_id is not None:
+        request.app.state.router.record_write(x_user_id)
+    with SessionLocal() as session:
         yield session
-    except:
-        session.rollback()
-        raise
-    finally:
-        session.close()
+
+def get_read_session(request: Request, x_user_id: Optional[int] = Header(None)):
+    """
+    Generate a new read-only SQLAlchemy session for the search endpoints, on a replica.
+
+    Args:
+        request (Request): The current request.
+        x_user_id (int): The X-User-Id header, for read-your-writes.
+
+    Returns:
+        session: An active SQLAlchemy session whose transactions are READ ONLY, on the next
+            healthy replica, or on the primary if there is none or the user wrote recently.
+    """
+    engine = request.app.state.router.reader(x_user_id)
+    with ReadSessionLocal(bind=request.app.state.read_only_engines[engine]) as session:
+        # For coalesced_search: where this session reads, and whose read it is.
+        session.info.update(engine=engine, user_id=x_user_id)
+        try:
+            yield session
+        except DBAPIError as e:
+            # A lost connection takes the replica out of rotation until its next health check.
+            if e.connection_invalidated:
+                request.app.state.router.mark_failed(engine)
+            raise
+
+def coalesced_search(request: Request, session: Session, endpoint: str, model, non_none_filter: dict) -> list:
+    """
+    Search rows through `search_coalescer`, without breaking read-your-writes.
+
+    A user inside their DB_READ_YOUR_WRITES window reads on the primary and does not share
+    other requests' queries, which may have started before their write or run on a replica.
+    Other requests share only with requests on the same engine. A replica may still return
+    pre-change rows for up to DB_REPLICA_MAX_LAG seconds after a change cleared the
+    coalescer, so within that time its results are not kept for the ttl.
+
+    Args:
+        request (Request): The current request.
+        session (Session): A session from `get_read_session`.
+        endpoint (str): The endpoint, part of the coalescing key.
+        model: The SQLModel table class to search.
+        non_none_filter (dict): The filter fields that were provided.
+
+    Returns:
+        list: The matching rows, see `search_rows`.
+    """
+    router = request.app.state.router
+    engine, user_id = session.info.get("engine"), session.info.get("user_id")
+    if user_id is not None and router.recently_wrote(user_id):
+        return search_rows(session, model, non_none_filter)
+    keep = engine is router.primary or not search_coalescer.cleared_within(router.max_lag)
+    return search_coalescer.run(endpoint, non_none_filter, lambda: search_rows(session, model, non_none_filter),
+                                scope=engine, keep=keep)
 
 @app.post("/title/")
 def create_title(titles: Titles, session: Session = Depends(get_session)):
@@ -153,6 +322,7 @@ def create_title(titles: Titles, session: Session = Depends(get_session)):
     """
     session.add(titles)
     session.commit()
+    catalog_cache.invalidate("titles", titles.content_id)
     session.refresh(titles)
     return titles
 
@@ -169,17 +339,20 @@ def delete_title(title_filter: TitleFilter, session: Session = Depends(get_sessi
         dict: A message indicating how many title entries were deleted to be returned as JSON.
     """
     non_none_filter = {k: v for k, v in title_filter.dict().items() if v is not None}
-    query = session.query(Titles).filter_by(**non_none_filter)
+    query = session.query(Titles).filter(*filter_predicates(Titles, non_none_filter))
     results = query.all()
     if not results:
         raise HTTPException(status_code=404, detail=f"No entries in titles table found with provided filter: {title_filter.dict()}")
+    content_ids = {title.content_id for title in results}
     for title in results:
         session.delete(title)
     session.commit()
+    for content_id in content_ids:
+        catalog_cache.invalidate("titles", content_id)
     return {"message": f"{len(results)} title(s) deleted successfully."}
 
 @app.post("/title/search/")
-def search_title(title_filter: TitleFilter, session: Session = Depends(get_session)):
+def search_title(title_filter: TitleFilter, request: Request, session: Session = Depends(get_read_session)):
     """
     Search for title entries based on provided filters.
     
@@ -191,10 +364,115 @@ def search_title(title_filter: TitleFilter, session: Session = Depends(get_sessi
         list: A list of title entries that match the provided filters to be returned as JSON.
     """
     non_none_filter = {k: v for k, v in title_filter.dict().items() if v is not None}
-    query = session.query(Titles).filter_by(**non_none_filter)
-    results = query.all()
+    results = cached_catalog_rows("titles", non_none_filter)
+    if results is None:
+        results = coalesced_search(request, session, "/title/search/", Titles, non_none_filter)
     if not results:
         raise HTTPException(status_code=404, detail=f"No entries in titles table found with provided filter: {non_none_filter}")
+    return rows_response(results)
+
+# Ranked fuzzy/substring title search, served by the pg_trgm indexes from migration 003.
+# word_similarity scores the query against the best-matching part of the text, so substrings
+# rank high, and similarity favours titles that match as a whole. Credit name matches are
+# weighted below title matches. The name expression must match credits_name_trgm_idx.
+TITLE_FIND_QUERY = """
+    WITH matches AS (
+        SELECT content_id, 'title' AS matched_on,
+               word_similarity(:query, title) + similarity(title, :query) AS rank
+        FROM titles
+        WHERE :query <% title OR title ILIKE :pattern
+        UNION ALL
+        SELECT content_id, 'credit' AS matched_on,
+               :credit_weight * (word_similarity(:query, first_name || ' ' || last_name)
+                                 + similarity(first_name || ' ' || last_name, :query)) AS rank
+        FROM credits
+        WHERE :include_credits
+          AND (:query <% (first_name || ' ' || last_name) OR (first_name || ' ' || last_name) ILIKE :pattern)
+    ),
+    best AS (
+        SELECT DISTINCT ON (content_id) content_id, matched_on, rank
+        FROM matches
+        ORDER BY content_id, rank DESC
+    )
+    SELECT titles.*, best.matched_on, best.rank
+    FROM best
+    JOIN titles USING (content_id)
+    ORDER BY best.rank DESC, titles.imdb_votes DESC NULLS LAST, titles.content_id
+    LIMIT :limit OFFSET :offset;
+"""
+
+def like_pattern(query: str) -> str:
+    """
+    Build an ILIKE substring pattern that matches `query` literally.
+
+    Args:
+        query (str): The user's search text.
+
+    Returns:
+        str: The pattern with LIKE wildcards and the escape character escaped.
+    """
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+@app.post("/title/find/")
+def find_title(title_query: TitleSearchQuery, session: Session = Depends(get_read_session)):
+    """
+    Ranked fuzzy and substring search over title names and, optionally, credit names.
+
+    Args:
+        title_query (TitleSearchQuery): The search text and the page to return.
+        session (Session): An active SQLAlchemy session.
+
+    Returns:
+        list: One page of matching titles, best match first, each with the field it matched on
+            and its rank, to be returned as JSON.
+    """
+    params = {
+        "query": title_query.query,
+        "pattern": like_pattern(title_query.query),
+        "include_credits": title_query.include_credits,
+        "credit_weight": 0.8,
+        "limit": title_query.page_size,
+        "offset": (title_query.page - 1) * title_query.page_size,
+    }
+    results = [dict(row) for row in session.execute(text(TITLE_FIND_QUERY), params).mappings()]
+    if not results:
+        raise HTTPException(status_code=404, detail=f"No titles found matching: {title_query.dict()}")
+    return results
+
+# Reads of the trigger-maintained popularity tables from migration 006, served by their
+# score indexes. decayed_views is the exponentially decayed view count as of now.
+POPULAR_TITLES_QUERY = """
+    SELECT content_id, title, content_type, decayed_views, mean_rating, views, last_view
+    FROM popular_titles
+    ORDER BY score DESC
+    LIMIT :limit;
+"""
+POPULAR_TITLES_BY_GENRE_QUERY = """
+    SELECT content_id, title, content_type, decayed_views, mean_rating, views, last_view
+    FROM popular_titles_by_genre
+    WHERE genre = :genre
+    ORDER BY score DESC
+    LIMIT :limit;
+"""
+
+@app.post("/title/popular/")
+def popular_titles(popularity_query: PopularityQuery, session: Session = Depends(get_read_session)):
+    """
+    The titles with the most time-decayed views, overall or within one genre.
+
+    Args:
+        popularity_query (PopularityQuery): An optional genre and the number of titles to return.
+        session (Session): An active SQLAlchemy session.
+
+    Returns:
+        list: Titles with their decayed view count and mean rating, most popular first, to be
+            returned as JSON.
+    """
+    query = POPULAR_TITLES_QUERY if popularity_query.genre is None else POPULAR_TITLES_BY_GENRE_QUERY
+    results = [dict(row) for row in session.execute(text(query), popularity_query.dict()).mappings()]
+    if not results:
+        raise HTTPException(status_code=404, detail=f"No popular titles found for: {popularity_query.dict()}")
     return results
 
 
@@ -214,6 +492,7 @@ def create_genre(genre: Genres, session: Session = Depends(get_session)):
     """
     session.add(genre)
     session.commit()
+    catalog_cache.invalidate("genres", genre.content_id)
     session.refresh(genre)
     return genre
 
@@ -230,17 +509,20 @@ def delete_genre(genre_filter: GenreFilter, session: Session = Depends(get_sessi
         dict: A message indicating how many genre entries were deleted to be returned as JSON.
     """
     non_none_filter = {k: v for k, v in genre_filter.dict().items() if v is not None}
-    query = session.query(Genres).filter_by(**non_none_filter)
+    query = session.query(Genres).filter(*filter_predicates(Genres, non_none_filter))
     results = query.all()
     if not results:
         raise HTTPException(status_code=404, detail=f"No entries in genres table found with provided filter: {genre_filter.dict()}")
+    content_ids = {genre.content_id for genre in results}
     for genre in results:
         session.delete(genre)
     session.commit()
+    for content_id in content_ids:
+        catalog_cache.invalidate("genres", content_id)
     return {"message": f"{len(results)} genre(s) deleted successfully."}
 
 @app.post("/genre/search/")
-def search_genre(genre_filter: GenreFilter, session: Session = Depends(get_session)):
+def search_genre(genre_filter: GenreFilter, request: Request, session: Session = Depends(get_read_session)):
     """
     Search for genre entries based on provided filters.
     
@@ -252,11 +534,12 @@ def search_genre(genre_filter: GenreFilter, session: Session = Depends(get_sessi
         list: A list of genre entries that match the provided filters to be returned as JSON.
     """
     non_none_filter = {k: v for k, v in genre_filter.dict().items() if v is not None}
-    query = session.query(Titles).filter_by(**non_none_filter)
-    results = query.all()
+    results = cached_catalog_rows("genres", non_none_filter)
+    if results is None:
+        results = coalesced_search(request, session, "/genre/search/", Genres, non_none_filter)
     if not results:
         raise HTTPException(status_code=404, detail=f"No entries in genres table found with provided filter: {genre_filter.dict()}")
-    return results
+    return rows_response(results)
 
 
 
@@ -265,29 +548,34 @@ def search_genre(genre_filter: GenreFilter, session: Session = Depends(get_sessi
 def create_prod_country(prod_country: ProdCountries, session: Session = Depends(get_session)):
     session.add(prod_country)
     session.commit()
+    catalog_cache.invalidate("prod_countries", prod_country.content_id)
     session.refresh(prod_country)
     return prod_country
 
 @app.post("/prod_country/delete/")
 def delete_prod_country(prod_country_filter: ProdCountryFilter, session: Session = Depends(get_session)):
     non_none_filter = {k: v for k, v in prod_country_filter.dict().items() if v is not None}
-    query = session.query(ProdCountries).filter_by(**non_none_filter)
+    query = session.query(ProdCountries).filter(*filter_predicates(ProdCountries, non_none_filter))
     results = query.all()
     if not results:
         raise HTTPException(status_code=404, detail=f"No entries in prod_countries table found with provided filter: {prod_country_filter.dict()}")
+    content_ids = {prod_country.content_id for prod_country in results}
     for prod_country in results:
         session.delete(prod_country)
     session.commit()
+    for content_id in content_ids:
+        catalog_cache.invalidate("prod_countries", content_id)
     return {"message": f"{len(results)} prod_country(s) deleted successfully."}
 
 @app.post("/prod_country/search/")
-def search_prod_country(prod_country_filter: ProdCountryFilter, session: Session = Depends(get_session)):
+def search_prod_country(prod_country_filter: ProdCountryFilter, session: Session = Depends(get_read_session)):
     non_none_filter = {k: v for k, v in prod_country_filter.dict().items() if v is not None}
-    query = session.query(ProdCountries).filter_by(**non_none_filter)
-    results = query.all()
+    results = cached_catalog_rows("prod_countries", non_none_filter)
+    if results is None:
+        results = search_rows(session, ProdCountries, non_none_filter)
     if not results:
         raise HTTPException(status_code=404, detail=f"No entries in prod_countries table found with provided filter: {prod_country_filter.dict()}")
-    return results
+    return rows_response(results)
 
 
 
@@ -301,7 +589,7 @@ def create_credit(credit: Credits, session: Session = Depends(get_session)):
         session (Session): An active SQLAlchemy session.
     
     Returns:
-        dict: The created credit entry to be returned as JSON.
+        dict: The created credit entry, including its generated credit_id, to be returned as JSON.
     """
     session.add(credit)
     session.commit()
@@ -319,19 +607,19 @@ def delete_credit(credit_filter: CreditFilter, session: Session = Depends(get_se
     
     Returns:
         dict: A message indicating how many credit entries were deleted to be returned as JSON.
+
+    The rows are deleted with a single DELETE statement, which uses the credit_id primary key
+    or the person_id/content_id indexes, instead of loading every row and deleting it by key.
     """
     non_none_filter = {k: v for k, v in credit_filter.dict().items() if v is not None}
-    query = session.query(Credits).filter_by(**non_none_filter)
-    results = query.all()
-    if not results:
+    deleted = session.query(Credits).filter(*filter_predicates(Credits, non_none_filter)).delete(synchronize_session=False)
+    if not deleted:
         raise HTTPException(status_code=404, detail=f"No entries in credits table found with provided filter: {credit_filter.dict()}")
-    for credit in results:
-        session.delete(credit)
     session.commit()
-    return {"message": f"{len(results)} credit(s) deleted successfully."}
+    return {"message": f"{deleted} credit(s) deleted successfully."}
 
 @app.post("/credit/search/")
-def search_credit(credit_filter: CreditFilter, session: Session = Depends(get_session)):
+def search_credit(credit_filter: CreditFilter, session: Session = Depends(get_read_session)):
     """
     Search for credit entries based on provided filters.
     
@@ -343,11 +631,10 @@ def search_credit(credit_filter: CreditFilter, session: Session = Depends(get_se
         list: A list of credit entries that match the provided filters to be returned as JSON.
     """
     non_none_filter = {k: v for k, v in credit_filter.dict().items() if v is not None}
-    query = session.query(Credits).filter_by(**non_none_filter)
-    results = query.all()
+    results = search_rows(session, Credits, non_none_filter)
     if not results:
         raise HTTPException(status_code=404, detail=f"No entries in credits table found with provided filter: {credit_filter.dict()}")
-    return results
+    return rows_response(results)
 
 
 
@@ -382,7 +669,7 @@ def delete_user(user_filter: UserFilter, session: Session = Depends(get_session)
         dict: A message indicating how many user entries were deleted to be returned as JSON.
     """
     non_none_filter = {k: v for k, v in user_filter.dict().items() if v is not None}
-    query = session.query(Users).filter_by(**non_none_filter)
+    query = session.query(Users).filter(*filter_predicates(Users, non_none_filter))
     results = query.all()
     if not results:
         raise HTTPException(status_code=404, detail=f"No entries in users table found with provided filter: {user_filter.dict()}")
@@ -392,7 +679,7 @@ def delete_user(user_filter: UserFilter, session: Session = Depends(get_session)
     return {"message": f"{len(results)} user(s) deleted successfully."}
 
 @app.post("/user/search/")
-def search_user(user_filter: UserFilter, session: Session = Depends(get_session)):
+def search_user(user_filter: UserFilter, session: Session = Depends(get_read_session)):
     """
     Search for user entries based on provided filters.
     
@@ -404,11 +691,10 @@ def search_user(user_filter: UserFilter, session: Session = Depends(get_session)
         list: A list of user entries that match the provided filters to be returned as JSON.
     """
     non_none_filter = {k: v for k, v in user_filter.dict().items() if v is not None}
-    query = session.query(Users).filter_by(**non_none_filter)
-    results = query.all()
+    results = search_rows(session, Users, non_none_filter)
     if not results:
         raise HTTPException(status_code=404, detail=f"No entries in users table found with provided filter: {user_filter.dict()}")
-    return results
+    return rows_response(results)
 
 
 
@@ -430,6 +716,27 @@ def create_view_session(view_session: ViewSessions, session: Session = Depends(g
     session.refresh(view_session)
     return view_session
 
+@app.post("/view_session/ingest/", status_code=202)
+async def ingest_view_sessions(view_sessions: List[ViewSessions]):
+    """
+    Accept view sessions for a buffered, batched write (see session_ingest.py).
+
+    The sessions are validated and queued, and the response does not wait for the database.
+    Use it for high-volume playback events. Use /view_session/ when the caller needs the stored row.
+
+    Args:
+        view_sessions (List[ViewSessions]): The view sessions to store.
+
+    Returns:
+        dict: The number of sessions queued, to be returned as JSON.
+    """
+    try:
+        await session_ingest.put([view_session.dict(include=set(SESSION_COLUMNS)) for view_session in view_sessions])
+    except IngestQueueFull as exc:
+        logger.warning(f"Rejected {len(view_sessions)} view sessions: {exc}")
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "1"})
+    return {"queued": len(view_sessions)}
+
 @app.post("/view_session/delete/")
 def delete_view_session(view_session_filter: ViewSessionFilter, session: Session = Depends(get_session)):
     """
@@ -443,7 +750,7 @@ def delete_view_session(view_session_filter: ViewSessionFilter, session: Session
         dict: A message indicating how many view session entries were deleted to be returned as JSON.
     """
     non_none_filter = {k: v for k, v in view_session_filter.dict().items() if v is not None}
-    query = session.query(ViewSessions).filter_by(**non_none_filter)
+    query = session.query(ViewSessions).filter(*filter_predicates(ViewSessions, non_none_filter))
     results = query.all()
     if not results:
         raise HTTPException(status_code=404, detail=f"No entries in view_sessions table found with provided filter: {view_session_filter.dict()}")
@@ -453,7 +760,7 @@ def delete_view_session(view_session_filter: ViewSessionFilter, session: Session
     return {"message": f"{len(results)} view_session(s) deleted successfully."}
 
 @app.post("/view_session/search/")
-def search_view_session(view_session_filter: ViewSessionFilter, session: Session = Depends(get_session)):
+def search_view_session(view_session_filter: ViewSessionFilter, session: Session = Depends(get_read_session)):
     """
     Search for view session entries based on provided filters.
     
@@ -465,17 +772,32 @@ def search_view_session(view_session_filter: ViewSessionFilter, session: Session
         list: A list of view session entries that match the provided filters to be returned as JSON.
     """
     non_none_filter = {k: v for k, v in view_session_filter.dict().items() if v is not None}
-    query = session.query(ViewSessions).filter_by(**non_none_filter)
-    results = query.all()
+    results = search_rows(session, ViewSessions, non_none_filter)
     if not results:
         raise HTTPException(status_code=404, detail=f"No entries in view_sessions table found with provided filter: {view_session_filter.dict()}")
-    return results
+    return rows_response(results)
 
 
-@app.on_event("startup")
-async def startup_event():
-    logger.info("FastAPI application started")
+@app.get("/catalog/stats/")
+def catalog_stats():
+    """
+    Metrics of the in-process catalog cache and of search coalescing.
+
+    Returns:
+        dict: Snapshot version and age, entry counts, hits, misses, hit rate and refreshes,
+            plus the executed, coalesced and ttl-served searches.
+    """
+    return dict(catalog_cache.stats(), search_coalescing=search_coalescer.stats())
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    logger.info("FastAPI application stopped")
\ No newline at end of file
+@app.get("/replicas/stats/")
+def replica_stats(request: Request):
+    """
+    Metrics of the read-replica routing.
+
+    Args:
+        request (Request): The current request.
+
+    Returns:
+        dict: Reads served by the primary, and per replica its health, lag and reads.
+    """
+    return request.app.state.router.stats()
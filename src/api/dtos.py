@@ -0,0 +1,78 @@
+"""
+Read-only row types for the search endpoints.
+
+Returning SQLModel table objects means the ORM creates an identity-mapped, instrumented
+instance for every row, and FastAPI then walks each one with `jsonable_encoder`. The search
+endpoints only read rows and send them out, so they select the table's columns with Core
+instead and put each row into a `__slots__` dataclass generated from the table, built
+positionally. orjson serializes such dataclasses natively, so `rows_response` skips
+`jsonable_encoder` altogether.
+
+The classes are plain, unvalidated containers. Treat them as read-only: search results may be
+shared between requests by the search coalescer.
+
+`benchmarks/bench_search_dtos.py` compares the two paths.
+"""
+
+from dataclasses import make_dataclass
+from typing import Any
+
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
+
+from models import Titles, Genres, ProdCountries, Credits, Users, ViewSessions, filter_predicates
+
+
+def row_type(model):
+    """
+    A `__slots__` dataclass with one field per column of `model`'s table, in column order.
+
+    Parameters:
+        model (SQLModel): A table model.
+
+    Returns:
+        type: The row class, named after the model with a 'Row' suffix.
+    """
+    fields = [(column.name, Any) for column in model.__table__.columns]
+    return make_dataclass(f"{model.__name__}Row", fields, slots=True)
+
+
+TitleRow = row_type(Titles)
+GenreRow = row_type(Genres)
+ProdCountryRow = row_type(ProdCountries)
+CreditRow = row_type(Credits)
+UserRow = row_type(Users)
+ViewSessionRow = row_type(ViewSessions)
+
+ROW_TYPES = {
+    Titles: TitleRow,
+    Genres: GenreRow,
+    ProdCountries: ProdCountryRow,
+    Credits: CreditRow,
+    Users: UserRow,
+    ViewSessions: ViewSessionRow,
+}
+
+
+def search_rows(session, model, non_none_filter):
+    """
+    Run a search filter with Core and return the rows as `ROW_TYPES[model]` instances.
+
+    Parameters:
+        session (Session): An active SQLAlchemy session.
+        model (SQLModel): The table model to search.
+        non_none_filter (dict): The filter without its None fields, see `filter_predicates`.
+
+    Returns:
+        list: Row objects, in no particular order.
+    """
+    row_class = ROW_TYPES[model]
+    statement = select(*model.__table__.columns).where(*filter_predicates(model, non_none_filter))
+    return [row_class(*row) for row in session.execute(statement)]
+
+
+def rows_response(rows):
+    """
+    Serialize rows (row objects or dicts) with orjson, bypassing `jsonable_encoder`.
+    """
+    return ORJSONResponse(content=rows)
@@ -0,0 +1,278 @@
+"""
+Offline evaluation of recommendation strategies.
+
+The sessions are split in time: everything before the cutoff is the training history and
+the titles a user first watches after it are the held-out relevant items. Every strategy is
+built from the training data only. It then recommends `k` titles for every user with
+held-out items, and the report scores the recommendations:
+
+    precision@k, recall@k, ndcg@k   averaged over users, binary relevance
+    coverage                        share of the catalog recommended to anyone
+    build_seconds, wall_seconds     time to build the strategy and to serve all users
+    latency_ms                      per-user p50 / p90 / p99 / max
+
+Data comes from a seeded Postgres or from a snapshot directory exported with `export`, so runs
+are repeatable and strategies can be compared on identical input:
+
+    python evaluate.py export snapshot/
+    python evaluate.py run --snapshot snapshot/ --strategies popular genre two_stage similar --k 10 --output report.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from db_connect import connect_to_db
+from similarity import SimilarityIndex
+from two_stage import (COUNTRIES_QUERY, CREDITS_QUERY, FEATURES, GENRES_QUERY, TITLES_QUERY,
+                       Catalog, TwoStageRecommender)
+
+logging.basicConfig(level=logging.INFO,
+                    format='[%(asctime)s] %(levelname)s in %(module)s: %(message)s]',
+                    datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+SESSIONS_QUERY = "SELECT user_id, content_id, start_timestamp FROM relational.sessions;"
+
+SNAPSHOT_QUERIES = {
+    'sessions': SESSIONS_QUERY,
+    'titles': TITLES_QUERY,
+    'genres': GENRES_QUERY,
+    'credits': CREDITS_QUERY,
+    'prod_countries': COUNTRIES_QUERY,
+}
+# Keys that look numeric but must stay strings when read back from CSV.
+SNAPSHOT_DTYPES = {'content_id': str, 'person_id': str, 'genre': str, 'country': str}
+
+
+class Snapshot:
+    """
+    The tables an evaluation needs, as DataFrames.
+
+    Parameters:
+        tables (dict): Name -> DataFrame for every key of `SNAPSHOT_QUERIES`.
+    """
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['tables'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    @classmethod
+    def from_db(cls, engine):
+        with engine.connect() as conn:
+            return cls({name: pd.read_sql(text(query), conn) for name, query in SNAPSHOT_QUERIES.items()})
+
+    @classmethod
+    def from_dir(cls, path):
+        tables = {name: pd.read_csv(os.path.join(path, f"{name}.csv.gz"), dtype=SNAPSHOT_DTYPES)
+                  for name in SNAPSHOT_QUERIES}
+        tables['sessions']['start_timestamp'] = pd.to_datetime(tables['sessions']['start_timestamp'])
+        return cls(tables)
+
+    def export(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name, df in self.tables.items():
+            df.to_csv(os.path.join(path, f"{name}.csv.gz"), index=False)
+
+    def with_sessions(self, sessions):
+        return Snapshot(dict(self.tables, sessions=sessions))
+
+
+def time_split(sessions, cutoff=None, test_fraction=0.2):
+    """
+    Split sessions at a point in time.
+
+    Parameters:
+        sessions (DataFrame): user_id, content_id, start_timestamp.
+        cutoff (Timestamp, optional): First moment of the test period. Defaults to the
+            start_timestamp quantile that leaves `test_fraction` of the sessions for testing.
+        test_fraction (float, optional): See `cutoff`. Default is 0.2.
+
+    Returns:
+        tuple: (train sessions, {user_id: set of held-out content_ids}, cutoff). Held-out titles
+            are those first watched in the test period; rewatches of training titles do not count.
+    """
+    if cutoff is None:
+        cutoff = sessions['start_timestamp'].quantile(1 - test_fraction)
+    cutoff = pd.Timestamp(cutoff)
+    train = sessions[sessions['start_timestamp'] < cutoff]
+    test = sessions[sessions['start_timestamp'] >= cutoff]
+    seen = set(zip(train['user_id'], train['content_id']))
+    test = test[[pair not in seen for pair in zip(test['user_id'], test['content_id'])]]
+    relevant = {user_id: set(group) for user_id, group in test.groupby('user_id')['content_id']}
+    return train, relevant, cutoff
+
+
+def histories(train):
+    """
+    Each user's training history, most recent first.
+
+    Returns:
+        dict: user_id -> list of content_ids.
+    """
+    ordered = train.sort_values(['user_id', 'start_timestamp'], ascending=[True, False])
+    return {user_id: group.tolist() for user_id, group in ordered.groupby('user_id', sort=False)['content_id']}
+
+
+def precision_recall_ndcg(recommended, relevant, k):
+    """
+    Binary-relevance precision@k, recall@k and NDCG@k of one recommendation list.
+    """
+    hits = np.array([content_id in relevant for content_id in recommended[:k]], dtype=float)
+    discounts = 1 / np.log2(np.arange(2, k + 2))
+    ideal = discounts[:min(len(relevant), k)].sum()
+    return (hits.sum() / k,
+            hits.sum() / len(relevant) if relevant else 0.0,
+            (hits * discounts[:len(hits)]).sum() / ideal if ideal else 0.0)
+
+
+def popular_strategy(snapshot):
+    ranking = snapshot.sessions['content_id'].value_counts().index.tolist()
+
+    def recommend(history, k, seen):
+        return [content_id for content_id in ranking if content_id not in seen][:k]
+    return recommend
+
+
+def _catalog(snapshot):
+    popularity = snapshot.sessions['content_id'].value_counts()
+    return Catalog(snapshot.titles, snapshot.genres, snapshot.credits, snapshot.prod_countries, popularity)
+
+
+def two_stage_strategy(snapshot):
+    recommender = TwoStageRecommender(_catalog(snapshot))
+    return lambda history, k, seen: recommender.recommend(history[:5], k=k, seen=seen)
+
+
+def genre_strategy(snapshot):
+    # The ranking of relational.make_recommendations: genre overlap, then imdb_score.
+    weights = dict.fromkeys(FEATURES, 0.0)
+    weights.update(genre_overlap=1.0, imdb_score=1e-3)
+    recommender = TwoStageRecommender(_catalog(snapshot), weights=weights)
+    return lambda history, k, seen: recommender.recommend(history[:5], k=k, seen=seen)
+
+
+def similar_strategy(snapshot):
+    term_pairs = {'genre': snapshot.genres.rename(columns={'genre': 'term'}),
+                  'country': snapshot.prod_countries.rename(columns={'country': 'term'}),
+                  'person': snapshot.credits.drop_duplicates().rename(columns={'person_id': 'term'})}
+    index = SimilarityIndex.build(snapshot.titles['content_id'].tolist(), term_pairs)
+    fallback = popular_strategy(snapshot)
+
+    def recommend(history, k, seen):
+        return index.more_like(history[:5], k=k, exclude=seen) or fallback(history, k, seen)
+    return recommend
+
+
+# name -> builder(training snapshot) -> recommend(history, k, seen) -> list of content_ids
+STRATEGIES = {
+    'popular': popular_strategy,
+    'genre': genre_strategy,
+    'two_stage': two_stage_strategy,
+    'similar': similar_strategy,
+}
+
+
+def evaluate_strategy(builder, train_snapshot, relevant, k=10):
+    """
+    Build one strategy on the training data and score it on the held-out titles.
+
+    Parameters:
+        builder (callable): Strategy builder, see `STRATEGIES`.
+        train_snapshot (Snapshot): Snapshot whose sessions are the training sessions.
+        relevant (dict): user_id -> held-out content_ids.
+        k (int, optional): Recommendations per user. Default is 10.
+
+    Returns:
+        dict: The metrics described in the module docstring.
+    """
+    started = time.perf_counter()
+    recommend = builder(train_snapshot)
+    build_seconds = time.perf_counter() - started
+
+    user_histories = histories(train_snapshot.sessions)
+    scores, latencies, recommended_titles = [], [], set()
+    started = time.perf_counter()
+    for user_id, held_out in relevant.items():
+        history = user_histories.get(user_id, [])
+        call_started = time.perf_counter()
+        recommended = recommend(history, k, set(history))
+        latencies.append(time.perf_counter() - call_started)
+        recommended_titles.update(recommended)
+        scores.append(precision_recall_ndcg(recommended, held_out, k))
+    wall_seconds = time.perf_counter() - started
+
+    precision, recall, ndcg = np.mean(scores, axis=0) if scores else (0.0, 0.0, 0.0)
+    latency_ms = np.percentile(np.array(latencies) * 1000, [50, 90, 99, 100]) if latencies else [0.0] * 4
+    return {
+        'users': len(relevant),
+        f'precision@{k}': round(float(precision), 5),
+        f'recall@{k}': round(float(recall), 5),
+        f'ndcg@{k}': round(float(ndcg), 5),
+        'coverage': round(len(recommended_titles) / max(len(train_snapshot.titles), 1), 5),
+        'build_seconds': round(build_seconds, 3),
+        'wall_seconds': round(wall_seconds, 3),
+        'latency_ms': dict(zip(['p50', 'p90', 'p99', 'max'], (round(float(v), 4) for v in latency_ms))),
+    }
+
+
+def run(snapshot, strategies=tuple(STRATEGIES), k=10, cutoff=None, test_fraction=0.2):
+    """
+    Evaluate several strategies on the same time split.
+
+    Returns:
+        dict: The split and one metrics dict per strategy, ready for json.dump.
+    """
+    train, relevant, cutoff = time_split(snapshot.sessions, cutoff=cutoff, test_fraction=test_fraction)
+    train_snapshot = snapshot.with_sessions(train)
+    report = {
+        'split': {'cutoff': cutoff.isoformat(), 'train_sessions': len(train),
+                  'test_users': len(relevant), 'held_out_titles': sum(len(v) for v in relevant.values())},
+        'k': k,
+        'strategies': {},
+    }
+    for name in strategies:
+        logger.info(f"Evaluating {name} on {len(relevant)} users.")
+        report['strategies'][name] = evaluate_strategy(STRATEGIES[name], train_snapshot, relevant, k=k)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline evaluation of recommendation strategies.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export', help="Export the evaluation tables from the database.")
+    export.add_argument('path')
+    evaluate = subparsers.add_parser('run', help="Evaluate strategies and write a JSON report.")
+    evaluate.add_argument('--snapshot', help="Snapshot directory; reads the database when omitted.")
+    evaluate.add_argument('--strategies', nargs='+', choices=list(STRATEGIES), default=list(STRATEGIES))
+    evaluate.add_argument('--k', type=int, default=10)
+    evaluate.add_argument('--cutoff', help="Start of the test period, e.g. 2023-06-01.")
+    evaluate.add_argument('--test-fraction', type=float, default=0.2)
+    evaluate.add_argument('--output', help="Report path; printed when omitted.")
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        Snapshot.from_db(connect_to_db(replica=True)).export(args.path)
+        return
+    snapshot = Snapshot.from_dir(args.snapshot) if args.snapshot else Snapshot.from_db(connect_to_db(replica=True))
+    report = run(snapshot, strategies=args.strategies, k=args.k, cutoff=args.cutoff, test_fraction=args.test_fraction)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
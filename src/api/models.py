@@ -6,10 +6,11 @@ import pandas as pd
 from sqlalchemy import create_engine, text
 from sqlalchemy.exc import SQLAlchemyError
 
-from datetime import date
+import operator
+from datetime import date, datetime
 from enum import Enum
 from pydantic import validator
-from sqlalchemy import PrimaryKeyConstraint, ForeignKeyConstraint
+from sqlalchemy import Index, PrimaryKeyConstraint, ForeignKeyConstraint
 from sqlmodel import Field, SQLModel, Session, Relationship
 from typing import Optional, List
 
@@ -51,6 +52,27 @@ class TitleFilter(SQLModel):
     imdb_votes: Optional[int]
     is_year_best: Optional[bool]
     is_all_time_best: Optional[bool]
+    content_id_in: Optional[List[str]]
+    content_type_in: Optional[List[str]]
+    release_year_gte: Optional[int]
+    release_year_lte: Optional[int]
+    age_certification_in: Optional[List[str]]
+    runtime_gte: Optional[int]
+    runtime_lte: Optional[int]
+    imdb_score_gte: Optional[float]
+    imdb_score_lte: Optional[float]
+    imdb_votes_gte: Optional[int]
+    imdb_votes_lte: Optional[int]
+
+class TitleSearchQuery(SQLModel):
+    query: str = Field(min_length=1, max_length=200)
+    include_credits: bool = True
+    page: int = Field(default=1, ge=1)
+    page_size: int = Field(default=20, ge=1, le=100)
+
+class PopularityQuery(SQLModel):
+    genre: Optional[str] = Field(max_length=20)
+    limit: int = Field(default=20, ge=1, le=100)
 
 class Genres(SQLModel, table=True):
     __tablename__ = "genres"
@@ -65,6 +87,8 @@ class GenreFilter(SQLModel):
     content_id: Optional[str] = Field(max_length=10)
     genre: Optional[str] = Field(max_length=20)
     is_main_genre: Optional[bool]
+    content_id_in: Optional[List[str]]
+    genre_in: Optional[List[str]]
 
 class ProdCountries(SQLModel, table=True):
     __tablename__ = "prod_countries"
@@ -79,9 +103,12 @@ class ProdCountryFilter(SQLModel):
     content_id: Optional[str] = Field(max_length=10)
     country: Optional[str] = Field(max_length=20)
     is_main_country: Optional[bool]
+    content_id_in: Optional[List[str]]
+    country_in: Optional[List[str]]
 
 class Credits(SQLModel, table=True):
     __tablename__ = "credits"
+    credit_id: Optional[int] = Field(default=None, primary_key=True)
     content_id: str = Field(foreign_key="relational.titles.content_id")
     person_id: str = Field(max_length=7)
     first_name: str = Field(max_length=35)
@@ -89,10 +116,13 @@ class Credits(SQLModel, table=True):
     last_name: str = Field(max_length=40)
     character: str = Field(max_length=400)
     role: str = Field(max_length=15)
-    __table_args__ = (PrimaryKeyConstraint('content_id', 'person_id', 'first_name', 'last_name', 'character', 'role'), {'schema': 'relational'})
+    __table_args__ = (Index('credits_person_id_idx', 'person_id', postgresql_using='hash'),
+                      Index('credits_content_id_idx', 'content_id'),
+                      {'schema': 'relational'})
     titles: "Titles" = Relationship(back_populates="credits")
 
 class CreditFilter(SQLModel):
+    credit_id: Optional[int]
     content_id: Optional[str] = Field(max_length=10)
     person_id: Optional[str] = Field(max_length=7)
     first_name: Optional[str] = Field(max_length=35)
@@ -100,6 +130,10 @@ class CreditFilter(SQLModel):
     last_name: Optional[str] = Field(max_length=40)
     character: Optional[str] = Field(max_length=400)
     role: Optional[str] = Field(max_length=15)
+    credit_id_in: Optional[List[int]]
+    content_id_in: Optional[List[str]]
+    person_id_in: Optional[List[str]]
+    role_in: Optional[List[str]]
 
 class SubscriptionType(str, Enum):
     basic = "basic"
@@ -122,8 +156,16 @@ class UserFilter(SQLModel):
     birth_date: Optional[date]
     subscription_date: Optional[date]
     subscription_type: Optional[SubscriptionType]
+    user_id_in: Optional[List[int]]
+    birth_date_gte: Optional[date]
+    birth_date_lte: Optional[date]
+    subscription_date_gte: Optional[date]
+    subscription_date_lte: Optional[date]
+    subscription_type_in: Optional[List[SubscriptionType]]
 
 class ViewSessions(SQLModel, table=True):
+    # relational.sessions is range-partitioned by month of start_timestamp (migration 002),
+    # with the same columns and primary key, so the model maps onto the parent table unchanged.
     __tablename__ = "sessions"
     start_timestamp: date
     end_timestamp: date
@@ -140,6 +182,14 @@ class ViewSessionFilter(SQLModel):
     content_id: Optional[str] = Field(max_length=10)
     user_id: Optional[int]
     user_rating: Optional[int]
+    start_timestamp_gte: Optional[datetime]
+    start_timestamp_lte: Optional[datetime]
+    end_timestamp_gte: Optional[datetime]
+    end_timestamp_lte: Optional[datetime]
+    content_id_in: Optional[List[str]]
+    user_id_in: Optional[List[int]]
+    user_rating_gte: Optional[int]
+    user_rating_lte: Optional[int]
 
 class Recommendations(SQLModel, table=True):
     __tablename__ = "recommendations"
@@ -148,3 +198,39 @@ class Recommendations(SQLModel, table=True):
     user_id: int = Field(foreign_key="relational.users.user_id")
     users: "Users" = Relationship(back_populates="recommendations")
     titles: "Titles" = Relationship(back_populates="recommendations")
+
+# Suffixes a *Filter field can carry to compare its column with something other than equality.
+FILTER_OPERATORS = {
+    '_gte': operator.ge,
+    '_lte': operator.le,
+    '_in': lambda column, values: column.in_(values),
+}
+
+def filter_predicates(model, non_none_filter):
+    """
+    Compile the set fields of a *Filter model into SQL predicates on a table model.
+
+    Fields named after a column compare for equality, as `filter_by` did. Fields with a
+    `_gte`, `_lte` or `_in` suffix compare the column with >=, <= or IN, so range and set
+    queries run as one indexed statement instead of being filtered on the client.
+
+    Args:
+        model: The SQLModel table class to filter, e.g. Titles.
+        non_none_filter (dict): The filter fields that were provided.
+
+    Returns:
+        list: SQLAlchemy expressions to pass to `Query.filter`.
+
+    Raises:
+        ValueError: If a field is neither a column nor a column with a known suffix.
+    """
+    predicates = []
+    for name, value in non_none_filter.items():
+        if hasattr(model, name):
+            predicates.append(getattr(model, name) == value)
+            continue
+        suffix = next((suffix for suffix in FILTER_OPERATORS if name.endswith(suffix)), None)
+        if suffix is None or not hasattr(model, name[:-len(suffix)]):
+            raise ValueError(f"unknown filter field {name}")
+        predicates.append(FILTER_OPERATORS[suffix](getattr(model, name[:-len(suffix)]), value))
+    return predicates
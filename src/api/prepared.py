@@ -0,0 +1,114 @@
+"""
+Named server-side prepared statements.
+
+A `PreparedStatement` is written like any `text()` query, with `:name` parameters. The first
+time it runs on a connection, it is sent once as `PREPARE name AS ...`, with the parameters
+rewritten to `$1, $2, ...`. After that, each call sends only `EXECUTE name (...)` with the
+bound values. Postgres parses and plans the statement once per connection rather than on every
+call, and values are never spliced into the SQL.
+
+Prepared statements live as long as the database session, and PREPARE is not undone by a
+rollback. Which names a connection has prepared is kept in the connection's `info` dict,
+which SQLAlchemy clears when the connection is replaced.
+"""
+
+import re
+
+from psycopg2 import errors
+from sqlalchemy.exc import DBAPIError
+
+_PARAMETER = re.compile(r"(?<![:\w]):(\w+)(?!:)")
+
+
+def to_positional(query):
+    """
+    Rewrite `:name` parameters to `$1, $2, ...`; repeated names share one position.
+
+    Parameters:
+        query (str): SQL with `:name` parameters. `::type` casts are left alone.
+
+    Returns:
+        tuple: (SQL with positional parameters, parameter names in position order).
+    """
+    names = []
+
+    def position(match):
+        if match.group(1) not in names:
+            names.append(match.group(1))
+        return f"${names.index(match.group(1)) + 1}"
+
+    return _PARAMETER.sub(position, query).strip().rstrip(';'), tuple(names)
+
+
+class PreparedStatement:
+    """
+    A query that is prepared once per connection under `name`.
+
+    Parameters:
+        name (str): Statement name, unique within the application.
+        query (str): SQL with `:name` parameters.
+    """
+
+    __slots__ = ('name', 'query', 'parameters', 'prepare_sql', 'execute_sql')
+
+    def __init__(self, name, query):
+        self.name = name
+        self.query = query
+        positional, self.parameters = to_positional(query)
+        self.prepare_sql = f"PREPARE {name} AS {positional};"
+        arguments = ', '.join(f"%({parameter})s" for parameter in self.parameters)
+        self.execute_sql = f"EXECUTE {name} ({arguments});" if arguments else f"EXECUTE {name};"
+
+    def bind(self, params=None):
+        """
+        Check that every parameter has a value.
+
+        Returns:
+            dict: The values for `execute_sql`.
+        """
+        params = params or {}
+        missing = [parameter for parameter in self.parameters if parameter not in params]
+        if missing:
+            raise ValueError(f"Statement {self.name} is missing values for {', '.join(missing)}.")
+        return {parameter: params[parameter] for parameter in self.parameters}
+
+    def ensure_prepared(self, conn):
+        """
+        PREPARE the statement on this connection unless it already has been.
+
+        Parameters:
+            conn (Connection): SQLAlchemy connection.
+        """
+        prepared = conn.info.setdefault('prepared_statements', set())
+        if self.name in prepared:
+            return
+        try:
+            # Sent without parameters, so the driver does not %-interpolate the SQL. Inside a
+            # transaction it runs in a savepoint, so a failed PREPARE does not abort the caller's.
+            if conn.in_transaction():
+                with conn.begin_nested():
+                    conn.exec_driver_sql(self.prepare_sql)
+            else:
+                conn.exec_driver_sql(self.prepare_sql)
+        except DBAPIError as e:
+            # The session already has it, e.g. prepared by an earlier call whose record was lost.
+            if not isinstance(e.orig, errors.DuplicatePreparedStatement):
+                raise
+        prepared.add(self.name)
+
+    def execute(self, conn, params=None):
+        """
+        Run the statement on `conn`, preparing it first if needed.
+
+        Returns:
+            CursorResult: As returned by `conn.exec_driver_sql`.
+        """
+        self.ensure_prepared(conn)
+        try:
+            return conn.exec_driver_sql(self.execute_sql, self.bind(params))
+        except DBAPIError as e:
+            # Only when the statement is really gone, e.g. the session was reset behind the
+            # pool's back, prepare it again next time. Any other error leaves it prepared.
+            if isinstance(e.orig, errors.InvalidSqlStatementName):
+                conn.info.get('prepared_statements', set()).discard(self.name)
+            raise
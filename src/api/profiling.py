@@ -0,0 +1,221 @@
+"""
+Opt-in SQL profiling for SQLAlchemy engines.
+
+A `QueryProfiler` listens to an engine's cursor events and records, for every statement,
+its wall time, the rows it returned or affected, and the approximate bytes fetched. Statements
+are grouped by normalized text, with literals and parameters replaced by `?`, so that the same
+query with different arguments is reported once.
+
+When a statement is slower than `slow_ms`, the profiler runs
+`EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)` on it on the same connection. The explain runs inside
+a savepoint that is always rolled back, so writes are not applied twice. Only the plan of the
+slowest execution of each query is kept.
+
+    from profiling import QueryProfiler
+
+    with QueryProfiler(engine, slow_ms=50) as profiler:
+        run_the_job()
+    print(profiler.report())
+
+db_local_api has a profiler on its primary and replica engines. Enable it with DB_PROFILE=1 or
+`db_local_api.profiler.enable()`.
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PARAMETER = re.compile(r"%\([^)]+\)s|%s|(?<!:):\w+|\$\d+|\?")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(statement):
+    """
+    Replace the literals and parameters of a statement by `?` and collapse whitespace.
+
+    Parameters:
+        statement (str): SQL as sent to the driver.
+
+    Returns:
+        str: The statement's shape, equal for executions that differ only in their arguments.
+    """
+    normalized = _STRING.sub('?', statement)
+    normalized = _PARAMETER.sub('?', normalized)
+    normalized = _NUMBER.sub('?', normalized)
+    normalized = _LIST.sub('(...)', normalized)
+    return _WHITESPACE.sub(' ', normalized).strip().rstrip(';')
+
+
+def payload_bytes(rows):
+    """
+    Approximate size of fetched rows: the length of every non-null value in text form, as on
+    the wire in Postgres' text protocol.
+    """
+    return sum(len(value) if isinstance(value, (str, bytes, memoryview)) else len(str(value))
+               for row in rows for value in row if value is not None)
+
+
+class QueryStats:
+    """
+    Aggregated measurements of one normalized query.
+    """
+
+    __slots__ = ('query', 'calls', 'total_ms', 'max_ms', 'rows', 'bytes', 'plan', 'plan_ms')
+
+    def __init__(self, query):
+        self.query = query
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.plan = None
+        self.plan_ms = 0.0
+
+    def as_dict(self):
+        return {
+            'query': self.query,
+            'calls': self.calls,
+            'total_ms': round(self.total_ms, 3),
+            'mean_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'plan': self.plan,
+        }
+
+
+class QueryProfiler:
+    """
+    Records per-statement timings on one or more engines while enabled.
+
+    Parameters:
+        engine (Engine or list): The SQLAlchemy engine to instrument, or several engines, e.g.
+            a primary and its read replicas, whose statements are reported together.
+        slow_ms (float, optional): Capture the plan of statements slower than this. None
+            disables plan capture. Default is 100.
+        measure_bytes (bool, optional): Count the bytes of returned rows. The rows are read an
+            extra time for this, which costs some Python time on large results. Default is True.
+    """
+
+    def __init__(self, engine, slow_ms=100.0, measure_bytes=True):
+        self.engines = list(engine) if isinstance(engine, (list, tuple)) else [engine]
+        self.slow_ms = slow_ms
+        self.measure_bytes = measure_bytes
+        self.enabled = False
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self):
+        return self.engines[0]
+
+    def enable(self):
+        if not self.enabled:
+            for engine in self.engines:
+                event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+            self.enabled = True
+        return self
+
+    def disable(self):
+        if self.enabled:
+            for engine in self.engines:
+                event.remove(engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.remove(engine, 'after_cursor_execute', self._after_cursor_execute)
+            self.enabled = False
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info['profiler_started'].pop()) * 1000
+        rows, fetched = max(cursor.rowcount, 0), 0
+        # psycopg2's client-side cursors hold the whole result already; read it and rewind.
+        if self.measure_bytes and cursor.description is not None and hasattr(cursor, 'scroll'):
+            fetched = payload_bytes(cursor.fetchall())
+            cursor.scroll(0, mode='absolute')
+        plan = None
+        if self.slow_ms is not None and elapsed_ms >= self.slow_ms and not executemany:
+            plan = self._explain(conn, cursor, statement, parameters)
+
+        query = normalize_query(statement)
+        with self._lock:
+            stats = self.stats.get(query)
+            if stats is None:
+                stats = self.stats[query] = QueryStats(query)
+            stats.calls += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.rows += rows
+            stats.bytes += fetched
+            if plan is not None and elapsed_ms >= stats.plan_ms:
+                stats.plan, stats.plan_ms = plan, elapsed_ms
+        if plan is not None:
+            logger.info(f"Slow statement ({elapsed_ms:.1f} ms): {query}")
+
+    def _explain(self, conn, cursor, statement, parameters):
+        if conn.dialect.name != 'postgresql':
+            return None
+        # A savepoint keeps the caller's transaction intact and undoes the re-executed statement.
+        # Autocommit connections have no transaction to hold the savepoint; their statements are
+        # not explained.
+        with cursor.connection.cursor() as explain_cursor:
+            try:
+                explain_cursor.execute("SAVEPOINT query_profiler;")
+            except Exception as e:
+                logger.warning(f"Could not explain statement: {e}")
+                return None
+            try:
+                explain_cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters)
+                plan = explain_cursor.fetchone()[0]
+            except Exception as e:
+                logger.warning(f"Could not explain statement: {e}")
+                plan = None
+            explain_cursor.execute("ROLLBACK TO SAVEPOINT query_profiler;")
+            explain_cursor.execute("RELEASE SAVEPOINT query_profiler;")
+        return plan[0] if isinstance(plan, list) else plan
+
+    def report(self, sort_by='total_ms', top=None):
+        """
+        Aggregated measurements per normalized query.
+
+        Parameters:
+            sort_by (str, optional): Column to sort on, descending. Default is 'total_ms'.
+            top (int, optional): Keep only this many queries.
+
+        Returns:
+            DataFrame: query, calls, total_ms, mean_ms, max_ms, rows, bytes and the captured plan.
+        """
+        with self._lock:
+            records = [stats.as_dict() for stats in self.stats.values()]
+        columns = ['query', 'calls', 'total_ms', 'mean_ms', 'max_ms', 'rows', 'bytes', 'plan']
+        df = pd.DataFrame(records, columns=columns).sort_values(sort_by, ascending=False, ignore_index=True)
+        return df if top is None else df.head(top)
+
+    def dump(self, path):
+        """
+        Write the report, plans included, as JSON.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.report().to_dict(orient='records'), f, indent=2, default=str)
@@ -0,0 +1,217 @@
+"""
+Parallel regeneration of recommendations for every user.
+
+The user_ids in relational.users are split into shards, by contiguous user_id range or by
+user_id hash, and the shards are spread over a process pool. Each worker process opens its own
+small connection pool and writes its shard through `relational.make_recommendations`
+(migrations/005) in batches of users, one statement and one transaction per batch. The driver
+logs progress and throughput as shards complete and resubmits failed shards, on a new pool if
+a worker died. Retries are safe because the function skips pairs that are already recommended.
+
+    python reco_batch.py --workers 8 --strategy hash --batch-size 500
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from sqlalchemy import text
+
+from db_connect import connect_to_db
+
+logging.basicConfig(level=logging.INFO,
+                    format='[%(asctime)s] %(levelname)s in %(module)s: %(message)s]',
+                    datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+USER_IDS_QUERY = "SELECT user_id FROM relational.users ORDER BY user_id;"
+
+# Counts instead of returning the rows: a batch run only needs to know how much it wrote.
+RECOMMEND_BATCH_QUERY = """
+    SELECT count(*)
+    FROM relational.make_recommendations(CAST(:user_ids AS int[]), :history, :max_recos);
+"""
+
+# The engine of the current worker process, created by _init_worker.
+_engine = None
+
+
+def shard_users(user_ids, shards, strategy='range'):
+    """
+    Split user_ids into at most `shards` shards.
+
+    Parameters:
+        user_ids (list): User IDs, sorted for the range strategy.
+        shards (int): Number of shards to produce.
+        strategy (str, optional): 'range' for contiguous user_id ranges of near-equal size, or
+            'hash' for user_id modulo `shards`. Default is 'range'.
+
+    Returns:
+        list: Non-empty lists of user IDs.
+    """
+    if shards < 1:
+        raise ValueError("shards must be at least 1.")
+    if strategy == 'range':
+        size, extra = divmod(len(user_ids), shards)
+        result, start = [], 0
+        for shard in range(shards):
+            end = start + size + (1 if shard < extra else 0)
+            result.append(list(user_ids[start:end]))
+            start = end
+    elif strategy == 'hash':
+        result = [[] for _ in range(shards)]
+        for user_id in user_ids:
+            result[int(user_id) % shards].append(user_id)
+    else:
+        raise ValueError(f"Unknown sharding strategy {strategy!r}, expected 'range' or 'hash'.")
+    return [shard for shard in result if shard]
+
+
+def batches(user_ids, batch_size):
+    """
+    Yield consecutive slices of `user_ids` of at most `batch_size` users.
+    """
+    for start in range(0, len(user_ids), batch_size):
+        yield user_ids[start:start + batch_size]
+
+
+def _init_worker():
+    """
+    Give the worker process its own engine. Engines must not cross process boundaries.
+    """
+    global _engine
+    _engine = connect_to_db()
+
+
+def _run_shard(shard_id, user_ids, batch_size, history, max_recos):
+    """
+    Write the recommendations of one shard in the current worker process.
+
+    Returns:
+        tuple: (shard_id, users processed, recommendations written, seconds taken).
+    """
+    started = time.perf_counter()
+    written = 0
+    for batch in batches(user_ids, batch_size):
+        with _engine.begin() as conn:
+            written += conn.execute(text(RECOMMEND_BATCH_QUERY),
+                                    {'user_ids': [int(user_id) for user_id in batch],
+                                     'history': history, 'max_recos': max_recos}).scalar()
+    return shard_id, len(user_ids), written, time.perf_counter() - started
+
+
+def regenerate(workers=None, shards=None, strategy='range', batch_size=500, retries=2,
+               history=5, max_recos=10, user_ids=None):
+    """
+    Regenerate recommendations for all users in parallel.
+
+    Parameters:
+        workers (int, optional): Worker processes. Defaults to the number of CPUs.
+        shards (int, optional): Number of shards. Defaults to four per worker, so a slow shard
+            does not leave the other workers idle at the end of the run.
+        strategy (str, optional): 'range' or 'hash', see `shard_users`. Default is 'range'.
+        batch_size (int, optional): Users per statement within a shard. Default is 500.
+        retries (int, optional): How many times a failed shard is resubmitted. Default is 2.
+        history (int, optional): Latest sessions per user the genres are taken from. Default is 5.
+        max_recos (int, optional): Maximum recommendations per user. Default is 10.
+        user_ids (list, optional): Users to process instead of every user in relational.users.
+
+    Returns:
+        dict: users, recommendations written, seconds, users per second and the shard IDs
+            that still failed after all retries.
+    """
+    workers = workers or os.cpu_count() or 1
+    if user_ids is None:
+        engine = connect_to_db()
+        with engine.connect() as conn:
+            user_ids = [row.user_id for row in conn.execute(text(USER_IDS_QUERY))]
+        engine.dispose()
+    shard_list = shard_users(user_ids, shards or workers * 4, strategy)
+    logger.info(f"Regenerating recommendations for {len(user_ids)} users in {len(shard_list)} "
+                f"{strategy} shards on {workers} workers.")
+
+    started = time.perf_counter()
+    done_users = written = 0
+    failed = []
+    attempts = {shard_id: 0 for shard_id in range(len(shard_list))}
+    context = multiprocessing.get_context('spawn')
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker)
+
+    def submit(shard_id, attempt=True):
+        attempts[shard_id] += attempt
+        return pool.submit(_run_shard, shard_id, shard_list[shard_id], batch_size, history, max_recos)
+
+    def retry(shard_id, e):
+        if attempts[shard_id] <= retries:
+            logger.warning(f"Shard {shard_id} failed on attempt {attempts[shard_id]}, retrying: {e}")
+            pending[submit(shard_id)] = shard_id
+        else:
+            logger.error(f"Shard {shard_id} failed after {attempts[shard_id]} attempts: {e}")
+            failed.append(shard_id)
+
+    try:
+        pending = {submit(shard_id): shard_id for shard_id in attempts}
+        while pending:
+            future = next(as_completed(pending))
+            shard_id = pending.pop(future)
+            try:
+                _, users, shard_written, seconds = future.result()
+            except BrokenProcessPool as e:
+                # A worker died, e.g. killed for running out of memory, and took the pool with it.
+                # Every unfinished shard fails the same way, so start a new pool and resubmit
+                # them. Only the shard that reported the failure uses up an attempt.
+                logger.warning(f"Worker pool broke, restarting it: {e}")
+                lost = [other for other in pending if not other.done() or isinstance(other.exception(), BrokenProcessPool)]
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker)
+                for other in lost:
+                    other_id = pending.pop(other)
+                    pending[submit(other_id, attempt=False)] = other_id
+                retry(shard_id, e)
+                continue
+            except Exception as e:
+                retry(shard_id, e)
+                continue
+            done_users += users
+            written += shard_written
+            elapsed = time.perf_counter() - started
+            logger.info(f"Shard {shard_id}: {users} users, {shard_written} recommendations in {seconds:.1f}s. "
+                        f"Progress {done_users}/{len(user_ids)} users, {done_users / elapsed:.0f} users/s.")
+    finally:
+        pool.shutdown()
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        'users': done_users,
+        'recommendations': written,
+        'seconds': round(elapsed, 2),
+        'users_per_second': round(done_users / elapsed, 1) if elapsed else 0.0,
+        'failed_shards': sorted(failed),
+    }
+    logger.info(f"Regeneration finished: {summary}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate recommendations for all users in parallel.")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes, defaults to the CPU count.")
+    parser.add_argument('--shards', type=int, default=None, help="Number of shards, defaults to 4 per worker.")
+    parser.add_argument('--strategy', choices=['range', 'hash'], default='range')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--retries', type=int, default=2)
+    parser.add_argument('--history', type=int, default=5)
+    parser.add_argument('--max-recos', type=int, default=10)
+    args = parser.parse_args()
+    summary = regenerate(workers=args.workers, shards=args.shards, strategy=args.strategy,
+                         batch_size=args.batch_size, retries=args.retries,
+                         history=args.history, max_recos=args.max_recos)
+    if summary['failed_shards']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
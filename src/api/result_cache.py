@@ -0,0 +1,206 @@
+"""
+LRU result cache for `db_local_api.read`.
+
+Results are keyed on the query text, with whitespace collapsed, plus the parameters. Repeated
+exploratory reads such as full `titles` or `genres` pulls are therefore served from memory. Every entry records the tables its query reads. A `write` invalidates the entries
+that read any table it touches, including tables changed as a side effect, such as the
+popularity tables that the sessions trigger maintains. Entries also expire after `ttl`
+seconds, which bounds staleness from writes made outside this process.
+
+With `persist_dir`, entries are also written there as Parquet files and survive restarts of
+the notebook kernel. Parquet needs pyarrow; without it the cache stays in memory only.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+(?:ONLY\s+)?([\w.\"]+)", re.IGNORECASE)
+_WRITE_TABLES = re.compile(r"\b(?:INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?|FROM|JOIN)\s+(?:ONLY\s+)?([\w.\"]+)",
+                           re.IGNORECASE)
+
+# Views and functions, and the tables they read.
+DEPENDENCIES = {
+    'popular_titles': ('titles', 'title_popularity'),
+    'popular_titles_by_genre': ('titles', 'genre_popularity'),
+    'make_recommendations': ('sessions', 'genres', 'titles', 'recommendations', 'title_popularity'),
+}
+# Tables (or functions) whose writes also change other tables.
+SIDE_EFFECTS = {
+    'sessions': ('title_popularity', 'genre_popularity'),
+    'titles': ('title_popularity', 'genre_popularity'),
+    'make_recommendations': ('recommendations',),
+}
+
+
+def _table_name(identifier):
+    return identifier.replace('"', '').split('.')[-1].lower()
+
+
+def read_tables(query):
+    """
+    The tables a read query depends on, views and functions expanded.
+
+    Returns:
+        frozenset: Unqualified, lowercase table names.
+    """
+    tables = set()
+    for name in map(_table_name, _READ_TABLES.findall(query)):
+        tables.add(name)
+        tables.update(DEPENDENCIES.get(name, ()))
+    return frozenset(tables)
+
+
+def written_tables(query):
+    """
+    The tables a write may change, side effects included. Tables it only reads are included
+    too; invalidating a few extra entries is cheaper than serving a stale one.
+
+    Returns:
+        frozenset: Unqualified, lowercase table names; empty if none could be found.
+    """
+    tables = set()
+    for name in map(_table_name, _WRITE_TABLES.findall(query)):
+        tables.add(name)
+        tables.update(SIDE_EFFECTS.get(name, ()))
+    return frozenset(tables)
+
+
+def cache_key(query, params=None):
+    # Literals stay in the key: unlike a profile, a cache must tell `= 'tm1'` from `= 'tm2'`.
+    query = _WHITESPACE.sub(' ', query).strip().rstrip(';')
+    return query + '|' + json.dumps(params or {}, sort_keys=True, default=str)
+
+
+class ResultCache:
+    """
+    Bounded, expiring cache of query results as DataFrames.
+
+    Parameters:
+        max_entries (int, optional): Entries kept, least recently used evicted first. Default is 128.
+        ttl (float, optional): Seconds an entry is served. Default is 300.
+        persist_dir (str, optional): Directory to persist entries to as Parquet.
+    """
+
+    def __init__(self, max_entries=128, ttl=300.0, persist_dir=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist_dir = persist_dir
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+            self._load_persisted()
+
+    def get(self, query, params=None):
+        """
+        Returns:
+            DataFrame: A copy of the cached result, or None on a miss.
+        """
+        key = cache_key(query, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2].copy()
+
+    def put(self, query, params, df):
+        key = cache_key(query, params)
+        entry = (time.time() + self.ttl, read_tables(query), df.copy())
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+        if self.persist_dir:
+            self._persist(key, entry)
+
+    def invalidate(self, tables=None):
+        """
+        Drop the entries that read any of `tables`, or every entry if `tables` is empty or None.
+        """
+        with self._lock:
+            stale = [key for key, (_, read, _) in self._entries.items() if not tables or read & set(tables)]
+            for key in stale:
+                self._drop(key)
+            self.invalidations += len(stale)
+
+    def invalidate_for(self, query):
+        """
+        Drop the entries a write query may have made stale.
+        """
+        self.invalidate(written_tables(query))
+
+    def clear(self):
+        self.invalidate()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'invalidations': self.invalidations}
+
+    def _drop(self, key):
+        del self._entries[key]
+        if self.persist_dir:
+            for path in self._paths(key):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _paths(self, key):
+        name = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.persist_dir, f"{name}.parquet"), os.path.join(self.persist_dir, f"{name}.json")
+
+    def _persist(self, key, entry):
+        data_path, meta_path = self._paths(key)
+        expires_at, tables, df = entry
+        try:
+            df.to_parquet(data_path, index=False)
+        except ImportError as e:
+            logger.warning(f"Result cache persistence disabled: {e}")
+            self.persist_dir = None
+            return
+        with open(meta_path, 'w') as f:
+            json.dump({'key': key, 'expires_at': expires_at, 'tables': sorted(tables)}, f)
+
+    def _load_persisted(self):
+        now = time.time()
+        for name in sorted(os.listdir(self.persist_dir)):
+            if not name.endswith('.json'):
+                continue
+            with open(os.path.join(self.persist_dir, name)) as f:
+                meta = json.load(f)
+            data_path, meta_path = self._paths(meta['key'])
+            if meta['expires_at'] <= now or not os.path.exists(data_path):
+                for path in (data_path, meta_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                continue
+            try:
+                df = pd.read_parquet(data_path)
+            except ImportError as e:
+                logger.warning(f"Result cache persistence disabled: {e}")
+                self.persist_dir = None
+                return
+            self._entries[meta['key']] = (meta['expires_at'], frozenset(meta['tables']), df)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
@@ -0,0 +1,202 @@
+"""
+Schema-driven pandas dtypes for the relational tables.
+
+`RELATIONAL_SCHEMA` mirrors the `CREATE TABLE` definitions in
+`ds_relational_schema/relational_schema_1.ipynb`. It is shared by the ETL notebook, which
+validates and compacts frames before loading them, and by `db_local_api.read`, which can
+compact query results. Small vocabularies become categoricals and numeric columns are
+downcast to the width of their SQL type.
+"""
+
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+SQL_INT_RANGES = {
+    'smallint': (-2**15, 2**15 - 1),
+    'int': (-2**31, 2**31 - 1),
+    'bigint': (-2**63, 2**63 - 1),
+}
+
+# pandas dtype used for each SQL type. None leaves the column as loaded.
+SQL_TYPE_DTYPES = {
+    'smallint': 'Int16',
+    'int': 'Int32',
+    'bigint': 'Int64',
+    'real': 'float32',
+    'boolean': 'boolean',
+    'varchar': None,
+    'date': None,
+    'timestamp': None,
+}
+
+
+class Column:
+    """
+    A column definition from the relational schema.
+
+    Parameters:
+        sql_type (str): The SQL type without length, e.g. 'varchar' or 'smallint'.
+        max_length (int, optional): The varchar length limit.
+        nullable (bool): False for NOT NULL and primary key columns.
+        choices (tuple, optional): Allowed values from a CHECK (... IN (...)) constraint.
+        categorical (bool): Store the column as a pandas categorical.
+    """
+
+    def __init__(self, sql_type, max_length=None, nullable=True, choices=None, categorical=False):
+        self.sql_type = sql_type
+        self.max_length = max_length
+        self.nullable = nullable
+        self.choices = choices
+        self.categorical = categorical
+
+    @property
+    def dtype(self):
+        return 'category' if self.categorical else SQL_TYPE_DTYPES[self.sql_type]
+
+
+RELATIONAL_SCHEMA = {
+    'titles': {
+        'content_id': Column('varchar', 10, nullable=False),
+        'title': Column('varchar', 200),
+        'content_type': Column('varchar', 5, nullable=False, choices=('movie', 'MOVIE', 'show', 'SHOW'), categorical=True),
+        'release_year': Column('smallint'),
+        'age_certification': Column('varchar', 10, categorical=True),
+        'runtime': Column('smallint'),
+        'number_of_seasons': Column('smallint'),
+        'imdb_id': Column('varchar', 15),
+        'imdb_score': Column('real'),
+        'imdb_votes': Column('bigint'),
+        'is_year_best': Column('boolean'),
+        'is_all_time_best': Column('boolean'),
+    },
+    'genres': {
+        'content_id': Column('varchar', 10, nullable=False),
+        'genre': Column('varchar', 20, nullable=False, categorical=True),
+        'is_main_genre': Column('boolean'),
+    },
+    'prod_countries': {
+        'content_id': Column('varchar', 10, nullable=False),
+        'country': Column('varchar', 20, nullable=False, categorical=True),
+        'is_main_country': Column('boolean'),
+    },
+    'credits': {
+        'credit_id': Column('int', nullable=False),
+        'content_id': Column('varchar', 10, nullable=False),
+        'person_id': Column('varchar', 7, nullable=False),
+        'first_name': Column('varchar', 35, nullable=False),
+        'middle_name': Column('varchar', 35),
+        'last_name': Column('varchar', 40, nullable=False),
+        'character': Column('varchar', 400, nullable=False),
+        'role': Column('varchar', 15, nullable=False, categorical=True),
+    },
+    'users': {
+        'user_id': Column('int', nullable=False),
+        'birth_date': Column('date'),
+        'subscription_date': Column('date'),
+        'subscription_type': Column('varchar', 10, nullable=False, choices=('basic', 'standard', 'premium'), categorical=True),
+    },
+    'sessions': {
+        'start_timestamp': Column('timestamp', nullable=False),
+        'end_timestamp': Column('timestamp', nullable=False),
+        'content_id': Column('varchar', 10, nullable=False),
+        'user_id': Column('int', nullable=False),
+        'user_rating': Column('int'),
+    },
+    'recommendations': {
+        'content_id': Column('varchar', 10, nullable=False),
+        'user_id': Column('int', nullable=False),
+    },
+}
+
+# Column names mean the same thing in every table, so query results can be compacted by name.
+COLUMN_DTYPES = {
+    name: column.dtype
+    for table in RELATIONAL_SCHEMA.values()
+    for name, column in table.items()
+    if column.dtype is not None
+}
+
+# Dtypes for the raw Kaggle CSVs, passed to `pd.read_csv(dtype=...)`. Scores are left as
+# float64 because they are merge keys against the best-of CSVs.
+RAW_CSV_DTYPES = {
+    'raw_titles': {
+        'type': 'category',
+        'age_certification': 'category',
+        'release_year': 'Int16',
+        'runtime': 'Int16',
+        'seasons': 'Int16',
+    },
+    'raw_credits': {
+        'role': 'category',
+    },
+}
+
+
+def validate(df, table):
+    """
+    Check a DataFrame against the column definitions of a relational table.
+
+    Parameters:
+        df (DataFrame): The frame to be loaded into `table`.
+        table (str): A key of `RELATIONAL_SCHEMA`.
+
+    Raises:
+        ValueError: Listing every column whose values the table would reject.
+    """
+    errors = []
+    for name, column in RELATIONAL_SCHEMA[table].items():
+        if name not in df.columns:
+            continue
+        values = df[name]
+        present = values.dropna()
+        if not column.nullable and len(present) != len(values):
+            errors.append(f"{name}: {len(values) - len(present)} null(s) in a NOT NULL column")
+        if column.max_length is not None and len(present):
+            too_long = (present.astype(str).str.len() > column.max_length).sum()
+            if too_long:
+                errors.append(f"{name}: {too_long} value(s) longer than varchar({column.max_length})")
+        if column.choices is not None:
+            invalid = set(present.unique()) - set(column.choices)
+            if invalid:
+                errors.append(f"{name}: values {sorted(invalid)} not in {column.choices}")
+        if column.sql_type in SQL_INT_RANGES and len(present):
+            low, high = SQL_INT_RANGES[column.sql_type]
+            numbers = present if is_numeric_dtype(present) else pd.to_numeric(present, errors='coerce')
+            if numbers.min() < low or numbers.max() > high:
+                errors.append(f"{name}: values outside the {column.sql_type} range [{low}, {high}]")
+    if errors:
+        raise ValueError(f"DataFrame does not fit relational.{table}: " + "; ".join(errors))
+
+
+def apply_dtypes(df, table, check=True):
+    """
+    Validate a DataFrame against a relational table and cast it to compact dtypes.
+
+    Parameters:
+        df (DataFrame): The frame to be loaded into `table`.
+        table (str): A key of `RELATIONAL_SCHEMA`.
+        check (bool, optional): Run `validate` first. Default is True.
+
+    Returns:
+        DataFrame: The frame with categorical and downcast columns.
+    """
+    if check:
+        validate(df, table)
+    dtypes = {name: column.dtype for name, column in RELATIONAL_SCHEMA[table].items()
+              if name in df.columns and column.dtype is not None}
+    return df.astype(dtypes)
+
+
+def compact_dtypes(df):
+    """
+    Cast the known relational columns of a query result to compact dtypes.
+
+    Columns that are not part of the relational schema, such as aggregates, are left as they are.
+
+    Parameters:
+        df (DataFrame): A query result.
+
+    Returns:
+        DataFrame: The frame with categorical and downcast columns.
+    """
+    return df.astype({name: COLUMN_DTYPES[name] for name in df.columns if name in COLUMN_DTYPES})
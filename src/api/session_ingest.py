@@ -0,0 +1,259 @@
+"""
+Write-behind buffer for high-volume view session ingest.
+
+`POST /view_session/` commits every session on its own. `POST /view_session/ingest/` instead
+validates the sessions, puts them on a bounded in-process queue and answers 202 right away.
+A background task drains the queue and writes it to relational.sessions with COPY. A flush
+happens when `batch_size` sessions are waiting or when the oldest waiting session is
+`flush_interval` seconds old, whichever comes first.
+
+When the queue is full, `put` waits up to `put_timeout` seconds for room and then gives up.
+The endpoint turns that into a 503 with Retry-After so clients slow down instead of the
+process growing without bound. `stop` flushes everything still queued, and the web API calls
+it on shutdown.
+
+If the database cannot be reached, the batch is retried with exponential backoff while new
+sessions keep queueing, until the queue fills and `put` starts refusing them. Sessions
+acknowledged but not yet flushed are lost if the process dies. Use the synchronous
+endpoint when every session must be durable before the response.
+"""
+
+import asyncio
+import csv
+import io
+import logging
+import os
+import time
+
+import psycopg2
+from sqlalchemy import text
+from sqlalchemy.exc import DataError, IntegrityError
+
+logger = logging.getLogger(__name__)
+
+SESSION_COLUMNS = ('start_timestamp', 'end_timestamp', 'content_id', 'user_id', 'user_rating')
+
+COPY_SESSIONS_QUERY = f"COPY relational.sessions ({', '.join(SESSION_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+INSERT_SESSION_QUERY = f"""
+    INSERT INTO relational.sessions ({', '.join(SESSION_COLUMNS)})
+    VALUES ({', '.join(':' + column for column in SESSION_COLUMNS)})
+    ON CONFLICT DO NOTHING;
+"""
+
+
+class IngestQueueFull(Exception):
+    """
+    Raised by `SessionIngestBuffer.put` when the queue stayed full for `put_timeout` seconds.
+    """
+
+
+def sessions_csv(rows):
+    """
+    Render session rows as the CSV that COPY ... WITH (FORMAT csv) reads.
+
+    Parameters:
+        rows (list): Dicts with the `SESSION_COLUMNS` keys.
+
+    Returns:
+        StringIO: The CSV, positioned at the start. None values become unquoted empty fields,
+            which COPY reads as NULL.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for row in rows:
+        writer.writerow(['' if row[column] is None else row[column] for column in SESSION_COLUMNS])
+    buffer.seek(0)
+    return buffer
+
+
+class SessionIngestBuffer:
+    """
+    A bounded queue of view sessions flushed to Postgres in batches by a background task.
+
+    Parameters:
+        engine (Engine): SQLAlchemy engine used for the COPY.
+        max_queued (int, optional): Queue capacity in sessions. Default is 10000.
+        batch_size (int, optional): Flush as soon as this many sessions are waiting. Default is 1000.
+        flush_interval (float, optional): Flush sessions that have waited this many seconds. Default is 0.5.
+        put_timeout (float, optional): How long `put` waits for room in a full queue. Default is 1.0.
+        retry_delay (float, optional): First wait before retrying a batch the database could not
+            take, doubled on every further failure. Default is 0.5.
+        max_retry_delay (float, optional): Longest wait between retries. Default is 30.
+    """
+
+    def __init__(self, engine, max_queued=10000, batch_size=1000, flush_interval=0.5, put_timeout=1.0,
+                 retry_delay=0.5, max_retry_delay=30.0):
+        self.engine = engine
+        self.max_queued = max_queued
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.queue = None
+        self.task = None
+        self.writing = None
+        self.unflushed = []
+        self.flushed = 0
+        self.failed = 0
+
+    @classmethod
+    def from_env(cls, engine):
+        """
+        Create a buffer configured by the SESSION_INGEST_* environment variables.
+        """
+        return cls(engine,
+                   max_queued=int(os.getenv('SESSION_INGEST_MAX_QUEUED', 10000)),
+                   batch_size=int(os.getenv('SESSION_INGEST_BATCH_SIZE', 1000)),
+                   flush_interval=float(os.getenv('SESSION_INGEST_FLUSH_INTERVAL', 0.5)),
+                   put_timeout=float(os.getenv('SESSION_INGEST_PUT_TIMEOUT', 1.0)))
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        """
+        Start the flush task on the running event loop. Does nothing if it is already running.
+
+        A restarted task keeps draining the existing queue, so nothing queued is lost.
+        """
+        if self.running:
+            return
+        if self.task is not None and not self.task.cancelled() and self.task.exception() is not None:
+            logger.error(f"Session ingest flush task died, restarting it: {self.task.exception()!r}")
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queued)
+        self.task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def put(self, rows):
+        """
+        Queue session rows, waiting for room while the queue is full.
+
+        Rows queued before the timeout stay queued. A client that resends the whole batch
+        produces duplicates, which the sessions primary key rejects when they are flushed.
+
+        Parameters:
+            rows (list): Dicts with the `SESSION_COLUMNS` keys.
+
+        Raises:
+            IngestQueueFull: If the queue had no room for `put_timeout` seconds.
+        """
+        self.start()
+        deadline = time.monotonic() + self.put_timeout
+        for row in rows:
+            try:
+                self.queue.put_nowait(row)
+                continue
+            except asyncio.QueueFull:
+                pass
+            try:
+                await asyncio.wait_for(self.queue.put(row), timeout=max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                raise IngestQueueFull(f"Session ingest queue is full ({self.max_queued} sessions).")
+
+    async def stop(self):
+        """
+        Flush everything still queued and stop the flush task.
+        """
+        if not self.running:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        if self.writing is not None:
+            try:
+                await self.writing
+            except Exception:
+                pass  # What it did not store is still in self.unflushed.
+        batch, self.unflushed = self.unflushed, []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if batch:
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error(f"Dropped {len(batch)} view sessions that could not be written at shutdown: {e}")
+        logger.info(f"Session ingest stopped: {self.flushed} sessions flushed, {self.failed} failed.")
+
+    async def _collect(self, batch):
+        """
+        Wait for a session, then add more to `batch` until it is full or `flush_interval` passed.
+        """
+        batch.append(await self.queue.get())
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+    async def _flush_loop(self):
+        batch = []
+        delay = self.retry_delay
+        try:
+            while True:
+                if not batch:
+                    await self._collect(batch)
+                # Shielded, so stop() can cancel the loop without abandoning a write in progress.
+                self.writing = asyncio.ensure_future(asyncio.to_thread(self._write, batch))
+                try:
+                    await asyncio.shield(self.writing)
+                except Exception as e:
+                    # The sessions not yet stored stay in `batch`; new ones queue up behind them
+                    # and `put` pushes back once the queue is full.
+                    logger.error(f"Writing {len(batch)} view sessions failed, retrying in {delay:.1f}s: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_retry_delay)
+                    continue
+                delay = self.retry_delay
+        except asyncio.CancelledError:
+            # Rows taken off the queue but not yet written go to stop() for the final flush.
+            self.unflushed = batch
+            raise
+
+    def _write(self, rows):
+        """
+        COPY a batch into relational.sessions, removing the stored sessions from `rows`. If the
+        batch is rejected, for example because one session is a duplicate or references an
+        unknown title, fall back to inserting the sessions one by one so a single bad row does
+        not lose the others.
+
+        Errors other than rejected data, such as an unreachable database, are raised with the
+        sessions not yet stored left in `rows`, for the caller to retry.
+        """
+        connection = self.engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.copy_expert(COPY_SESSIONS_QUERY, sessions_csv(rows))
+            connection.commit()
+            self.flushed += len(rows)
+            rows.clear()
+            return
+        except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+            connection.rollback()
+            logger.warning(f"COPY of {len(rows)} sessions failed, inserting them one by one: {e}")
+        finally:
+            connection.close()
+
+        while rows:
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(text(INSERT_SESSION_QUERY), rows[0])
+                self.flushed += 1
+            except (IntegrityError, DataError) as e:
+                self.failed += 1
+                logger.error(f"Dropped view session {rows[0]}: {e}")
+            del rows[0]
@@ -0,0 +1,222 @@
+"""
+Content-based title similarity over genres, production countries and credits.
+
+Every title becomes a sparse TF-IDF vector whose terms are its genres, its production
+countries and the person_ids in its credits. Rare terms (a director, a small country) weigh
+more than common ones (drama, US). Each block of terms gets its own weight, and every row is
+L2-normalized, so the dot product of two rows is their cosine similarity.
+
+The top-K neighbours of every title are computed block by block: `block_size` rows are
+multiplied against the whole matrix and only the best K per row are kept. The full
+titles x titles product is never materialized. The neighbour lists are saved to a .npz
+file and loaded into memory, where "more like these titles" is a lookup and a small sum.
+It needs no ratings, only the titles a user watched.
+
+    python similarity.py build --k 50 --output title_neighbours.npz
+"""
+
+import argparse
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sqlalchemy import text
+
+from db_connect import connect_to_db
+
+logging.basicConfig(level=logging.INFO,
+                    format='[%(asctime)s] %(levelname)s in %(module)s: %(message)s]',
+                    datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.getenv('SIMILARITY_INDEX_PATH', 'title_neighbours.npz')
+
+# Relative weight of each block of terms in the similarity.
+DEFAULT_BLOCK_WEIGHTS = {'genre': 1.0, 'country': 0.5, 'person': 1.0}
+
+TERM_QUERIES = {
+    'genre': "SELECT content_id, genre AS term FROM relational.genres;",
+    'country': "SELECT content_id, country AS term FROM relational.prod_countries;",
+    'person': "SELECT DISTINCT content_id, person_id AS term FROM relational.credits;",
+}
+CONTENT_IDS_QUERY = "SELECT content_id FROM relational.titles ORDER BY content_id;"
+
+
+def tfidf_block(pairs, title_index):
+    """
+    Build the L2-normalized TF-IDF matrix of one block of terms.
+
+    Terms are binary (a title has a genre or not), so the weight of a term is its smoothed
+    inverse document frequency, log((1 + n) / (1 + df)) + 1.
+
+    Parameters:
+        pairs (DataFrame): content_id and term columns.
+        title_index (dict): content_id -> row number.
+
+    Returns:
+        csr_matrix: One row per title, one column per distinct term.
+    """
+    pairs = pairs[pairs['content_id'].isin(title_index)].drop_duplicates()
+    rows = pairs['content_id'].map(title_index).to_numpy(dtype=np.int32)
+    _, columns = np.unique(pairs['term'].astype(str).to_numpy(), return_inverse=True)
+    n_terms = int(columns.max()) + 1 if len(columns) else 0
+    document_frequency = np.bincount(columns, minlength=n_terms)
+    idf = np.log((1 + len(title_index)) / (1 + document_frequency)) + 1
+    matrix = sparse.csr_matrix((idf[columns].astype(np.float32), (rows, columns)),
+                               shape=(len(title_index), n_terms))
+    return normalize_rows(matrix)
+
+
+def normalize_rows(matrix):
+    """
+    Scale every row of a sparse matrix to unit L2 norm, leaving empty rows empty.
+    """
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags((1 / norms).astype(np.float32)) @ matrix
+
+
+def build_features(content_ids, term_pairs, block_weights=None):
+    """
+    Stack the TF-IDF blocks into one feature matrix.
+
+    Parameters:
+        content_ids (list): The titles, in row order.
+        term_pairs (dict): Block name -> DataFrame of content_id, term.
+        block_weights (dict, optional): Block name -> weight, overriding `DEFAULT_BLOCK_WEIGHTS`.
+
+    Returns:
+        csr_matrix: L2-normalized rows, one per title.
+    """
+    weights = dict(DEFAULT_BLOCK_WEIGHTS, **(block_weights or {}))
+    title_index = {content_id: row for row, content_id in enumerate(content_ids)}
+    blocks = [np.sqrt(weights[name]) * tfidf_block(pairs, title_index) for name, pairs in term_pairs.items()]
+    return normalize_rows(sparse.hstack(blocks, format='csr', dtype=np.float32))
+
+
+def top_k_neighbours(features, k=50, block_size=512):
+    """
+    Find the `k` most similar other titles for every title, one block of rows at a time.
+
+    Parameters:
+        features (csr_matrix): L2-normalized title vectors.
+        k (int, optional): Neighbours kept per title. Default is 50.
+        block_size (int, optional): Rows multiplied at once; memory is block_size x titles. Default is 512.
+
+    Returns:
+        tuple: (neighbours, scores) arrays of shape (titles, k), best first. Rows with fewer
+            than k similar titles are padded with -1 and 0.
+    """
+    n = features.shape[0]
+    k = min(k, max(n - 1, 0))
+    neighbours = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    transposed = features.T.tocsc()
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        similarity = (features[start:stop] @ transposed).toarray()
+        similarity[np.arange(stop - start), np.arange(start, stop)] = 0
+        if k == 0:
+            continue
+        best = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(similarity, best, axis=1)
+        order = np.lexsort((best, -best_scores), axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        found = best_scores > 0
+        neighbours[start:stop] = np.where(found, best, -1)
+        scores[start:stop] = np.where(found, best_scores, 0)
+    return neighbours, scores
+
+
+class SimilarityIndex:
+    """
+    In-memory top-K neighbour lists of every title.
+
+    Parameters:
+        content_ids (ndarray): The titles, in row order.
+        neighbours (ndarray): (titles, k) row numbers of each title's neighbours, -1 for none.
+        scores (ndarray): (titles, k) cosine similarities matching `neighbours`.
+    """
+
+    def __init__(self, content_ids, neighbours, scores):
+        self.content_ids = np.asarray(content_ids, dtype=object)
+        self.index = {content_id: row for row, content_id in enumerate(self.content_ids)}
+        self.neighbours = neighbours
+        self.scores = scores
+
+    @classmethod
+    def build(cls, content_ids, term_pairs, k=50, block_size=512, block_weights=None):
+        """
+        Build the index from term pairs, see `build_features` and `top_k_neighbours`.
+        """
+        features = build_features(content_ids, term_pairs, block_weights)
+        neighbours, scores = top_k_neighbours(features, k=k, block_size=block_size)
+        return cls(content_ids, neighbours, scores)
+
+    @classmethod
+    def from_db(cls, engine, k=50, block_size=512, block_weights=None):
+        """
+        Build the index from relational.genres, relational.prod_countries and relational.credits.
+        """
+        with engine.connect() as conn:
+            content_ids = pd.read_sql(text(CONTENT_IDS_QUERY), conn)['content_id'].tolist()
+            term_pairs = {name: pd.read_sql(text(query), conn) for name, query in TERM_QUERIES.items()}
+        index = cls.build(content_ids, term_pairs, k=k, block_size=block_size, block_weights=block_weights)
+        logger.info(f"Built top-{index.neighbours.shape[1]} neighbours for {len(content_ids)} titles.")
+        return index
+
+    def save(self, path=DEFAULT_INDEX_PATH):
+        np.savez_compressed(path, content_ids=self.content_ids.astype(str),
+                            neighbours=self.neighbours, scores=self.scores)
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_PATH):
+        with np.load(path) as data:
+            return cls(data['content_ids'].tolist(), data['neighbours'], data['scores'])
+
+    def more_like(self, content_ids, k=10, exclude=()):
+        """
+        Titles most similar to a set of titles, e.g. a user's last five views.
+
+        A candidate's score is the sum of its similarities to each seed title, so titles close
+        to several seeds rank first.
+
+        Parameters:
+            content_ids (list): The seed titles. Unknown ones are ignored.
+            k (int, optional): Number of titles to return. Default is 10.
+            exclude (iterable, optional): content_ids never to return besides the seeds.
+
+        Returns:
+            list: content_ids, most similar first.
+        """
+        seeds = [self.index[c] for c in content_ids if c in self.index]
+        if not seeds:
+            return []
+        neighbours = self.neighbours[seeds].ravel()
+        scores = self.scores[seeds].ravel()
+        found = neighbours >= 0
+        totals = np.bincount(neighbours[found], weights=scores[found], minlength=len(self.content_ids))
+        totals[seeds] = 0
+        totals[[self.index[c] for c in exclude if c in self.index]] = 0
+        candidates = np.flatnonzero(totals)
+        best = candidates[np.lexsort((candidates, -totals[candidates]))][:k]
+        return self.content_ids[best].tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the title similarity index.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="Compute top-K neighbours from the database and save them.")
+    build.add_argument('--k', type=int, default=50)
+    build.add_argument('--block-size', type=int, default=512)
+    build.add_argument('--output', default=DEFAULT_INDEX_PATH)
+    args = parser.parse_args()
+    SimilarityIndex.from_db(connect_to_db(replica=True), k=args.k, block_size=args.block_size).save(args.output)
+    logger.info(f"Saved the similarity index to {args.output}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import StaticPool
+
+from catalog_cache import CatalogCache
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def attach_relational(dbapi_connection, connection_record):
+        dbapi_connection.execute("ATTACH DATABASE ':memory:' AS relational")
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE relational.titles (content_id TEXT PRIMARY KEY, title TEXT)"))
+        conn.execute(text("CREATE TABLE relational.genres (content_id TEXT, genre TEXT, is_main_genre BOOLEAN)"))
+        conn.execute(text("CREATE TABLE relational.prod_countries (content_id TEXT, country TEXT, is_main_country BOOLEAN)"))
+        conn.execute(text("INSERT INTO relational.titles VALUES ('tm1', 'One'), ('tm2', 'Two')"))
+        conn.execute(text("INSERT INTO relational.genres VALUES ('tm1', 'drama', 1), ('tm1', 'crime', 0)"))
+    return engine
+
+
+def test_lookups_are_served_from_the_snapshot(engine):
+    cache = CatalogCache(engine)
+    assert cache.get("titles", "tm1") == {"content_id": "tm1", "title": "One"}
+    assert [row["genre"] for row in cache.get("genres", "tm1")] == ["crime", "drama"]
+    assert cache.get("titles", "tm9") is None
+    assert cache.get("prod_countries", "tm1") == ()
+    stats = cache.stats()
+    assert stats["version"] == 1 and stats["refreshes"] == 1
+    assert stats["hits"] == 4 and stats["misses"] == 0 and stats["hit_rate"] == 1.0
+    assert stats["entries"] == {"titles": 2, "genres": 1, "prod_countries": 0}
+
+
+def test_invalidated_key_is_read_through_once(engine):
+    cache = CatalogCache(engine)
+    cache.refresh()
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE relational.titles SET title = 'Uno' WHERE content_id = 'tm1'"))
+    assert cache.get("titles", "tm1")["title"] == "One"
+
+    cache.invalidate("titles", "tm1")
+    assert cache.get("titles", "tm1")["title"] == "Uno"
+    assert cache.get("titles", "tm1")["title"] == "Uno"
+    assert cache.get("titles", "tm2")["title"] == "Two"
+    assert (cache.misses, cache.refreshes) == (1, 1)
+
+
+def test_invalidated_table_reloads_the_snapshot(engine):
+    cache = CatalogCache(engine)
+    cache.refresh()
+    snapshot = cache.snapshot
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO relational.prod_countries VALUES ('tm2', 'US', 1)"))
+    cache.invalidate("prod_countries")
+    assert cache.get("prod_countries", "tm2")[0]["country"] == "US"
+    assert cache.snapshot is not snapshot and cache.snapshot.version == 2
+    # The old snapshot is left untouched for readers still holding it.
+    assert "tm2" not in snapshot.tables["prod_countries"]
+
+
+def test_refresh_keeps_overlay_only_for_keys_invalidated_during_the_load(engine):
+    cache = CatalogCache(engine)
+    cache.refresh()
+    cache.invalidate("titles", "tm1")
+    cache.get("titles", "tm1")
+    cache.refresh()
+    assert cache.stats()["invalidated_keys"] == 0
+    cache.invalidate("users", 1)
+    assert cache.stats()["invalidated_keys"] == 0
+
+
+def test_whole_table_invalidation_reloads_once_while_lookups_serve_the_snapshot(engine):
+    cache = CatalogCache(engine)
+    cache.refresh()
+    load_tables, loads = cache._load_tables, []
+
+    def slow_load_tables():
+        loads.append(1)
+        time.sleep(0.1)
+        return load_tables()
+
+    cache._load_tables = slow_load_tables
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE relational.titles SET title = 'Uno' WHERE content_id = 'tm1'"))
+    cache.invalidate("titles")
+    titles = []
+    threads = [threading.Thread(target=lambda: titles.append(cache.get("titles", "tm1")["title"]))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    # The refreshing lookup sees the new row; the others were served the snapshot meanwhile.
+    assert titles.count("Uno") >= 1 and set(titles) <= {"One", "Uno"}
+    assert cache.get("titles", "tm1")["title"] == "Uno"
+    assert cache.stats()["refreshes"] == 2
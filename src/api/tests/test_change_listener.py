@@ -0,0 +1,70 @@
+import asyncio
+import socket
+from types import SimpleNamespace
+
+from change_listener import ChangeListener, parse_notification
+
+
+def test_parse_notification():
+    assert parse_notification('{"table": "titles", "op": "UPDATE", "key": "tm1"}') == ('titles', 'tm1')
+    assert parse_notification('{"table": "genres", "op": "TRUNCATE", "key": null}') == ('genres', None)
+    assert parse_notification('not json') == (None, None)
+    assert parse_notification('{"op": "DELETE"}') == (None, None)
+
+
+class FakeConnection:
+    """Stands in for a psycopg2 connection that has received notifications."""
+
+    def __init__(self, payloads):
+        self.notifies = [SimpleNamespace(channel='relational_changes', payload=payload) for payload in payloads]
+        self.polls = 0
+
+    def poll(self):
+        self.polls += 1
+
+
+def test_dispatch_hands_every_notification_to_the_handler_and_survives_handler_errors():
+    changes = []
+
+    def handler(table, key):
+        if key == 'boom':
+            raise RuntimeError('handler bug')
+        changes.append((table, key))
+
+    listener = ChangeListener(engine=None, handler=handler)
+    listener.connection = FakeConnection([
+        '{"table": "titles", "op": "INSERT", "key": "tm1"}',
+        '{"table": "titles", "op": "DELETE", "key": "boom"}',
+        '{"table": "users", "op": "UPDATE", "key": "7"}',
+    ])
+    listener.dispatch()
+    assert changes == [('titles', 'tm1'), ('users', '7')]
+    assert listener.received == 3 and listener.connection.notifies == []
+
+
+def test_reconnect_survives_a_failing_drop_everything_handler():
+    calls = []
+
+    def handler(table, key):
+        calls.append((table, key))
+        raise RuntimeError('handler bug')
+
+    reader, writer = socket.socketpair()
+    connection = FakeConnection([])
+    connection.fileno = reader.fileno
+    listener = ChangeListener(engine=None, handler=handler, keepalive=60)
+    listener._connect = lambda: connection
+
+    async def run():
+        task = asyncio.get_running_loop().create_task(listener._run())
+        await asyncio.sleep(0.05)
+        assert not task.done()
+        task.cancel()
+
+    try:
+        asyncio.run(run())
+    finally:
+        reader.close()
+        writer.close()
+    assert calls == [(None, None)]
+    assert listener.connection is connection
@@ -0,0 +1,163 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine
+
+import ds_web_api
+from coalesce import SingleFlight, normalize_filter
+from routing import ReplicaRouter
+
+
+def test_normalize_filter_ignores_key_and_set_order():
+    assert normalize_filter({"genre": "drama", "content_id_in": ["tm2", "tm1"]}) == \
+        normalize_filter({"content_id_in": ["tm1", "tm2", "tm1"], "genre": "drama"})
+    assert normalize_filter({"genre": "drama"}) != normalize_filter({"genre": "crime"})
+
+
+def run_concurrently(flight, filters, query):
+    results = [None] * len(filters)
+
+    def request(i):
+        results[i] = flight.run("/title/search/", filters[i], query)
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(len(filters))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_identical_requests_share_one_query():
+    calls = []
+
+    def slow_query():
+        calls.append(1)
+        time.sleep(0.1)
+        return ["tm1"]
+
+    flight = SingleFlight()
+    results = run_concurrently(flight, [{"genre": "drama"}] * 8, slow_query)
+    assert results == [["tm1"]] * 8
+    assert len(calls) == 1
+    assert flight.stats()["executed"] == 1 and flight.stats()["coalesced"] == 7
+    # Without a ttl the next request runs the query again.
+    flight.run("/title/search/", {"genre": "drama"}, slow_query)
+    assert len(calls) == 2
+
+
+def test_different_filters_and_endpoints_do_not_share():
+    flight = SingleFlight(ttl=10)
+    assert flight.run("/title/search/", {"genre": "drama"}, lambda: 1) == 1
+    assert flight.run("/title/search/", {"genre": "crime"}, lambda: 2) == 2
+    assert flight.run("/genre/search/", {"genre": "drama"}, lambda: 3) == 3
+    assert flight.run("/title/search/", {"genre": "drama"}, lambda: 4) == 1
+    assert flight.stats()["cache_hits"] == 1
+
+
+def test_ttl_results_expire_and_can_be_cleared():
+    flight = SingleFlight(ttl=0.05)
+    flight.run("/title/search/", {}, lambda: "old")
+    assert flight.run("/title/search/", {}, lambda: "new") == "old"
+    time.sleep(0.06)
+    assert flight.run("/title/search/", {}, lambda: "new") == "new"
+    flight.clear()
+    assert flight.run("/title/search/", {}, lambda: "newer") == "newer"
+
+
+def test_clear_while_a_query_is_in_flight_discards_its_result():
+    flight = SingleFlight(ttl=60)
+    started, release = threading.Event(), threading.Event()
+
+    def old_query():
+        started.set()
+        release.wait()
+        return "old"
+
+    leader = threading.Thread(target=flight.run, args=("/title/search/", {}, old_query))
+    leader.start()
+    started.wait()
+    flight.clear()
+    # A request after the change does not join the query that read the old data.
+    assert flight.run("/title/search/", {}, lambda: "new") == "new"
+    release.set()
+    leader.join()
+    assert flight.run("/title/search/", {}, lambda: "newer") == "new"
+    flight.clear()
+    assert flight.run("/title/search/", {}, lambda: "newest") == "newest"
+
+
+def test_scope_separates_keys_and_keep_false_only_shares_in_flight():
+    flight = SingleFlight(ttl=60)
+    assert flight.run("/title/search/", {}, lambda: "replica", scope="replica") == "replica"
+    assert flight.run("/title/search/", {}, lambda: "primary", scope="primary") == "primary"
+    assert flight.run("/title/search/", {}, lambda: "again", scope="replica") == "replica"
+    assert flight.run("/genre/search/", {}, lambda: 1, keep=False) == 1
+    assert flight.run("/genre/search/", {}, lambda: 2) == 2
+    assert not flight.cleared_within(1)
+    flight.clear()
+    assert flight.cleared_within(1)
+
+
+def web_search(monkeypatch, read_your_writes=0.0, max_lag=30.0):
+    """Calls ds_web_api.coalesced_search against a router over SQLite engines, with fake rows."""
+    router = ReplicaRouter(create_engine("sqlite://"), [create_engine("sqlite://")],
+                           read_your_writes=read_your_writes, max_lag=max_lag)
+    rows = {"value": "old"}
+    monkeypatch.setattr(ds_web_api, "search_coalescer", SingleFlight(ttl=60))
+    monkeypatch.setattr(ds_web_api, "search_rows", lambda session, model, non_none_filter: [rows["value"]])
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(router=router)))
+
+    def search(user_id=None):
+        session = SimpleNamespace(info={"engine": router.reader(user_id), "user_id": user_id})
+        return ds_web_api.coalesced_search(request, session, "/title/search/", None, {"genre": "drama"})
+
+    return router, rows, search
+
+
+def test_web_search_does_not_share_results_with_a_user_who_just_wrote(monkeypatch):
+    router, rows, search = web_search(monkeypatch, read_your_writes=60)
+    assert search() == ["old"]
+    rows["value"] = "new"
+    router.record_write(7)
+    assert search(7) == ["new"]
+    # Other users still share the replica result for the ttl.
+    assert search(8) == ["old"]
+
+
+def test_web_search_does_not_keep_replica_results_right_after_a_clear(monkeypatch):
+    router, rows, search = web_search(monkeypatch, max_lag=0.05)
+    assert search() == ["old"]
+    ds_web_api.search_coalescer.clear()
+    assert search() == ["old"]  # The replica has not replayed the change yet.
+    rows["value"] = "new"
+    assert search() == ["new"]
+    time.sleep(0.06)
+    assert search() == ["new"]
+    rows["value"] = "newer"
+    # Past max_lag, replica results are kept for the ttl again.
+    assert search() == ["new"]
+
+
+def test_errors_are_shared_and_not_cached():
+    def failing_query():
+        time.sleep(0.05)
+        raise RuntimeError("database down")
+
+    flight = SingleFlight(ttl=10)
+    errors = []
+
+    def request():
+        try:
+            flight.run("/title/search/", {"genre": "drama"}, failing_query)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=request) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 4
+    assert flight.run("/title/search/", {"genre": "drama"}, lambda: "recovered") == "recovered"
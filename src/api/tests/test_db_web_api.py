@@ -19,6 +19,13 @@ logger = logging.getLogger(__name__)
 client = TestClient(app)
 
 
+@pytest.fixture(scope="module", autouse=True)
+def run_lifespan():
+    # The engine is built in the app's lifespan, which runs while the client is open.
+    with client:
+        yield
+
+
 # 1. Helper functions to generate random data
 def random_date(start: datetime, end: datetime) -> date:
     return (start + timedelta(seconds=random.randint(0, int((end - start).total_seconds())))).date()
@@ -142,6 +149,44 @@ def test_title_crud():
     assert delete_response.status_code == 200
 
 
+def test_title_find():
+    sample_data = SampleData().to_dict()
+    new_title = sample_data["title"]
+    new_title["title"] = f"Findable {random_string(8)} Title"
+    create_response = client.post("/title/", json=new_title)
+    assert create_response.status_code == 200
+
+    # A substring of the title, in a different case, finds it.
+    find_response = client.post("/title/find/", json={"query": new_title["title"][9:17].lower(), "page_size": 5})
+    assert find_response.status_code == 200
+    found = find_response.json()
+    assert found[0]["content_id"] == new_title["content_id"]
+    assert found[0]["matched_on"] == "title"
+
+    # Pages past the end come back empty.
+    assert client.post("/title/find/", json={"query": new_title["title"], "page": 1000}).status_code == 404
+
+    delete_response = client.post("/title/delete/", json={"content_id": new_title["content_id"]})
+    assert delete_response.status_code == 200
+
+
+def test_like_pattern_escapes_wildcards():
+    from ds_web_api import like_pattern
+    assert like_pattern("100%_sure") == "%100\\%\\_sure%"
+
+
+def test_title_popular():
+    popular_response = client.post("/title/popular/", json={"limit": 5})
+    assert popular_response.status_code == 200
+    popular = popular_response.json()
+    assert 0 < len(popular) <= 5
+    decayed_views = [title["decayed_views"] for title in popular]
+    assert decayed_views == sorted(decayed_views, reverse=True)
+
+    assert client.post("/title/popular/", json={"genre": random_string(12)}).status_code == 404
+    assert client.post("/title/popular/", json={"limit": 1000}).status_code == 422
+
+
 def test_genre_crud():
     # Step 1: Create a sample data instance and convert it to a dictionary format.
     sample_data = SampleData().to_dict()
@@ -228,6 +273,13 @@ def test_credit_crud():
     assert create_credit_response.status_code == 200
     created_credit = create_credit_response.json()
     assert created_credit["content_id"] == new_credit["content_id"]
+    assert created_credit["credit_id"] is not None
+
+    # Search for the created credit using its surrogate key and its person_id.
+    for key_filter in ({"credit_id": created_credit["credit_id"]}, {"person_id": new_credit["person_id"]}):
+        search_credit_response = client.post("/credit/search/", json=key_filter)
+        assert search_credit_response.status_code == 200
+        assert [c["credit_id"] for c in search_credit_response.json()] == [created_credit["credit_id"]]
 
     # Search for the created credit using its content_id.
     credit_filter = {"content_id": new_credit["content_id"]}
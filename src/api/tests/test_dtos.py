@@ -0,0 +1,49 @@
+from datetime import date
+
+import orjson
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from dtos import TitleRow, ViewSessionRow, rows_response, search_rows
+from models import Titles, ViewSessions
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def attach_relational(dbapi_connection, connection_record):
+        dbapi_connection.execute("ATTACH DATABASE ':memory:' AS relational")
+
+    Titles.__table__.create(engine)
+    ViewSessions.__table__.create(engine)
+    with Session(engine) as session:
+        session.execute(Titles.__table__.insert(), [
+            {'content_id': 'tm1', 'title': 'One', 'content_type': 'movie', 'imdb_score': 7.5, 'release_year': 2001},
+            {'content_id': 'tm2', 'title': 'Two', 'content_type': 'show', 'imdb_score': 8.5, 'release_year': 2019},
+        ])
+        session.execute(ViewSessions.__table__.insert(), [
+            {'start_timestamp': date(2023, 5, 1), 'end_timestamp': date(2023, 5, 2),
+             'content_id': 'tm1', 'user_id': 280, 'user_rating': None},
+        ])
+        yield session
+
+
+def test_row_types_follow_the_table_columns():
+    assert TitleRow.__slots__ == tuple(column.name for column in Titles.__table__.columns)
+    assert not hasattr(TitleRow('tm1', *[None] * 11), '__dict__')
+
+
+def test_search_rows_apply_filters_and_serialize_like_the_models(session):
+    rows = search_rows(session, Titles, {'imdb_score_gte': 8})
+    assert [row.content_id for row in rows] == ['tm2']
+    assert isinstance(rows[0], TitleRow)
+
+    sessions = search_rows(session, ViewSessions, {'user_id': 280})
+    assert isinstance(sessions[0], ViewSessionRow)
+    body = orjson.loads(rows_response(sessions).body)
+    assert body == [{'start_timestamp': '2023-05-01', 'end_timestamp': '2023-05-02',
+                     'content_id': 'tm1', 'user_id': 280, 'user_rating': None}]
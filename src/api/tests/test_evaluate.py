@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from evaluate import Snapshot, evaluate_strategy, histories, popular_strategy, precision_recall_ndcg, run, time_split
+
+
+@pytest.fixture
+def snapshot():
+    sessions = pd.DataFrame({
+        'user_id': [1, 1, 2, 2, 1, 2, 2],
+        'content_id': ['tm1', 'tm2', 'tm1', 'tm3', 'tm3', 'tm1', 'tm4'],
+        'start_timestamp': pd.to_datetime(['2023-01-01', '2023-01-02', '2023-01-03', '2023-01-04',
+                                           '2023-02-01', '2023-02-02', '2023-02-03']),
+    })
+    titles = pd.DataFrame({
+        'content_id': ['tm1', 'tm2', 'tm3', 'tm4'],
+        'release_year': [2000, 2010, 2020, 2015],
+        'imdb_score': [7.0, 8.0, 6.0, 9.0],
+        'imdb_votes': [1000, 500, 10, 100000],
+        'is_year_best': [False, True, False, False],
+        'is_all_time_best': [False, False, False, True],
+    })
+    genres = pd.DataFrame({'content_id': ['tm1', 'tm2', 'tm3', 'tm4'], 'genre': ['drama', 'drama', 'crime', 'drama']})
+    credits = pd.DataFrame({'content_id': ['tm1', 'tm4'], 'person_id': ['1', '1']})
+    prod_countries = pd.DataFrame({'content_id': ['tm1', 'tm2'], 'country': ['US', 'US']})
+    return Snapshot({'sessions': sessions, 'titles': titles, 'genres': genres,
+                     'credits': credits, 'prod_countries': prod_countries})
+
+
+def test_time_split_holds_out_only_new_titles(snapshot):
+    train, relevant, cutoff = time_split(snapshot.sessions, cutoff='2023-02-01')
+    assert len(train) == 4
+    # User 2 rewatches tm1 after the cutoff; only tm4 is new to them.
+    assert relevant == {1: {'tm3'}, 2: {'tm4'}}
+    assert histories(train) == {1: ['tm2', 'tm1'], 2: ['tm3', 'tm1']}
+
+
+def test_precision_recall_ndcg():
+    assert precision_recall_ndcg(['a', 'b'], {'a'}, 2) == (0.5, 1.0, 1.0)
+    precision, recall, ndcg = precision_recall_ndcg(['x', 'a'], {'a', 'b'}, 2)
+    assert (precision, recall) == (0.5, 0.5)
+    assert ndcg == pytest.approx((1 / 1.5849625) / (1 + 1 / 1.5849625))
+    assert precision_recall_ndcg([], {'a'}, 3) == (0.0, 0.0, 0.0)
+
+
+def test_evaluate_strategy_reports_metrics_and_latency(snapshot):
+    train, relevant, _ = time_split(snapshot.sessions, cutoff='2023-02-01')
+    metrics = evaluate_strategy(popular_strategy, snapshot.with_sessions(train), relevant, k=1)
+    # Training popularity is tm1, tm2, tm3; both users have seen tm1, so user 1 gets tm3 (a hit)
+    # and user 2 gets tm2 (a miss).
+    assert metrics['precision@1'] == 0.5
+    assert metrics['recall@1'] == 0.5
+    assert metrics['coverage'] == 0.5
+    assert set(metrics['latency_ms']) == {'p50', 'p90', 'p99', 'max'}
+
+
+def test_run_all_strategies_from_exported_snapshot(snapshot, tmp_path):
+    snapshot.export(tmp_path)
+    loaded = Snapshot.from_dir(tmp_path)
+    assert loaded.credits['person_id'].tolist() == ['1', '1']
+    report = run(loaded, k=2, cutoff='2023-02-01')
+    assert report['split']['test_users'] == 2
+    assert set(report['strategies']) == {'popular', 'genre', 'two_stage', 'similar'}
+    for metrics in report['strategies'].values():
+        assert 0 <= metrics['ndcg@2'] <= 1
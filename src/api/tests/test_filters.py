@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from models import CreditFilter, Genres, TitleFilter, Titles, ViewSessionFilter, ViewSessions, filter_predicates
+
+
+def compiled_where(model, model_filter):
+    non_none_filter = {k: v for k, v in model_filter.dict().items() if v is not None}
+    statement = select(model).where(*filter_predicates(model, non_none_filter))
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})).split("WHERE")[1]
+
+
+def test_equality_fields_compile_like_filter_by():
+    where = compiled_where(Genres, Genres(content_id="tm1", genre="drama", is_main_genre=True))
+    assert "relational.genres.content_id = 'tm1'" in where
+    assert "relational.genres.genre = 'drama'" in where
+
+
+def test_range_and_set_fields_compile_to_predicates():
+    where = compiled_where(Titles, TitleFilter(imdb_score_gte=8, release_year_gte=2016, content_type_in=["MOVIE", "SHOW"]))
+    assert "relational.titles.imdb_score >= 8" in where
+    assert "relational.titles.release_year >= 2016" in where
+    assert "relational.titles.content_type IN ('MOVIE', 'SHOW')" in where
+
+
+def test_session_window_for_one_user():
+    session_filter = ViewSessionFilter(user_id=7, start_timestamp_gte="2023-09-10T00:00:00", start_timestamp_lte=datetime(2023, 9, 17))
+    non_none_filter = {k: v for k, v in session_filter.dict().items() if v is not None}
+    compiled = select(ViewSessions).where(*filter_predicates(ViewSessions, non_none_filter)).compile(dialect=postgresql.dialect())
+    where = str(compiled).split("WHERE")[1]
+    assert "relational.sessions.user_id = %(user_id_1)s" in where
+    assert "relational.sessions.start_timestamp >= %(start_timestamp_1)s" in where
+    assert "relational.sessions.start_timestamp <= %(start_timestamp_2)s" in where
+    assert compiled.params["start_timestamp_1"] == datetime(2023, 9, 10)
+    assert compiled.params["start_timestamp_2"] == datetime(2023, 9, 17)
+
+
+def test_range_and_set_fields_are_validated():
+    with pytest.raises(ValidationError):
+        TitleFilter(release_year_gte="not a year")
+    with pytest.raises(ValidationError):
+        CreditFilter(credit_id_in=[1, "not an id"])
+    with pytest.raises(ValidationError):
+        TitleFilter(content_type_in="MOVIE")
+
+
+@pytest.mark.parametrize("field", ["runtime_max", "popularity_gte"])
+def test_unknown_filter_fields_raise_value_error(field):
+    with pytest.raises(ValueError, match=f"unknown filter field {field}"):
+        filter_predicates(Titles, {field: 1})
@@ -0,0 +1,97 @@
+import pytest
+from psycopg2 import errors
+from sqlalchemy.exc import DBAPIError
+
+from prepared import PreparedStatement, to_positional
+
+
+def test_to_positional_numbers_each_name_once_and_keeps_casts():
+    sql, names = to_positional("""
+        SELECT * FROM relational.sessions
+        WHERE user_id = :user_id AND start_timestamp::date >= :since
+           OR user_id = ANY(CAST(:user_ids AS int[])) AND :user_id > 0;
+    """)
+    assert names == ('user_id', 'since', 'user_ids')
+    assert "user_id = $1 AND start_timestamp::date >= $2" in sql
+    assert "ANY(CAST($3 AS int[])) AND $1 > 0" in sql
+    assert not sql.endswith(';')
+
+
+def test_prepared_statement_sql_and_bind():
+    statement = PreparedStatement('user_history', "SELECT content_id FROM sessions WHERE user_id = :user_id LIMIT :n;")
+    assert statement.prepare_sql == "PREPARE user_history AS SELECT content_id FROM sessions WHERE user_id = $1 LIMIT $2;"
+    assert statement.execute_sql == "EXECUTE user_history (%(user_id)s, %(n)s);"
+    assert statement.bind({'n': 5, 'user_id': 280, 'unused': 1}) == {'user_id': 280, 'n': 5}
+    with pytest.raises(ValueError, match='user_id'):
+        statement.bind({'n': 5})
+    assert PreparedStatement('all_titles', "SELECT * FROM titles").execute_sql == "EXECUTE all_titles;"
+
+
+class FakeConnection:
+    def __init__(self):
+        self.info = {}
+        self.executed = []
+
+    def exec_driver_sql(self, sql, params=None):
+        self.executed.append((sql, params))
+        return 'result'
+
+    def in_transaction(self):
+        return False
+
+
+class ServerConnection(FakeConnection):
+    """Keeps prepared statements server-side, across errors, like a Postgres session."""
+
+    def __init__(self):
+        super().__init__()
+        self.server_prepared = set()
+        self.fail_next_execute = None
+
+    def exec_driver_sql(self, sql, params=None):
+        self.executed.append((sql, params))
+        name = sql.split()[1]
+        if sql.startswith('PREPARE'):
+            if name in self.server_prepared:
+                raise DBAPIError.instance(sql, params, errors.DuplicatePreparedStatement(name), Exception)
+            self.server_prepared.add(name)
+        elif name not in self.server_prepared:
+            raise DBAPIError.instance(sql, params, errors.InvalidSqlStatementName(name), Exception)
+        elif self.fail_next_execute is not None:
+            error, self.fail_next_execute = self.fail_next_execute, None
+            raise DBAPIError.instance(sql, params, error, Exception)
+        return 'result'
+
+
+def test_statement_is_prepared_once_per_connection():
+    statement = PreparedStatement('user_history', "SELECT content_id FROM sessions WHERE user_id = :user_id")
+    first, second = FakeConnection(), FakeConnection()
+    for user_id in (1, 2):
+        assert statement.execute(first, {'user_id': user_id}) == 'result'
+    statement.execute(second, {'user_id': 3})
+    assert [sql for sql, _ in first.executed].count(statement.prepare_sql) == 1
+    assert first.executed[-1] == (statement.execute_sql, {'user_id': 2})
+    assert [sql for sql, _ in second.executed].count(statement.prepare_sql) == 1
+
+
+def test_failed_execute_keeps_the_statement_prepared():
+    statement = PreparedStatement('user_history', "SELECT content_id FROM sessions WHERE user_id = :user_id")
+    conn = ServerConnection()
+    conn.fail_next_execute = errors.QueryCanceled('statement timeout')
+    with pytest.raises(DBAPIError):
+        statement.execute(conn, {'user_id': 1})
+    assert statement.execute(conn, {'user_id': 1}) == 'result'
+    assert [sql for sql, _ in conn.executed].count(statement.prepare_sql) == 1
+
+
+def test_lost_statement_is_prepared_again_and_duplicates_count_as_prepared():
+    statement = PreparedStatement('user_history', "SELECT content_id FROM sessions WHERE user_id = :user_id")
+    conn = ServerConnection()
+    statement.execute(conn, {'user_id': 1})
+    conn.server_prepared.clear()  # E.g. DISCARD ALL behind the pool's back.
+    with pytest.raises(DBAPIError):
+        statement.execute(conn, {'user_id': 1})
+    assert statement.execute(conn, {'user_id': 1}) == 'result'
+
+    conn.info.clear()  # The record is gone but the session still has the statement.
+    assert statement.execute(conn, {'user_id': 1}) == 'result'
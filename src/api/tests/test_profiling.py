@@ -0,0 +1,59 @@
+import json
+
+from sqlalchemy import create_engine, text
+
+from profiling import QueryProfiler, normalize_query, payload_bytes
+
+
+def test_normalize_query_groups_executions_of_the_same_shape():
+    assert normalize_query("SELECT * FROM titles\n  WHERE content_id = 'tm1' AND imdb_score >= 7.5;") == \
+        "SELECT * FROM titles WHERE content_id = ? AND imdb_score >= ?"
+    assert normalize_query("SELECT * FROM t1 WHERE id IN (%(id_1)s, %(id_2)s) LIMIT 10") == \
+        normalize_query("SELECT * FROM t1 WHERE id IN (%(id_1)s) LIMIT 5") == \
+        "SELECT * FROM t1 WHERE id IN (...) LIMIT ?"
+    assert normalize_query("SELECT CAST(:ids AS int[])") == "SELECT CAST(? AS int[])"
+
+
+def test_payload_bytes():
+    assert payload_bytes([('abc', 12, None), (b'xy', 1.5, 'd')]) == 3 + 2 + 2 + 3 + 1
+
+
+def test_profiler_aggregates_by_query_and_detaches(tmp_path):
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE titles (content_id TEXT, imdb_score REAL);"))
+        conn.execute(text("INSERT INTO titles VALUES ('tm1', 7.0), ('tm2', 8.0), ('tm3', 9.0);"))
+
+    with QueryProfiler(engine, slow_ms=0) as profiler:
+        with engine.connect() as conn:
+            for score in (7.5, 8.5):
+                conn.execute(text("SELECT * FROM titles WHERE imdb_score > :score"), {'score': score}).fetchall()
+            conn.execute(text("UPDATE titles SET imdb_score = 1 WHERE content_id = 'tm1'"))
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1")).fetchall()
+
+    report = profiler.report()
+    assert len(report) == 2
+    select = report[report['query'] == "SELECT * FROM titles WHERE imdb_score > ?"].iloc[0]
+    assert select['calls'] == 2
+    assert select['max_ms'] <= select['total_ms']
+    update = report[report['query'].str.startswith('UPDATE')].iloc[0]
+    assert update['rows'] == 1
+    # Plans are only captured on Postgres.
+    assert report['plan'].isna().all()
+
+    profiler.dump(tmp_path / 'profile.json')
+    assert json.loads((tmp_path / 'profile.json').read_text())[0]['calls'] >= 1
+
+
+def test_profiler_reports_every_engine_together():
+    primary, replica = create_engine('sqlite://'), create_engine('sqlite://')
+    with QueryProfiler([primary, replica], slow_ms=None) as profiler:
+        for engine in (primary, replica, replica):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1")).fetchall()
+    assert profiler.engine is primary
+    assert profiler.report().iloc[0]['calls'] == 3
+    with replica.connect() as conn:
+        conn.execute(text("SELECT 1")).fetchall()
+    assert profiler.report().iloc[0]['calls'] == 3
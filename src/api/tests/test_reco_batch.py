@@ -0,0 +1,70 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import reco_batch
+from reco_batch import batches, shard_users
+
+
+def test_range_shards_are_contiguous_and_balanced():
+    shards = shard_users(list(range(1, 11)), 3)
+    assert shards == [[1, 2, 3, 4], [5, 6, 7], [8, 9, 10]]
+
+
+def test_hash_shards_group_by_modulo():
+    shards = shard_users([3, 4, 5, 6, 7], 2, strategy='hash')
+    assert shards == [[4, 6], [3, 5, 7]]
+
+
+@pytest.mark.parametrize('strategy', ['range', 'hash'])
+def test_shards_cover_every_user_once_and_drop_empty_shards(strategy):
+    user_ids = [2, 3, 5, 7]
+    shards = shard_users(user_ids, 8, strategy=strategy)
+    assert all(shards)
+    assert sorted(user_id for shard in shards for user_id in shard) == user_ids
+
+
+def test_invalid_sharding_arguments():
+    with pytest.raises(ValueError):
+        shard_users([1, 2], 0)
+    with pytest.raises(ValueError):
+        shard_users([1, 2], 2, strategy='random')
+
+
+def test_batches():
+    assert list(batches([1, 2, 3, 4, 5], 2)) == [[1, 2], [3, 4], [5]]
+
+
+class BreakingPool:
+    """Runs shards inline; the first pool breaks after finishing one shard, like a killed worker."""
+
+    pools = []
+
+    def __init__(self, **kwargs):
+        self.broken = not BreakingPool.pools
+        self.submitted = []
+        BreakingPool.pools.append(self)
+
+    def submit(self, fn, shard_id, user_ids, *args):
+        future = Future()
+        self.submitted.append(shard_id)
+        if self.broken and len(self.submitted) > 1:
+            future.set_exception(BrokenProcessPool('A process in the process pool was terminated abruptly'))
+        else:
+            future.set_result((shard_id, len(user_ids), 10 * len(user_ids), 0.0))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def test_broken_pool_is_replaced_and_unfinished_shards_resubmitted(monkeypatch):
+    monkeypatch.setattr(reco_batch, 'ProcessPoolExecutor', BreakingPool)
+    BreakingPool.pools = []
+    summary = reco_batch.regenerate(workers=2, shards=4, user_ids=list(range(1, 9)), retries=1)
+    assert summary['users'] == 8 and summary['recommendations'] == 80
+    assert summary['failed_shards'] == []
+    first, second = BreakingPool.pools
+    assert first.submitted == [0, 1, 2, 3]
+    assert sorted(second.submitted) == [1, 2, 3]
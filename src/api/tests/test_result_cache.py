@@ -0,0 +1,52 @@
+import time
+
+import pandas as pd
+
+from result_cache import ResultCache, read_tables, written_tables
+
+
+def test_referenced_tables():
+    assert read_tables("SELECT * FROM relational.titles t JOIN relational.genres g USING (content_id)") == \
+        {'titles', 'genres'}
+    assert read_tables("SELECT * FROM relational.popular_titles LIMIT 5") == \
+        {'popular_titles', 'titles', 'title_popularity'}
+    assert written_tables("INSERT INTO relational.sessions VALUES (1)") >= {'sessions', 'title_popularity'}
+    assert written_tables("DELETE FROM relational.genres WHERE genre = 'drama'") == {'genres'}
+    assert 'recommendations' in written_tables("SELECT * FROM relational.make_recommendations(ARRAY[1])")
+
+
+def test_hits_copies_and_lru_bound():
+    cache = ResultCache(max_entries=2)
+    titles = pd.DataFrame({'content_id': ['tm1', 'tm2']})
+    cache.put("SELECT * FROM titles;", None, titles)
+    cached = cache.get("SELECT *\n  FROM titles")
+    pd.testing.assert_frame_equal(cached, titles)
+    cached.loc[0, 'content_id'] = 'changed'
+    assert cache.get("SELECT * FROM titles")['content_id'].tolist() == ['tm1', 'tm2']
+
+    assert cache.get("SELECT * FROM titles WHERE content_id = :id", {'id': 'tm1'}) is None
+    cache.put("SELECT * FROM genres", None, titles)
+    cache.put("SELECT * FROM users", None, titles)
+    # titles is the least recently used entry, so it is evicted first.
+    assert cache.get("SELECT * FROM titles") is None
+    assert cache.stats()['entries'] == 2
+
+
+def test_writes_invalidate_readers_of_touched_tables():
+    cache = ResultCache()
+    df = pd.DataFrame({'x': [1]})
+    cache.put("SELECT * FROM relational.titles", None, df)
+    cache.put("SELECT * FROM relational.genres", None, df)
+    cache.invalidate_for("DELETE FROM relational.genres WHERE content_id = 'tm1'")
+    assert cache.get("SELECT * FROM relational.genres") is None
+    assert cache.get("SELECT * FROM relational.titles") is not None
+    # A write whose tables cannot be determined drops everything.
+    cache.invalidate_for("CALL relational.refresh()")
+    assert cache.get("SELECT * FROM relational.titles") is None
+
+
+def test_entries_expire():
+    cache = ResultCache(ttl=0.01)
+    cache.put("SELECT 1", None, pd.DataFrame({'x': [1]}))
+    time.sleep(0.02)
+    assert cache.get("SELECT 1") is None
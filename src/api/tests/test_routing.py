@@ -0,0 +1,66 @@
+import time
+
+from sqlalchemy import create_engine
+
+import routing
+from routing import ReplicaRouter
+
+
+def make_router(replicas=2, **kwargs):
+    return ReplicaRouter(create_engine('sqlite://'), [create_engine('sqlite://') for _ in range(replicas)], **kwargs)
+
+
+def test_reads_round_robin_over_healthy_replicas_and_writes_use_the_primary():
+    router = make_router()
+    first, second = (replica.engine for replica in router.replicas)
+    assert [router.reader() for _ in range(4)] == [first, second, first, second]
+    assert router.writer() is router.primary
+
+    router.mark_failed(first)
+    assert [router.reader() for _ in range(2)] == [second, second]
+    router.mark_failed(second)
+    assert router.reader() is router.primary
+    assert router.stats()['primary_reads'] == 1
+
+
+def test_without_replicas_reads_use_the_primary():
+    router = make_router(replicas=0)
+    assert router.reader() is router.primary
+    router.start()
+    assert router._thread is None
+
+
+def test_read_your_writes_window_is_per_key():
+    router = make_router(read_your_writes=0.2)
+    router.record_write(7)
+    assert router.reader(7) is router.primary
+    assert router.reader(8) is not router.primary
+    assert router.reader() is not router.primary
+    time.sleep(0.25)
+    assert router.reader(7) is not router.primary
+    # Expired windows are dropped on the next write.
+    router.record_write(8)
+    assert router.stats()['read_your_writes_keys'] == 1
+
+    off = make_router()
+    off.record_write(7)
+    assert off.reader(7) is not off.primary
+    # Writes are noted even with the window off, for the result cache.
+    assert off.wrote_within(1) and not make_router().wrote_within(1)
+    off.last_write -= 2
+    assert not off.wrote_within(1)
+
+
+def test_health_checks_drop_failing_and_lagging_replicas(monkeypatch):
+    router = make_router(max_lag=10)
+    # SQLite has no pg_is_in_recovery, so the check fails and reads fall back to the primary.
+    assert set(router.check_health().values()) == {None}
+    assert router.reader() is router.primary
+
+    monkeypatch.setattr(routing, 'HEALTH_QUERY', "SELECT 3.5")
+    assert set(router.check_health().values()) == {3.5}
+    assert router.reader() is not router.primary
+
+    router.max_lag = 1
+    router.check_health()
+    assert router.reader() is router.primary
@@ -0,0 +1,108 @@
+import json
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from schema_dtypes import RELATIONAL_SCHEMA, apply_dtypes, compact_dtypes, validate
+
+SCHEMA_NOTEBOOK = Path(__file__).parents[2] / 'ds_relational_schema' / 'relational_schema_1.ipynb'
+
+
+def notebook_ddl():
+    """Parse the CREATE TABLE statements of the schema notebook into {table: {column: definition}}."""
+    tables = {}
+    for cell in json.loads(SCHEMA_NOTEBOOK.read_text())['cells']:
+        source = ''.join(cell['source'])
+        for table, body in re.findall(r'CREATE TABLE (?:relational\.)?(\w+) \((.*?)\n\);', source, re.S):
+            columns, primary_key = {}, []
+            for line in body.strip().splitlines():
+                line = line.strip().rstrip(',')
+                if line.startswith('FOREIGN KEY'):
+                    continue
+                if line.startswith('PRIMARY KEY'):
+                    primary_key = re.findall(r'\w+', line[len('PRIMARY KEY'):])
+                    continue
+                name, sql_type, length, rest = re.match(r'(\w+)\s+(\w+)(?:\((\d+)\))?(.*)', line).groups()
+                columns[name] = {
+                    'sql_type': sql_type.lower(),
+                    'max_length': int(length) if sql_type.lower() == 'varchar' else None,
+                    'nullable': 'NOT NULL' not in rest and 'PRIMARY KEY' not in rest,
+                    'choices': tuple(re.findall(r"'(\w+)'", rest)) or None,
+                }
+            for name in primary_key:
+                columns[name]['nullable'] = False
+            tables[table] = columns
+    return tables
+
+
+def test_schema_matches_notebook_ddl():
+    ddl = notebook_ddl()
+    assert set(ddl) <= set(RELATIONAL_SCHEMA)
+    for table, columns in ddl.items():
+        for name, definition in columns.items():
+            column = RELATIONAL_SCHEMA[table][name]
+            assert (column.sql_type, column.max_length, column.nullable, column.choices) == (
+                definition['sql_type'], definition['max_length'], definition['nullable'], definition['choices']
+            ), f"{table}.{name}"
+
+
+@pytest.fixture
+def title_df():
+    return pd.DataFrame({
+        'content_id': ['tm1', 'ts2', 'tm3'],
+        'title': ['Okja', 'Dark', 'Roma'],
+        'content_type': ['MOVIE', 'SHOW', 'MOVIE'],
+        'release_year': [2017, 2017, 2018],
+        'age_certification': ['R', 'TV-MA', np.nan],
+        'runtime': [121, 60, 135],
+        'number_of_seasons': [np.nan, 3.0, np.nan],
+        'imdb_id': ['tt3967856', 'tt5753856', 'tt6155172'],
+        'imdb_score': [7.3, 8.7, 7.7],
+        'imdb_votes': [112356.0, 384985.0, np.nan],
+        'is_year_best': [True, False, False],
+        'is_all_time_best': [False, True, True],
+    })
+
+
+def test_apply_dtypes_compacts_titles(title_df):
+    title_df = pd.concat([title_df] * 1000, ignore_index=True)
+    compact = apply_dtypes(title_df, 'titles')
+    assert compact['content_type'].dtype == 'category'
+    assert compact['release_year'].dtype == 'Int16'
+    assert compact['number_of_seasons'].dtype == 'Int16'
+    assert compact['imdb_score'].dtype == 'float32'
+    assert compact['imdb_votes'].isna().tolist()[:3] == [False, False, True]
+    assert compact.memory_usage(deep=True).sum() < title_df.memory_usage(deep=True).sum()
+
+
+def test_apply_dtypes_round_trips_through_to_sql(title_df):
+    engine = create_engine('sqlite://')
+    apply_dtypes(title_df, 'titles').to_sql('titles', engine, index=False)
+    loaded = pd.read_sql('SELECT * FROM titles', engine)
+    assert loaded['content_type'].tolist() == ['MOVIE', 'SHOW', 'MOVIE']
+    assert loaded['number_of_seasons'].isna().tolist() == [True, False, True]
+
+
+@pytest.mark.parametrize('column, value, message', [
+    ('content_type', 'SERIES', 'not in'),
+    ('title', 'x' * 201, r'varchar\(200\)'),
+    ('release_year', 40000, 'smallint range'),
+    ('content_id', None, 'NOT NULL'),
+])
+def test_validate_rejects_values_the_table_would_reject(title_df, column, value, message):
+    title_df[column] = title_df[column].astype(object)
+    title_df.loc[0, column] = value
+    with pytest.raises(ValueError, match=message):
+        validate(title_df, 'titles')
+
+
+def test_compact_dtypes_leaves_unknown_columns():
+    df = pd.DataFrame({'genre': ['drama', 'drama'], 'user_id': [1, 2], 'n': [10, 20]})
+    compact = compact_dtypes(df)
+    assert compact['genre'].dtype == 'category'
+    assert compact['user_id'].dtype == 'Int32'
+    assert compact['n'].dtype == 'int64'
@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from session_ingest import IngestQueueFull, SessionIngestBuffer, sessions_csv
+
+
+def session_row(user_id, rating=None):
+    return {'start_timestamp': datetime(2023, 9, 17, 20, 0), 'end_timestamp': datetime(2023, 9, 17, 21, 30),
+            'content_id': 'tm1', 'user_id': user_id, 'user_rating': rating}
+
+
+class RecordingBuffer(SessionIngestBuffer):
+    """Records flushed batches instead of writing them to Postgres."""
+
+    def __init__(self, **kwargs):
+        super().__init__(engine=None, **kwargs)
+        self.batches = []
+
+    def _write(self, rows):
+        self.batches.append(list(rows))
+        self.flushed += len(rows)
+        rows.clear()
+
+
+class FlakyBuffer(RecordingBuffer):
+    """Fails the first `failures` writes, as if the database were down."""
+
+    def __init__(self, failures, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+
+    def _write(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unreachable")
+        super()._write(rows)
+
+
+def test_sessions_csv_writes_nulls_as_empty_fields():
+    assert sessions_csv([session_row(7), session_row(8, rating=4)]).read() == (
+        "2023-09-17 20:00:00,2023-09-17 21:30:00,tm1,7,\n"
+        "2023-09-17 20:00:00,2023-09-17 21:30:00,tm1,8,4\n"
+    )
+
+
+def test_flushes_full_batches_then_the_rest_after_the_interval():
+    async def run():
+        buffer = RecordingBuffer(batch_size=3, flush_interval=0.05)
+        await buffer.put([session_row(user_id) for user_id in range(7)])
+        await asyncio.sleep(0.2)
+        sizes = [len(batch) for batch in buffer.batches]
+        await buffer.stop()
+        return sizes
+    assert asyncio.run(run()) == [3, 3, 1]
+
+
+def test_full_queue_applies_backpressure():
+    async def run():
+        buffer = RecordingBuffer(max_queued=2, flush_interval=10, put_timeout=0.05)
+        buffer.start()
+        buffer.task.cancel()  # Nothing drains the queue.
+        with pytest.raises(IngestQueueFull):
+            await buffer.put([session_row(user_id) for user_id in range(3)])
+        return buffer.queue.qsize()
+    assert asyncio.run(run()) == 2
+
+
+def test_stop_flushes_everything_queued():
+    async def run():
+        buffer = RecordingBuffer(batch_size=100, flush_interval=60)
+        await buffer.put([session_row(user_id) for user_id in range(5)])
+        await asyncio.sleep(0.01)
+        await buffer.stop()
+        return buffer
+    buffer = asyncio.run(run())
+    assert [row['user_id'] for batch in buffer.batches for row in batch] == [0, 1, 2, 3, 4]
+    assert not buffer.running
+
+
+def test_failed_writes_are_retried_without_losing_sessions():
+    async def run():
+        buffer = FlakyBuffer(failures=3, batch_size=100, flush_interval=0.01, retry_delay=0.01)
+        await buffer.put([session_row(user_id) for user_id in range(3)])
+        await asyncio.sleep(0.15)
+        running = buffer.running
+        await buffer.put([session_row(3)])
+        await asyncio.sleep(0.05)
+        await buffer.stop()
+        return buffer, running
+    buffer, running = asyncio.run(run())
+    assert running
+    assert [row['user_id'] for batch in buffer.batches for row in batch] == [0, 1, 2, 3]
+    assert buffer.failed == 0
+
+
+def test_restarting_a_dead_flush_task_keeps_the_queue():
+    async def run():
+        buffer = RecordingBuffer(batch_size=100, flush_interval=60)
+        buffer.start()
+        buffer.task.cancel()
+        await asyncio.sleep(0)
+        await buffer.queue.put(session_row(1))
+        await buffer.put([session_row(2)])
+        await buffer.stop()
+        return buffer
+    buffer = asyncio.run(run())
+    assert [row['user_id'] for batch in buffer.batches for row in batch] == [1, 2]
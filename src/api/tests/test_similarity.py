@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from similarity import SimilarityIndex, build_features, top_k_neighbours
+
+CONTENT_IDS = ['tm1', 'tm2', 'tm3', 'tm4', 'tm5']
+
+
+@pytest.fixture
+def term_pairs():
+    return {
+        'genre': pd.DataFrame({'content_id': ['tm1', 'tm2', 'tm3', 'tm4', 'tm1', 'tm2'],
+                               'term': ['drama', 'drama', 'drama', 'comedy', 'crime', 'crime']}),
+        'country': pd.DataFrame({'content_id': ['tm1', 'tm2', 'tm4'], 'term': ['US', 'US', 'FR']}),
+        'person': pd.DataFrame({'content_id': ['tm1', 'tm3', 'tm3'], 'term': ['p1', 'p1', 'p2']}),
+    }
+
+
+def test_features_are_unit_rows_weighted_by_rarity(term_pairs):
+    features = build_features(CONTENT_IDS, term_pairs)
+    norms = np.sqrt(np.asarray(features.multiply(features).sum(axis=1)).ravel())
+    np.testing.assert_allclose(norms, [1, 1, 1, 1, 0], atol=1e-6)
+    similarity = (features @ features.T).toarray()
+    # tm2 shares drama, crime and US with tm1; tm3 shares only drama and one person.
+    assert similarity[0, 1] > similarity[0, 2] > similarity[0, 3] == 0
+
+
+@pytest.mark.parametrize('block_size', [1, 2, 512])
+def test_blocked_top_k_matches_the_full_product(term_pairs, block_size):
+    features = build_features(CONTENT_IDS, term_pairs)
+    neighbours, scores = top_k_neighbours(features, k=2, block_size=block_size)
+    full = (features @ features.T).toarray()
+    np.fill_diagonal(full, 0)
+    assert neighbours[0].tolist() == [1, 2]
+    np.testing.assert_allclose(scores[0], full[0, [1, 2]], rtol=1e-6)
+    # tm4 and tm5 share nothing with anything.
+    assert neighbours[3].tolist() == [-1, -1] and neighbours[4].tolist() == [-1, -1]
+    reference = top_k_neighbours(features, k=2, block_size=512)
+    np.testing.assert_array_equal(neighbours, reference[0])
+
+
+def test_more_like_sums_over_seeds_and_excludes(term_pairs):
+    index = SimilarityIndex.build(CONTENT_IDS, term_pairs, k=3)
+    assert index.more_like(['tm1'], k=2) == ['tm2', 'tm3']
+    assert index.more_like(['tm1'], exclude=['tm2']) == ['tm3']
+    assert index.more_like(['tm2', 'tm3'], k=1) == ['tm1']
+    assert index.more_like(['unknown']) == []
+
+
+def test_save_and_load_round_trip(term_pairs, tmp_path):
+    index = SimilarityIndex.build(CONTENT_IDS, term_pairs, k=3)
+    path = tmp_path / 'neighbours.npz'
+    index.save(path)
+    loaded = SimilarityIndex.load(path)
+    assert loaded.content_ids.tolist() == CONTENT_IDS
+    np.testing.assert_array_equal(loaded.neighbours, index.neighbours)
+    assert loaded.more_like(['tm1']) == index.more_like(['tm1'])
@@ -0,0 +1,67 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sketches import HyperLogLog, sketch_sessions, summary_frame
+
+
+@pytest.mark.parametrize('n', [0, 1, 50, 1_000, 20_000, 300_000])
+def test_estimate_within_error_bound(n):
+    sketch = HyperLogLog().add(np.arange(n))
+    # Three standard errors, plus a little for the smallest counts.
+    assert abs(sketch.estimate() - n) <= 3 * sketch.relative_error * n + 1
+    summary = sketch.summary()
+    assert summary['low'] <= summary['estimate'] <= summary['high']
+
+
+def test_merge_is_the_sketch_of_the_union_and_adding_twice_is_a_no_op():
+    a = HyperLogLog().add(np.arange(0, 40_000))
+    b = HyperLogLog().add(np.arange(25_000, 60_000))
+    union = HyperLogLog().add(np.arange(0, 60_000))
+    assert np.array_equal(a.merge(b).registers, union.registers)
+    before = union.registers.copy()
+    union.add(np.arange(10_000, 20_000))
+    assert np.array_equal(union.registers, before)
+    with pytest.raises(ValueError):
+        a.merge(HyperLogLog(precision=10))
+
+
+def test_bytes_round_trip_and_strings():
+    sketch = HyperLogLog(precision=10).add(['tm1', 'tm2', 'tm1', 'ts3'])
+    assert round(sketch.estimate()) == 3
+    restored = HyperLogLog.from_bytes(sketch.to_bytes())
+    assert restored.precision == 10
+    assert np.array_equal(restored.registers, sketch.registers)
+    # A sparse sketch compresses to far fewer bytes than its 1024 registers.
+    assert len(sketch.to_bytes()) < 100
+
+
+def test_sketch_sessions_groups_by_title_day_and_user_week():
+    sessions = pd.DataFrame({
+        'start_timestamp': pd.to_datetime(['2023-05-01 10:00', '2023-05-01 22:00', '2023-05-01 23:00',
+                                           '2023-05-02 09:00', '2023-05-07 09:00', '2023-05-08 09:00']),
+        'content_id': ['tm1', 'tm1', 'tm1', 'tm1', 'tm2', 'tm2'],
+        'user_id': [1, 2, 1, 1, 1, 1],
+    })
+    sketches = sketch_sessions(sessions)
+    by_title = {key: round(sketch.estimate()) for key, sketch in sketches['title_day_users'].items()}
+    assert by_title == {('tm1', date(2023, 5, 1)): 2, ('tm1', date(2023, 5, 2)): 1,
+                        ('tm2', date(2023, 5, 7)): 1, ('tm2', date(2023, 5, 8)): 1}
+    by_user = {key: round(sketch.estimate()) for key, sketch in sketches['user_week_titles'].items()}
+    # Weeks start on Monday: 2023-05-01 and 2023-05-08.
+    assert by_user == {(1, date(2023, 5, 1)): 2, (2, date(2023, 5, 1)): 1, (1, date(2023, 5, 8)): 1}
+    assert all(type(user_id) is int for user_id, _ in by_user)
+
+    # Sketching the sessions in two halves and merging matches sketching them at once.
+    first, second = sketch_sessions(sessions.iloc[:3]), sketch_sessions(sessions.iloc[3:])
+    merged = first['title_day_users'][('tm1', date(2023, 5, 1))]
+    assert np.array_equal(merged.registers, sketches['title_day_users'][('tm1', date(2023, 5, 1))].registers)
+    assert ('tm1', date(2023, 5, 2)) in second['title_day_users']
+
+
+def test_summary_frame_orders_by_estimate():
+    df = summary_frame({'tm1': HyperLogLog().add(range(5)), 'tm2': HyperLogLog().add(range(50))}, 'content_id')
+    assert df.columns.tolist() == ['content_id', 'estimate', 'std_error', 'low', 'high']
+    assert df['content_id'].tolist() == ['tm2', 'tm1']
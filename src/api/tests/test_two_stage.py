@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+from two_stage import FEATURES, Catalog, TwoStageRecommender, weight_vector
+
+
+@pytest.fixture
+def catalog():
+    titles = pd.DataFrame({
+        'content_id': ['tm1', 'tm2', 'tm3', 'tm4', 'tm5'],
+        'release_year': [2000, 2010, 2020, 2015, None],
+        'imdb_score': [7.0, 8.0, 6.0, 9.0, None],
+        'imdb_votes': [1000, 500, 10, 100000, None],
+        'is_year_best': [False, True, False, False, None],
+        'is_all_time_best': [False, False, False, True, None],
+    })
+    genres = pd.DataFrame({'content_id': ['tm1', 'tm1', 'tm2', 'tm3', 'tm3', 'tm4'],
+                           'genre': ['drama', 'crime', 'drama', 'drama', 'crime', 'comedy']})
+    credits = pd.DataFrame({'content_id': ['tm1', 'tm4'], 'person_id': ['p1', 'p1']})
+    prod_countries = pd.DataFrame({'content_id': ['tm1', 'tm2', 'tm5'], 'country': ['US', 'US', 'FR']})
+    popularity = pd.Series([3, 9], index=['tm2', 'tm5'])
+    return Catalog(titles, genres, credits, prod_countries, popularity)
+
+
+def test_candidates_come_from_every_source_and_skip_history(catalog):
+    rows, features = TwoStageRecommender(catalog).candidates(['tm1'])
+    candidates = dict(zip(catalog.content_ids[rows], features.tolist()))
+    assert set(candidates) == {'tm2', 'tm3', 'tm4', 'tm5'}
+    genre_overlap = FEATURES.index('genre_overlap')
+    assert candidates['tm3'][genre_overlap] == 2
+    assert candidates['tm2'][genre_overlap] == 1
+    assert candidates['tm4'][FEATURES.index('shared_credits')] == 1
+    assert candidates['tm5'][FEATURES.index('popularity')] == 1
+
+
+def test_weights_change_the_ranking(catalog):
+    by_genre = TwoStageRecommender(catalog, weights={feature: 0 for feature in FEATURES} | {'genre_overlap': 1})
+    assert by_genre.recommend(['tm1'], k=1) == ['tm3']
+    by_score = TwoStageRecommender(catalog, weights={feature: 0 for feature in FEATURES} | {'imdb_score': 1})
+    assert by_score.recommend(['tm1'], k=2) == ['tm4', 'tm2']
+
+
+def test_seen_titles_are_excluded(catalog):
+    assert 'tm3' not in TwoStageRecommender(catalog).recommend(['tm1'], seen=['tm3'])
+
+
+def test_cold_user_falls_back_to_popular(catalog):
+    assert TwoStageRecommender(catalog).recommend([], k=5) == ['tm2', 'tm5']
+
+
+def test_weight_vector_rejects_unknown_features():
+    assert len(weight_vector()) == len(FEATURES)
+    with pytest.raises(ValueError):
+        weight_vector({'likes': 1.0})
@@ -0,0 +1,325 @@
+"""
+Two-stage recommendations: cheap candidate generation, then vectorized re-ranking.
+
+Stage one gathers a few hundred candidates for a user from several sources, each an inverted
+index over the catalog held in memory:
+
+    genres     titles sharing genres with the user's recent history
+    credits    titles sharing cast or crew (person_id) with it
+    countries  titles from the same production countries
+    popular    the titles with the most time-decayed views (relational.title_popularity)
+
+Stage two scores all candidates in one NumPy matrix product. Each candidate gets a row of
+`FEATURES` and the score is that row times a weight vector, which can be swapped per
+experiment. The best `k` unseen titles are returned.
+
+The catalog is loaded once (`Catalog.from_db`), so ranking a user costs no database round
+trips beyond reading their history.
+"""
+
+import argparse
+import logging
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from db_connect import connect_to_db
+
+logging.basicConfig(level=logging.INFO,
+                    format='[%(asctime)s] %(levelname)s in %(module)s: %(message)s]',
+                    datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+# Column order of the stage two feature matrix. Every feature is scaled to roughly [0, 1].
+FEATURES = ('genre_overlap', 'shared_credits', 'shared_countries', 'popularity',
+            'imdb_score', 'imdb_votes', 'is_year_best', 'is_all_time_best', 'recency')
+
+DEFAULT_WEIGHTS = {
+    'genre_overlap': 3.0,
+    'shared_credits': 1.5,
+    'shared_countries': 0.5,
+    'popularity': 1.0,
+    'imdb_score': 2.0,
+    'imdb_votes': 1.0,
+    'is_year_best': 0.5,
+    'is_all_time_best': 0.5,
+    'recency': 0.5,
+}
+
+TITLES_QUERY = """
+    SELECT content_id, release_year, imdb_score, imdb_votes, is_year_best, is_all_time_best
+    FROM relational.titles
+    ORDER BY content_id;
+"""
+GENRES_QUERY = "SELECT content_id, genre FROM relational.genres;"
+CREDITS_QUERY = "SELECT content_id, person_id FROM relational.credits;"
+COUNTRIES_QUERY = "SELECT content_id, country FROM relational.prod_countries;"
+# Decayed views as of the latest session, so the generated history stays usable.
+POPULARITY_QUERY = """
+    SELECT content_id,
+           score / relational.popularity_weight((SELECT max(last_view) FROM relational.title_popularity)) AS views
+    FROM relational.title_popularity;
+"""
+HISTORY_QUERY = """
+    SELECT user_id, content_id
+    FROM relational.sessions
+    WHERE user_id = ANY(CAST(:user_ids AS int[]))
+    ORDER BY user_id, start_timestamp DESC;
+"""
+INSERT_RECOMMENDATION_QUERY = """
+    INSERT INTO relational.recommendations (user_id, content_id)
+    VALUES (:user_id, :content_id)
+    ON CONFLICT (content_id, user_id) DO NOTHING;
+"""
+
+
+def weight_vector(weights=None):
+    """
+    Build the weight vector in `FEATURES` order.
+
+    Parameters:
+        weights (dict, optional): Feature weights overriding `DEFAULT_WEIGHTS`.
+
+    Returns:
+        ndarray: float32 weights, one per feature.
+    """
+    merged = dict(DEFAULT_WEIGHTS, **(weights or {}))
+    unknown = set(merged) - set(FEATURES)
+    if unknown:
+        raise ValueError(f"Unknown features in weights: {sorted(unknown)}.")
+    return np.array([merged[feature] for feature in FEATURES], dtype=np.float32)
+
+
+def _scaled(values):
+    """
+    Scale non-negative values to [0, 1] by their maximum, mapping missing values to 0.
+    """
+    values = np.nan_to_num(np.asarray(values, dtype=np.float32))
+    top = values.max() if len(values) else 0
+    return values / top if top > 0 else values
+
+
+class _InvertedIndex:
+    """
+    Title-to-keys and key-to-titles lookups for one many-to-many table (genres, credits, ...).
+
+    Parameters:
+        pairs (DataFrame): Two columns, content_id and the key.
+        title_index (dict): content_id -> row number in the catalog.
+    """
+
+    def __init__(self, pairs, title_index):
+        pairs = pairs[pairs['content_id'].isin(title_index)]
+        titles = pairs['content_id'].map(title_index).to_numpy(dtype=np.int32)
+        keys, key_codes = np.unique(pairs.iloc[:, 1].astype(str).to_numpy(), return_inverse=True)
+        self.keys = keys
+        self.keys_of_title = self._group(titles, key_codes, len(title_index))
+        self.titles_of_key = self._group(key_codes, titles, len(keys))
+
+    @staticmethod
+    def _group(owners, members, size):
+        order = np.argsort(owners, kind='stable')
+        bounds = np.searchsorted(owners[order], np.arange(size + 1))
+        members = members[order]
+        return [members[bounds[i]:bounds[i + 1]] for i in range(size)]
+
+    def overlap(self, history, size):
+        """
+        Count, for every title, how many (history title, key) pairs it shares a key with.
+
+        Parameters:
+            history (ndarray): Row numbers of the user's history titles.
+            size (int): Number of titles in the catalog.
+
+        Returns:
+            ndarray: Counts per catalog row.
+        """
+        keys = [self.keys_of_title[title] for title in history]
+        if not keys:
+            return np.zeros(size, dtype=np.int32)
+        keys = np.concatenate(keys)
+        if len(keys) == 0:
+            return np.zeros(size, dtype=np.int32)
+        postings = np.concatenate([self.titles_of_key[key] for key in keys])
+        return np.bincount(postings, minlength=size)
+
+
+class Catalog:
+    """
+    An in-memory, integer-indexed copy of the catalog used by both stages.
+
+    Parameters:
+        titles (DataFrame): content_id, release_year, imdb_score, imdb_votes, is_year_best, is_all_time_best.
+        genres (DataFrame): content_id, genre.
+        credits (DataFrame): content_id, person_id.
+        prod_countries (DataFrame): content_id, country.
+        popularity (Series, optional): Decayed views per content_id.
+    """
+
+    def __init__(self, titles, genres, credits, prod_countries, popularity=None):
+        self.content_ids = titles['content_id'].to_numpy(dtype=object)
+        self.index = {content_id: row for row, content_id in enumerate(self.content_ids)}
+        self.size = len(self.content_ids)
+        self.genres = _InvertedIndex(genres[['content_id', 'genre']], self.index)
+        self.credits = _InvertedIndex(credits[['content_id', 'person_id']], self.index)
+        self.countries = _InvertedIndex(prod_countries[['content_id', 'country']], self.index)
+
+        views = np.zeros(self.size, dtype=np.float32)
+        if popularity is not None and len(popularity):
+            rows = popularity.index.map(self.index)
+            known = ~pd.isna(rows)
+            views[rows[known].astype(int)] = popularity.to_numpy(dtype=np.float32)[known]
+
+        release_year = pd.to_numeric(titles['release_year'], errors='coerce').to_numpy(dtype=np.float32)
+        first_year = np.nanmin(release_year) if np.isfinite(release_year).any() else 0
+        # Title-level features, in FEATURES order after the three overlap columns.
+        self.title_features = np.column_stack([
+            _scaled(np.log1p(views)),
+            _scaled(pd.to_numeric(titles['imdb_score'], errors='coerce')),
+            _scaled(np.log1p(pd.to_numeric(titles['imdb_votes'], errors='coerce').to_numpy(dtype=np.float32))),
+            titles['is_year_best'].fillna(False).to_numpy(dtype=np.float32),
+            titles['is_all_time_best'].fillna(False).to_numpy(dtype=np.float32),
+            _scaled(release_year - first_year),
+        ]).astype(np.float32)
+        self.popular = np.argsort(-views, kind='stable')[:np.count_nonzero(views)]
+
+    @classmethod
+    def from_db(cls, engine):
+        """
+        Load the catalog and the decayed title popularity.
+
+        Parameters:
+            engine (Engine): SQLAlchemy engine with read access to the relational schema.
+
+        Returns:
+            Catalog: The loaded catalog.
+        """
+        with engine.connect() as conn:
+            titles = pd.read_sql(text(TITLES_QUERY), conn)
+            genres = pd.read_sql(text(GENRES_QUERY), conn)
+            credits = pd.read_sql(text(CREDITS_QUERY), conn)
+            prod_countries = pd.read_sql(text(COUNTRIES_QUERY), conn)
+            popularity = pd.read_sql(text(POPULARITY_QUERY), conn)
+        logger.info(f"Loaded catalog of {len(titles)} titles.")
+        return cls(titles, genres, credits, prod_countries, popularity.set_index('content_id')['views'])
+
+
+class TwoStageRecommender:
+    """
+    Ranks candidate titles for a user from their viewing history.
+
+    Parameters:
+        catalog (Catalog): The in-memory catalog.
+        weights (dict, optional): Feature weights overriding `DEFAULT_WEIGHTS`.
+        per_source (int, optional): Candidates taken from each source. Default is 100.
+    """
+
+    def __init__(self, catalog, weights=None, per_source=100):
+        self.catalog = catalog
+        self.weights = weight_vector(weights)
+        self.per_source = per_source
+
+    def _top(self, counts, exclude):
+        counts = np.where(exclude, 0, counts)
+        hits = np.flatnonzero(counts)
+        if len(hits) > self.per_source:
+            hits = hits[np.argpartition(-counts[hits], self.per_source - 1)[:self.per_source]]
+        return hits
+
+    def candidates(self, history, seen=()):
+        """
+        Stage one: gather unseen candidates and build their feature matrix.
+
+        Parameters:
+            history (list): content_ids of the user's recent history, most recent first.
+            seen (iterable, optional): content_ids to exclude besides the history.
+
+        Returns:
+            tuple: (candidate row numbers, feature matrix with one row per candidate).
+        """
+        catalog = self.catalog
+        history_rows = np.array([catalog.index[c] for c in history if c in catalog.index], dtype=np.int32)
+        exclude = np.zeros(catalog.size, dtype=bool)
+        exclude[history_rows] = True
+        exclude[[catalog.index[c] for c in seen if c in catalog.index]] = True
+
+        genre_counts = catalog.genres.overlap(history_rows, catalog.size)
+        credit_counts = catalog.credits.overlap(history_rows, catalog.size)
+        country_counts = catalog.countries.overlap(history_rows, catalog.size)
+        popular = catalog.popular[~exclude[catalog.popular]][:self.per_source]
+        rows = np.unique(np.concatenate([
+            self._top(genre_counts, exclude),
+            self._top(credit_counts, exclude),
+            self._top(country_counts, exclude),
+            popular,
+        ]).astype(np.int32))
+
+        history_size = max(len(history_rows), 1)
+        features = np.empty((len(rows), len(FEATURES)), dtype=np.float32)
+        features[:, 0] = genre_counts[rows] / history_size
+        features[:, 1] = np.minimum(credit_counts[rows] / history_size, 1)
+        features[:, 2] = np.minimum(country_counts[rows] / history_size, 1)
+        features[:, 3:] = catalog.title_features[rows]
+        return rows, features
+
+    def recommend(self, history, k=10, seen=()):
+        """
+        Recommend up to `k` titles for a user.
+
+        Parameters:
+            history (list): content_ids of the user's recent history, most recent first.
+            k (int, optional): Number of recommendations. Default is 10.
+            seen (iterable, optional): content_ids to exclude besides the history.
+
+        Returns:
+            list: content_ids, best first.
+        """
+        rows, features = self.candidates(history, seen)
+        if len(rows) == 0:
+            return []
+        scores = features @ self.weights
+        best = np.argpartition(-scores, k - 1)[:k] if len(rows) > k else np.arange(len(rows))
+        best = best[np.lexsort((rows[best], -scores[best]))]
+        return self.catalog.content_ids[rows[best]].tolist()
+
+
+def write_recommendations(engine, recommender, user_ids, history=5, k=10):
+    """
+    Recommend for a batch of users and insert the results, skipping pairs already stored.
+
+    Parameters:
+        engine (Engine): SQLAlchemy engine with write access to relational.recommendations.
+        recommender (TwoStageRecommender): The recommender to use.
+        user_ids (list): Users to recommend for.
+        history (int, optional): Latest sessions used as a user's history. Default is 5.
+        k (int, optional): Recommendations per user. Default is 10.
+
+    Returns:
+        int: Number of (user_id, content_id) rows sent to the database.
+    """
+    with engine.begin() as conn:
+        sessions = pd.read_sql(text(HISTORY_QUERY), conn, params={'user_ids': [int(u) for u in user_ids]})
+        rows = []
+        for user_id, watched in sessions.groupby('user_id', sort=False)['content_id']:
+            watched = watched.tolist()
+            for content_id in recommender.recommend(watched[:history], k=k, seen=watched):
+                rows.append({'user_id': int(user_id), 'content_id': content_id})
+        if rows:
+            conn.execute(text(INSERT_RECOMMENDATION_QUERY), rows)
+    logger.info(f"Wrote {len(rows)} recommendations for {sessions['user_id'].nunique()} users.")
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write two-stage recommendations for the given users.")
+    parser.add_argument('user_ids', type=int, nargs='+')
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+    engine = connect_to_db()
+    recommender = TwoStageRecommender(Catalog.from_db(connect_to_db(replica=True)))
+    write_recommendations(engine, recommender, args.user_ids, k=args.k)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+-- Precomputed analyst views over the raw schema.
+--
+-- The analytics schema holds materialized views of the joins and aggregations that analysts
+-- otherwise rerun against raw.titles and raw.credits in every session. create_DA_creds_2.ipynb
+-- grants analyst_reader SELECT on them; nobody else writes here. refresh_analytics.py refreshes
+-- them with REFRESH MATERIALIZED VIEW CONCURRENTLY, which needs a unique index on every view.
+--
+-- raw.titles keeps genres and production_countries as list literals such as
+-- "['drama', 'crime']"; the views unpack them into one row per value.
+
+DROP SCHEMA IF EXISTS analytics CASCADE;
+CREATE SCHEMA analytics;
+
+-- One row per title and genre / production country, the base of the per-genre views.
+CREATE MATERIALIZED VIEW analytics.title_genres AS
+SELECT DISTINCT ON (t.id, v.genre)
+       t.id AS content_id, lower(t.type) AS content_type, t.release_year, v.genre, t.imdb_score, t.imdb_votes
+FROM raw.titles t
+CROSS JOIN LATERAL (
+    SELECT trim(both ' ''' FROM value) AS genre
+    FROM regexp_split_to_table(trim(both '[]' FROM t.genres), ',') AS value
+) v
+WHERE t.id IS NOT NULL AND v.genre <> ''
+ORDER BY t.id, v.genre;
+
+CREATE UNIQUE INDEX title_genres_key_idx ON analytics.title_genres (content_id, genre);
+CREATE INDEX title_genres_genre_idx ON analytics.title_genres (genre, release_year);
+
+CREATE MATERIALIZED VIEW analytics.title_countries AS
+SELECT DISTINCT ON (t.id, v.country)
+       t.id AS content_id, lower(t.type) AS content_type, t.release_year, v.country, t.imdb_score, t.imdb_votes
+FROM raw.titles t
+CROSS JOIN LATERAL (
+    SELECT trim(both ' ''' FROM value) AS country
+    FROM regexp_split_to_table(trim(both '[]' FROM t.production_countries), ',') AS value
+) v
+WHERE t.id IS NOT NULL AND v.country <> ''
+ORDER BY t.id, v.country;
+
+CREATE UNIQUE INDEX title_countries_key_idx ON analytics.title_countries (content_id, country);
+CREATE INDEX title_countries_country_idx ON analytics.title_countries (country, release_year);
+
+-- Score by genre: how many titles, how well they score and how many votes they get.
+CREATE MATERIALIZED VIEW analytics.genre_scores AS
+SELECT genre, content_type,
+       count(*) AS titles,
+       round(avg(imdb_score), 2) AS mean_imdb_score,
+       round(avg(imdb_votes)) AS mean_imdb_votes,
+       min(release_year) AS first_year,
+       max(release_year) AS last_year
+FROM analytics.title_genres
+GROUP BY genre, content_type;
+
+CREATE UNIQUE INDEX genre_scores_key_idx ON analytics.genre_scores (genre, content_type);
+
+-- The same per production country.
+CREATE MATERIALIZED VIEW analytics.country_scores AS
+SELECT country, content_type,
+       count(*) AS titles,
+       round(avg(imdb_score), 2) AS mean_imdb_score,
+       round(avg(imdb_votes)) AS mean_imdb_votes
+FROM analytics.title_countries
+GROUP BY country, content_type;
+
+CREATE UNIQUE INDEX country_scores_key_idx ON analytics.country_scores (country, content_type);
+
+-- Top people by title count, per role.
+CREATE MATERIALIZED VIEW analytics.top_people AS
+SELECT c.person_id, c.role,
+       max(c.name) AS name,
+       count(DISTINCT c.id) AS titles,
+       round(avg(t.imdb_score), 2) AS mean_imdb_score,
+       min(t.release_year) AS first_year,
+       max(t.release_year) AS last_year
+FROM raw.credits c
+JOIN raw.titles t ON t.id = c.id
+WHERE c.person_id IS NOT NULL
+GROUP BY c.person_id, c.role;
+
+CREATE UNIQUE INDEX top_people_key_idx ON analytics.top_people (person_id, role);
+CREATE INDEX top_people_titles_idx ON analytics.top_people (role, titles DESC);
+
+-- Best-of lists by year, movies and shows together, matched to raw.titles where possible.
+CREATE MATERIALIZED VIEW analytics.best_of_by_year AS
+SELECT DISTINCT ON (b.content_type, b.release_year, b.title)
+       b.content_type, b.release_year, b.title, b.score, b.main_genre, b.main_production,
+       t.id AS content_id, t.imdb_score, t.imdb_votes
+FROM (
+    SELECT 'movie' AS content_type, release_year, title, score, main_genre, main_production
+    FROM raw.best_movies_yearly
+    UNION ALL
+    SELECT 'show', release_year, title, score, main_genre, main_production
+    FROM raw.best_shows_yearly
+) b
+LEFT JOIN raw.titles t ON t.title = b.title AND t.release_year = b.release_year
+WHERE b.release_year IS NOT NULL AND b.title IS NOT NULL
+ORDER BY b.content_type, b.release_year, b.title, t.imdb_votes DESC NULLS LAST;
+
+CREATE UNIQUE INDEX best_of_by_year_key_idx ON analytics.best_of_by_year (content_type, release_year, title);
+
+-- Titles, scores and runtimes per release year.
+CREATE MATERIALIZED VIEW analytics.yearly_summary AS
+SELECT release_year, lower(type) AS content_type,
+       count(*) AS titles,
+       round(avg(imdb_score), 2) AS mean_imdb_score,
+       round(avg(runtime)) AS mean_runtime,
+       sum(imdb_votes) AS imdb_votes
+FROM raw.titles
+WHERE release_year IS NOT NULL AND type IS NOT NULL
+GROUP BY release_year, lower(type);
+
+CREATE UNIQUE INDEX yearly_summary_key_idx ON analytics.yearly_summary (release_year, content_type);
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'analyst_reader') THEN
+        GRANT USAGE ON SCHEMA analytics TO analyst_reader;
+        GRANT SELECT ON ALL TABLES IN SCHEMA analytics TO analyst_reader;
+    END IF;
+END;
+$$;
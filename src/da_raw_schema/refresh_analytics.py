@@ -0,0 +1,135 @@
+"""
+Create and refresh the analyst materialized views in the `analytics` schema.
+
+`analytics_views.sql` defines the views over the raw schema. `create` (re)builds them, which
+`load_raw_csvs_1.ipynb` does after loading the raw tables. `refresh` reruns their queries with
+REFRESH MATERIALIZED VIEW CONCURRENTLY, so analysts can keep reading the old contents while a
+refresh runs. Only the view owner may refresh, so use the admin credentials from .env:
+
+    python refresh_analytics.py create
+    python refresh_analytics.py refresh
+    python refresh_analytics.py refresh --every 3600      # refresh hourly until stopped
+
+or schedule `refresh` with cron, e.g. `0 * * * * cd .../src/da_raw_schema && python refresh_analytics.py refresh`.
+"""
+
+import argparse
+import logging
+import os
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+
+logging.basicConfig(level=logging.INFO,
+                    format='[%(asctime)s] %(levelname)s in %(module)s: %(message)s]',
+                    datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+VIEWS_SQL = Path(__file__).parent / 'analytics_views.sql'
+
+# Refresh order: a view comes after the views it reads.
+VIEWS = (
+    'title_genres',
+    'title_countries',
+    'genre_scores',
+    'country_scores',
+    'top_people',
+    'best_of_by_year',
+    'yearly_summary',
+)
+
+
+def connect_to_db():
+    """
+    Connect to the database as the admin user from environment variables.
+
+    Returns:
+        Engine object: SQLAlchemy engine.
+    """
+    load_dotenv()
+    db_url = f"postgresql+psycopg2://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
+    return create_engine(db_url)
+
+
+def create_views(engine):
+    """
+    Drop and recreate the analytics schema and its views, populated, from `analytics_views.sql`.
+
+    Parameters:
+        engine (Engine): SQLAlchemy engine connected as the owner of the raw schema.
+    """
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(VIEWS_SQL.read_text())
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    logger.info(f"Created {len(VIEWS)} analytics views.")
+
+
+def refresh_views(engine, views=VIEWS, concurrently=True):
+    """
+    Refresh analytics views, each in its own transaction.
+
+    Parameters:
+        engine (Engine): SQLAlchemy engine connected as the owner of the views.
+        views (tuple, optional): Views to refresh, in dependency order. Default is all of them.
+        concurrently (bool, optional): Refresh without blocking readers. Default is True.
+
+    Returns:
+        dict: View name -> refresh time in seconds.
+    """
+    timings = {}
+    mode = "CONCURRENTLY " if concurrently else ""
+    for view in views:
+        if view not in VIEWS:
+            raise ValueError(f"Unknown analytics view {view!r}.")
+        started = time.perf_counter()
+        connection = engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"REFRESH MATERIALIZED VIEW {mode}analytics.{view};")
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+        timings[view] = round(time.perf_counter() - started, 3)
+        logger.info(f"Refreshed analytics.{view} in {timings[view]:.2f}s.")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create or refresh the analytics materialized views.")
+    parser.add_argument('command', choices=['create', 'refresh'])
+    parser.add_argument('--views', nargs='+', choices=list(VIEWS), default=list(VIEWS))
+    parser.add_argument('--every', type=float, help="Keep refreshing every this many seconds.")
+    parser.add_argument('--blocking', action='store_true', help="Refresh without CONCURRENTLY (faster, blocks readers).")
+    args = parser.parse_args()
+
+    engine = connect_to_db()
+    if args.command == 'create':
+        create_views(engine)
+        return
+    views = tuple(view for view in VIEWS if view in args.views)
+    while True:
+        try:
+            refresh_views(engine, views, concurrently=not args.blocking)
+        except Exception as e:
+            if args.every is None:
+                raise
+            logger.error(f"Refresh failed, retrying in {args.every:.0f}s: {e}")
+        if args.every is None:
+            return
+        time.sleep(args.every)
+
+
+if __name__ == '__main__':
+    main()
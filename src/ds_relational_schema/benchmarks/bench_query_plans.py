@@ -0,0 +1,456 @@
+"""
+Plan and latency regression benchmark for the hot query shapes of the recommender and web API.
+
+For each data scale the benchmark rebuilds the relational schema in a scratch database: the
+tables of `relational_schema_1.ipynb`, then every migration, then synthetic rows from
+generate_series, then ANALYZE. It then runs every query in `HOT_QUERIES` `--repeat` times with
+sampled arguments and records:
+
+    p50_ms, p95_ms   wall time per execution, each in its own rolled-back transaction
+    scans            the scan nodes of the chosen plan: (node type, relation, index)
+
+A run fails, exit status 1, when:
+
+- a query does a sequential scan on a relation listed in its `forbid_seq_scan`;
+- a query's scans differ from the stored baseline; or
+- a query's p50 exceeds its baseline by more than `--tolerance` plus `--slack-ms`.
+
+The schema is dropped and recreated, so the benchmark refuses to run unless BENCH_DB_NAME
+names a database other than DB_NAME. It connects with the admin credentials (DB_USER,
+DB_PASSWORD, DB_HOST). Run it from `src/ds_relational_schema`:
+
+    python -m benchmarks.bench_query_plans --scales small medium
+    python -m benchmarks.bench_query_plans --scales small medium --update-baseline
+
+Commit the baseline after a deliberate plan or schema change, together with that change.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from sqlalchemy import bindparam, create_engine, text
+
+from migrate import apply_migrations
+
+BASELINE_PATH = Path(__file__).parent / 'query_plans_baseline.json'
+
+SCALES = {
+    'small': {'titles': 2_000, 'users': 2_000, 'sessions': 50_000, 'credits': 20_000},
+    'medium': {'titles': 10_000, 'users': 20_000, 'sessions': 500_000, 'credits': 100_000},
+    'large': {'titles': 50_000, 'users': 100_000, 'sessions': 5_000_000, 'credits': 500_000},
+}
+
+GENRES = ['drama', 'comedy', 'thriller', 'action', 'romance', 'crime', 'documentation', 'scifi',
+          'fantasy', 'animation', 'family', 'horror', 'history', 'war', 'music', 'reality',
+          'sport', 'western', 'european']
+COUNTRIES = ['US', 'IN', 'GB', 'JP', 'KR', 'FR', 'ES', 'DE', 'CA', 'MX']
+
+# The base tables as created by relational_schema_1.ipynb; migrations/ does the rest.
+BASE_SCHEMA = """
+    DROP SCHEMA IF EXISTS relational CASCADE;
+    CREATE SCHEMA relational;
+    CREATE TABLE relational.titles (
+        content_id varchar(10) PRIMARY KEY,
+        title varchar(200),
+        content_type varchar(5) NOT NULL CHECK (content_type IN('movie', 'MOVIE', 'show', 'SHOW')),
+        release_year smallint,
+        age_certification varchar(10),
+        runtime smallint,
+        number_of_seasons smallint,
+        imdb_id varchar(15),
+        imdb_score real,
+        imdb_votes bigint,
+        is_year_best boolean,
+        is_all_time_best boolean
+    );
+    CREATE TABLE relational.genres (
+        content_id varchar(10) NOT NULL REFERENCES relational.titles(content_id),
+        genre varchar(20),
+        is_main_genre boolean,
+        PRIMARY KEY (content_id, genre)
+    );
+    CREATE TABLE relational.prod_countries (
+        content_id varchar(10) NOT NULL REFERENCES relational.titles(content_id),
+        country varchar(20),
+        is_main_country boolean,
+        PRIMARY KEY (content_id, country)
+    );
+    CREATE TABLE relational.credits (
+        content_id varchar(10) NOT NULL REFERENCES relational.titles(content_id),
+        person_id varchar(7),
+        first_name varchar(35) NOT NULL,
+        middle_name varchar(35),
+        last_name varchar(40) NOT NULL,
+        character varchar(400) NOT NULL,
+        role varchar(15) NOT NULL,
+        PRIMARY KEY (content_id, person_id, first_name, last_name, character, role)
+    );
+    CREATE TABLE relational.users (
+        user_id int PRIMARY KEY,
+        birth_date DATE,
+        subscription_date DATE,
+        subscription_type varchar(10) NOT NULL CHECK (subscription_type IN('basic', 'standard', 'premium'))
+    );
+    CREATE TABLE relational.sessions (
+        start_timestamp timestamp(0) NOT NULL,
+        end_timestamp timestamp(0) NOT NULL,
+        content_id varchar(10) NOT NULL REFERENCES relational.titles(content_id),
+        user_id int NOT NULL REFERENCES relational.users(user_id),
+        user_rating int,
+        PRIMARY KEY (start_timestamp, end_timestamp, content_id, user_id)
+    );
+    CREATE TABLE relational.recommendations (
+        content_id varchar(10) REFERENCES relational.titles(content_id),
+        user_id int REFERENCES relational.users(user_id),
+        PRIMARY KEY (content_id, user_id)
+    );
+"""
+
+# Synthetic rows. Sessions span the last 180 days and favour low content_ids, so some titles
+# are popular and most are in the long tail.
+SEED_STATEMENTS = [
+    """
+    INSERT INTO relational.titles
+    SELECT 'tm' || i, 'Title ' || i, CASE WHEN i % 3 = 0 THEN 'SHOW' ELSE 'MOVIE' END,
+           1950 + (i % 73), 'PG-13', 30 + (i % 150), CASE WHEN i % 3 = 0 THEN 1 + i % 8 END,
+           'tt' || i, round((1 + random() * 9)::numeric, 1), (random() * 1000000)::bigint,
+           i % 50 = 0, i % 200 = 0
+    FROM generate_series(0, :titles - 1) AS i;
+    """,
+    """
+    INSERT INTO relational.genres
+    SELECT 'tm' || i, (CAST(:genres AS text[]))[1 + (i + k * 7) % 19], k = 0
+    FROM generate_series(0, :titles - 1) AS i, generate_series(0, 2) AS k;
+    """,
+    """
+    INSERT INTO relational.prod_countries
+    SELECT 'tm' || i, (CAST(:countries AS text[]))[1 + i % 10], true
+    FROM generate_series(0, :titles - 1) AS i;
+    """,
+    """
+    INSERT INTO relational.credits (content_id, person_id, first_name, last_name, character, role)
+    SELECT 'tm' || (i % :titles), (i % (:credits / 4))::text, 'First' || (i % 997), 'Last' || (i % 991),
+           'Character ' || i, CASE WHEN i % 10 = 0 THEN 'DIRECTOR' ELSE 'ACTOR' END
+    FROM generate_series(0, :credits - 1) AS i;
+    """,
+    """
+    INSERT INTO relational.users
+    SELECT i, date '1960-01-01' + (i % 15000), date '2015-01-01' + (i % 3000),
+           (ARRAY['basic', 'standard', 'premium'])[1 + i % 3]
+    FROM generate_series(1, :users) AS i;
+    """,
+    """
+    INSERT INTO relational.sessions
+    SELECT ts, ts + interval '90 minutes', 'tm' || floor(:titles * power(random(), 3))::int,
+           1 + (i % :users), CASE WHEN i % 4 = 0 THEN 1 + i % 5 END
+    FROM (SELECT i, date_trunc('second', now() - random() * interval '180 days') AS ts
+          FROM generate_series(1, :sessions) AS i) s
+    ON CONFLICT DO NOTHING;
+    """,
+    # Move the seeded months out of the default partition, as session_partitions.py does.
+    """
+    SELECT relational.create_sessions_partition(month::date)
+    FROM generate_series(date_trunc('month', now() - interval '180 days'), date_trunc('month', now()),
+                         interval '1 month') AS month;
+    """,
+    "SELECT relational.rebuild_popularity();",
+]
+
+
+def _title(scale, rng):
+    return f"tm{rng.randrange(scale['titles'])}"
+
+
+# name -> the statement, a sampler of its arguments, and relations that must never be
+# sequentially scanned (partition names match their parent's prefix).
+HOT_QUERIES = {
+    'last_n_sessions': {
+        # RecoMaker.get_last_5 / USER_HISTORY_QUERY
+        'sql': """
+            SELECT content_id FROM relational.sessions
+            WHERE user_id = :user_id ORDER BY start_timestamp DESC LIMIT 5;
+        """,
+        'params': lambda scale, rng: {'user_id': rng.randint(1, scale['users'])},
+        'forbid_seq_scan': ['sessions'],
+    },
+    'genre_overlap': {
+        # The read part of relational.make_recommendations (migration 005) for one user.
+        'sql': """
+            WITH history AS (
+                SELECT content_id FROM relational.sessions
+                WHERE user_id = :user_id ORDER BY start_timestamp DESC LIMIT 5
+            ),
+            history_genres AS (
+                SELECT g.genre, count(*) AS weight
+                FROM history h JOIN relational.genres g ON g.content_id = h.content_id
+                GROUP BY g.genre
+            ),
+            candidates AS (
+                SELECT g.content_id, sum(hg.weight) AS overlap
+                FROM history_genres hg JOIN relational.genres g ON g.genre = hg.genre
+                WHERE NOT EXISTS (SELECT 1 FROM relational.sessions s
+                                  WHERE s.user_id = :user_id AND s.content_id = g.content_id)
+                GROUP BY g.content_id
+            )
+            SELECT c.content_id
+            FROM candidates c JOIN relational.titles t ON t.content_id = c.content_id
+            ORDER BY c.overlap DESC, t.imdb_score DESC NULLS LAST, c.content_id
+            LIMIT 10;
+        """,
+        'params': lambda scale, rng: {'user_id': rng.randint(1, scale['users'])},
+        'forbid_seq_scan': ['sessions'],
+    },
+    'title_by_content_id': {
+        # /title/search/ with content_id
+        'sql': "SELECT * FROM relational.titles WHERE content_id = :content_id;",
+        'params': lambda scale, rng: {'content_id': _title(scale, rng)},
+        'forbid_seq_scan': ['titles'],
+    },
+    'title_score_year_range': {
+        # /title/search/ with imdb_score_gte and release_year_gte
+        'sql': "SELECT * FROM relational.titles WHERE imdb_score >= :score AND release_year >= :year;",
+        'params': lambda scale, rng: {'score': 9.8, 'year': rng.randint(2010, 2022)},
+        'forbid_seq_scan': [],
+    },
+    'genre_in': {
+        # /genre/search/ with genre_in and content_id_in
+        'sql': "SELECT * FROM relational.genres WHERE genre IN :genres AND content_id IN :content_ids;",
+        'params': lambda scale, rng: {'genres': tuple(rng.sample(GENRES, 2)),
+                                      'content_ids': tuple(_title(scale, rng) for _ in range(20))},
+        'forbid_seq_scan': ['genres'],
+        'expanding': ['genres', 'content_ids'],
+    },
+    'credits_by_person': {
+        # /credit/search/ with person_id
+        'sql': "SELECT * FROM relational.credits WHERE person_id = :person_id;",
+        'params': lambda scale, rng: {'person_id': str(rng.randrange(scale['credits'] // 4))},
+        'forbid_seq_scan': ['credits'],
+    },
+    'sessions_for_title_window': {
+        # /view_session/search/ with content_id and start_timestamp_gte
+        'sql': """
+            SELECT * FROM relational.sessions
+            WHERE content_id = :content_id AND start_timestamp >= now() - interval '7 days';
+        """,
+        'params': lambda scale, rng: {'content_id': _title(scale, rng)},
+        'forbid_seq_scan': ['sessions'],
+    },
+    'delete_credits_of_title': {
+        # /credit/delete/ with content_id
+        'sql': "DELETE FROM relational.credits WHERE content_id = :content_id;",
+        'params': lambda scale, rng: {'content_id': _title(scale, rng)},
+        'forbid_seq_scan': ['credits'],
+    },
+    'delete_genre_of_title': {
+        # /genre/delete/ with content_id and genre
+        'sql': "DELETE FROM relational.genres WHERE content_id = :content_id AND genre = :genre;",
+        'params': lambda scale, rng: {'content_id': _title(scale, rng), 'genre': rng.choice(GENRES)},
+        'forbid_seq_scan': ['genres'],
+    },
+}
+
+_PARTITION_SUFFIX = re.compile(r'_\d{4}_\d{2}')
+
+
+def scan_nodes(plan):
+    """
+    The scan nodes of an EXPLAIN (FORMAT JSON) plan.
+
+    Partition names are folded into their parent's name (sessions_2023_05 -> sessions_*), so a
+    plan keeps the same signature as months are added.
+
+    Parameters:
+        plan (dict): The 'Plan' object of the EXPLAIN output.
+
+    Returns:
+        list: Sorted, distinct [node type, relation, index] triples; index is None for heap scans.
+    """
+    found = set()
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if 'Relation Name' in node:
+            relation = _PARTITION_SUFFIX.sub('_*', node['Relation Name'])
+            index = node.get('Index Name')
+            found.add((node['Node Type'], relation, _PARTITION_SUFFIX.sub('_*', index) if index else None))
+        stack.extend(node.get('Plans', []))
+    return sorted([list(scan) for scan in found], key=lambda scan: [str(part) for part in scan])
+
+
+def _base_relation(relation):
+    return relation.split('_*')[0]
+
+
+def check(results, baseline=None, tolerance=0.5, slack_ms=1.0):
+    """
+    Find plan and latency regressions.
+
+    Parameters:
+        results (dict): scale -> query -> {'p50_ms', 'p95_ms', 'scans'} from `run_scale`.
+        baseline (dict, optional): A previous `results`. Scales and queries missing from it
+            are only checked against `forbid_seq_scan`.
+        tolerance (float, optional): Allowed relative p50 slowdown. Default is 0.5.
+        slack_ms (float, optional): Allowed absolute p50 slowdown on top, so that noise on sub-
+            millisecond queries does not fail the run. Default is 1.0.
+
+    Returns:
+        list: One message per regression; empty if there are none.
+    """
+    baseline = baseline or {}
+    regressions = []
+    for scale, queries in results.items():
+        for name, result in queries.items():
+            forbidden = set(HOT_QUERIES[name]['forbid_seq_scan']) if name in HOT_QUERIES else set()
+            for node_type, relation, _ in result['scans']:
+                if node_type == 'Seq Scan' and _base_relation(relation) in forbidden:
+                    regressions.append(f"{scale}/{name}: sequential scan on {relation}")
+            expected = baseline.get(scale, {}).get(name)
+            if expected is None:
+                continue
+            if result['scans'] != expected['scans']:
+                regressions.append(f"{scale}/{name}: plan changed from {expected['scans']} to {result['scans']}")
+            limit = expected['p50_ms'] * (1 + tolerance) + slack_ms
+            if result['p50_ms'] > limit:
+                regressions.append(f"{scale}/{name}: p50 {result['p50_ms']:.2f} ms exceeds "
+                                   f"{limit:.2f} ms (baseline {expected['p50_ms']:.2f} ms)")
+    return regressions
+
+
+def connect_to_bench_db():
+    """
+    Connect to the scratch database named by BENCH_DB_NAME with the admin credentials.
+
+    Returns:
+        Engine object: SQLAlchemy engine.
+    """
+    load_dotenv()
+    bench_db = os.getenv('BENCH_DB_NAME')
+    if not bench_db or bench_db == os.getenv('DB_NAME'):
+        sys.exit("Set BENCH_DB_NAME to a scratch database other than DB_NAME; the benchmark drops the relational schema.")
+    db_url = f"postgresql+psycopg2://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{bench_db}"
+    return create_engine(db_url, connect_args={'options': '-csearch_path=relational,public'})
+
+
+def seed(engine, scale):
+    """
+    Recreate the relational schema, apply the migrations and load synthetic rows.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(BASE_SCHEMA))
+    apply_migrations(engine)
+    params = dict(scale, genres=GENRES, countries=COUNTRIES)
+    with engine.begin() as conn:
+        conn.execute(text("SELECT setseed(0.42);"))
+        for statement in SEED_STATEMENTS:
+            conn.execute(text(statement), {key: value for key, value in params.items() if f':{key}' in statement})
+    # VACUUM cannot run in a transaction. The autocommit connection is detached so it is closed
+    # instead of going back to the pool, where the rolled-back timing transactions would use it.
+    connection = engine.raw_connection()
+    connection.detach()
+    try:
+        connection.set_isolation_level(0)
+        with connection.cursor() as cursor:
+            cursor.execute("VACUUM ANALYZE;")
+    finally:
+        connection.close()
+
+
+def _statement(query):
+    statement = text(query['sql'])
+    if query.get('expanding'):
+        statement = statement.bindparams(*(bindparam(name, expanding=True) for name in query['expanding']))
+    return statement
+
+
+def run_query(conn, query, scale, repeat, rng):
+    """
+    Time one hot query and capture its plan.
+
+    Every execution runs in its own transaction, which is rolled back, so the delete queries
+    leave the seeded data as it was.
+
+    Returns:
+        dict: p50_ms, p95_ms and scans.
+    """
+    statement = _statement(query)
+    explain = _statement(dict(query, sql="EXPLAIN (FORMAT JSON) " + query['sql']))
+    timings = []
+    for _ in range(repeat):
+        params = query['params'](scale, rng)
+        transaction = conn.begin()
+        try:
+            started = time.perf_counter()
+            conn.execute(statement, params)
+            timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            transaction.rollback()
+    transaction = conn.begin()
+    try:
+        plan = conn.execute(explain, query['params'](scale, rng)).scalar()
+    finally:
+        transaction.rollback()
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0], 3),
+        'scans': scan_nodes(plan[0]['Plan']),
+    }
+
+
+def run_scale(engine, scale, repeat=50, seed_value=0):
+    """
+    Seed one scale and run every hot query on it.
+
+    Returns:
+        dict: query name -> result of `run_query`.
+    """
+    seed(engine, scale)
+    rng = random.Random(seed_value)
+    with engine.connect() as conn:
+        return {name: run_query(conn, query, scale, repeat, rng) for name, query in HOT_QUERIES.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['small', 'medium'])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help="Write the results as the new baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.5)
+    parser.add_argument('--slack-ms', type=float, default=1.0)
+    args = parser.parse_args()
+
+    engine = connect_to_bench_db()
+    results = {}
+    for name in args.scales:
+        results[name] = run_scale(engine, SCALES[name], repeat=args.repeat)
+        for query, result in results[name].items():
+            scans = ', '.join(f"{node_type} {relation}" for node_type, relation, _ in result['scans'])
+            print(f"{name:<7} {query:<26} p50 {result['p50_ms']:8.2f} ms   p95 {result['p95_ms']:8.2f} ms   {scans}")
+
+    if args.update_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+        print(f"Baseline written to {args.baseline}.")
+        return
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else None
+    regressions = check(results, baseline, tolerance=args.tolerance, slack_ms=args.slack_ms)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    print("No plan or latency regressions.")
+
+
+if __name__ == '__main__':
+    main()
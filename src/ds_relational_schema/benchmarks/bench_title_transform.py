@@ -0,0 +1,119 @@
+"""
+Micro-benchmark for the title transform in `etl.py`.
+
+Compares the original notebook implementation (kept here as `legacy_*` reference functions)
+with the single-pass version on a synthetic merged frame. Run it from
+`src/ds_relational_schema`:
+
+    python -m benchmarks.bench_title_transform --rows 100000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from etl import create_title_df, fill_main_genre, fill_main_production
+
+GENRES = ['drama', 'comedy', 'thriller', 'documentation', 'romance', None]
+COUNTRIES = ['US', 'IN', 'GB', 'JP', 'KR', None]
+
+
+def legacy_fill_main(merged_df, column):
+    """The original three-pass mask/assign fill from the notebook."""
+    for suffix in ['_best_shows', '_best_movies_yearly', '_best_shows_yearly']:
+        mask = merged_df[column].isna() & merged_df[f'{column}{suffix}'].notna()
+        merged_df.loc[mask, column] = merged_df.loc[mask, f'{column}{suffix}']
+    return merged_df
+
+
+def legacy_create_title_df(df, best_movies_df, best_shows_df, best_movies_yearly_df, best_shows_yearly_df):
+    """The original `create_title_df` from the notebook, with the globals passed in."""
+    title_df = df[['content_id', 'title', 'release_year', 'type', 'age_certification', 'runtime', 'number_of_seasons', 'imdb_id', 'score', 'imdb_votes']].copy()
+    title_df.rename(columns={'score': 'imdb_score'}, inplace=True)
+    title_df['is_year_best'] = False
+    title_df['is_all_time_best'] = False
+    condition1 = title_df['title'].isin(best_movies_yearly_df['title']) | title_df['title'].isin(best_shows_yearly_df['title'])
+    title_df.loc[condition1, 'is_year_best'] = True
+    condition2 = title_df['title'].isin(best_movies_df['title']) | title_df['title'].isin(best_shows_df['title'])
+    title_df.loc[condition2, 'is_all_time_best'] = True
+    title_df = title_df.applymap(lambda r: r.strip() if isinstance(r, str) else r)
+    title_df.rename(columns={'type': 'content_type'}, inplace=True)
+    return title_df
+
+
+def make_frames(rows, seed=0):
+    """
+    Build a synthetic merged frame and best-of frames shaped like the notebook's inputs.
+
+    Parameters:
+    - rows (int): Number of titles in the merged frame.
+    - seed (int): Seed for the random generator.
+
+    Returns:
+    - tuple: (merged_df, best_movies_df, best_shows_df, best_movies_yearly_df, best_shows_yearly_df)
+    """
+    rng = np.random.default_rng(seed)
+    titles = np.array([f' Title {i} ' if i % 7 == 0 else f'Title {i}' for i in range(rows)], dtype=object)
+    merged_df = pd.DataFrame({
+        'content_id': [f'tm{i:06d} ' for i in range(rows)],
+        'title': titles,
+        'release_year': rng.integers(1950, 2023, rows),
+        'type': rng.choice(['MOVIE', 'SHOW '], rows),
+        'age_certification': rng.choice(np.array(['PG-13', ' R', 'TV-MA', None], dtype=object), rows),
+        'runtime': rng.integers(1, 240, rows),
+        'number_of_seasons': np.where(rng.random(rows) < 0.7, np.nan, rng.integers(1, 20, rows)),
+        'imdb_id': [f'tt{i:07d}' for i in range(rows)],
+        'score': np.round(rng.uniform(1, 10, rows), 1),
+        'imdb_votes': np.where(rng.random(rows) < 0.1, np.nan, rng.integers(5, 2_000_000, rows)),
+    })
+    for column, values in [('main_genre', GENRES), ('main_production', COUNTRIES)]:
+        for name in [column] + [f'{column}{suffix}' for suffix in ['_best_shows', '_best_movies_yearly', '_best_shows_yearly']]:
+            merged_df[name] = rng.choice(np.array(values, dtype=object), rows)
+
+    def best_of(fraction):
+        return pd.DataFrame({'title': rng.choice(titles, int(rows * fraction), replace=False)})
+
+    return merged_df, best_of(0.02), best_of(0.02), best_of(0.05), best_of(0.05)
+
+
+def best_time(fn, make_input, repeat):
+    """Return the best wall time of `fn(make_input())` in seconds, excluding input construction."""
+    timings = []
+    for _ in range(repeat):
+        args = make_input()
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    merged_df, *best_dfs = make_frames(args.rows)
+    cases = {
+        'fill_main_*': (
+            lambda df: legacy_fill_main(legacy_fill_main(df, 'main_genre'), 'main_production'),
+            lambda df: fill_main_production(fill_main_genre(df)),
+            lambda: (merged_df.copy(),),
+        ),
+        'create_title_df': (
+            legacy_create_title_df,
+            create_title_df,
+            lambda: (merged_df, *best_dfs),
+        ),
+    }
+    print(f'rows={args.rows}, best of {args.repeat}')
+    for name, (legacy, current, make_input) in cases.items():
+        legacy_s = best_time(legacy, make_input, args.repeat)
+        current_s = best_time(current, make_input, args.repeat)
+        print(f'{name:<16} legacy {legacy_s * 1000:9.2f} ms   single-pass {current_s * 1000:9.2f} ms   {legacy_s / current_s:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Transformations used by `relational_schema_1.ipynb` to build the relational tables.
+
+These functions were originally defined inline in the notebook. They live in a module
+so that they can be benchmarked and tested against a golden output, and the notebook
+imports them from here.
+"""
+
+from functools import reduce
+
+import pandas as pd
+
+BEST_OF_SUFFIXES = ['_best_shows', '_best_movies_yearly', '_best_shows_yearly']
+
+TITLE_COLUMNS = ['content_id', 'title', 'release_year', 'type', 'age_certification', 'runtime',
+                 'number_of_seasons', 'imdb_id', 'score', 'imdb_votes']
+
+
+def _coalesce_main(merged_df, column):
+    """
+    Coalesce a 'main_*' column with its best-of fallback columns in a single pass.
+
+    The fallbacks are tried in the same order as the merges that produced them, so the
+    earliest non-null value wins.
+
+    Parameters:
+    - merged_df (pd.DataFrame): The DataFrame containing the column and its suffixed fallbacks.
+    - column (str): The name of the column to fill, e.g. 'main_genre'.
+
+    Returns:
+    - pd.Series: The coalesced column.
+    """
+    sources = [merged_df[column]] + [merged_df[f'{column}{suffix}'] for suffix in BEST_OF_SUFFIXES]
+    return reduce(lambda filled, fallback: filled.combine_first(fallback), sources)
+
+
+def fill_main_genre(merged_df):
+    """
+    Fills the 'main_genre' column of the merged_df DataFrame with relevant data from other columns.
+
+    Where 'main_genre' is NaN it takes the first non-null value of 'main_genre_best_shows',
+    'main_genre_best_movies_yearly' and 'main_genre_best_shows_yearly', in that order.
+
+    Parameters:
+    - merged_df (pd.DataFrame): The DataFrame containing the relevant columns.
+
+    Returns:
+    - pd.DataFrame: The updated DataFrame.
+    """
+    merged_df['main_genre'] = _coalesce_main(merged_df, 'main_genre')
+    return merged_df
+
+
+def fill_main_production(merged_df):
+    """
+    Fills the 'main_production' column of the merged_df DataFrame with relevant data from other columns.
+
+    Where 'main_production' is NaN it takes the first non-null value of 'main_production_best_shows',
+    'main_production_best_movies_yearly' and 'main_production_best_shows_yearly', in that order.
+
+    Parameters:
+    - merged_df (pd.DataFrame): The DataFrame containing the relevant columns.
+
+    Returns:
+    - pd.DataFrame: The updated DataFrame.
+    """
+    merged_df['main_production'] = _coalesce_main(merged_df, 'main_production')
+    return merged_df
+
+
+def create_title_df(df, best_movies_df, best_shows_df, best_movies_yearly_df, best_shows_yearly_df):
+    """
+    Create a DataFrame with specific columns related to content titles and their attributes.
+
+    This function performs the following operations:
+    1. Selects the title columns and renames 'score' to 'imdb_score' and 'type' to 'content_type'.
+    2. Flags 'is_year_best' and 'is_all_time_best' with one hashed membership test each against
+       the union of the yearly and all-time best titles.
+    3. Strips whitespace from the string columns only, using vectorized `.str` methods. Categorical
+       columns stay categorical, and only their categories are stripped.
+
+    Parameters:
+    - df (pd.DataFrame): The input DataFrame containing content information.
+    - best_movies_df, best_shows_df (pd.DataFrame): All-time best movies and shows.
+    - best_movies_yearly_df, best_shows_yearly_df (pd.DataFrame): Yearly best movies and shows.
+
+    Returns:
+    - pd.DataFrame: A new DataFrame containing selected and transformed content title information.
+
+    Note:
+    - The best-of membership is tested before stripping, as in the original notebook version.
+    - Object columns are assumed to hold strings or nulls, which is what `pd.read_csv` produces.
+    """
+    title_df = df[TITLE_COLUMNS].rename(columns={'score': 'imdb_score', 'type': 'content_type'})
+    year_best_titles = pd.concat([best_movies_yearly_df['title'], best_shows_yearly_df['title']]).unique()
+    all_time_best_titles = pd.concat([best_movies_df['title'], best_shows_df['title']]).unique()
+    title_df['is_year_best'] = title_df['title'].isin(year_best_titles)
+    title_df['is_all_time_best'] = title_df['title'].isin(all_time_best_titles)
+    for column in title_df.select_dtypes(include=['object', 'category']).columns:
+        stripped = title_df[column].str.strip()
+        title_df[column] = stripped.astype('category') if title_df[column].dtype == 'category' else stripped
+    return title_df
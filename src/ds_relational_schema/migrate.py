@@ -0,0 +1,118 @@
+"""
+Apply the SQL migrations in `migrations/` to the recommender database.
+
+Migrations are plain SQL files named `NNN_description.sql`. They are applied in order, each
+in its own transaction, and recorded in `relational.schema_migrations` so that every file
+runs once. They change table structure, so run them with the admin credentials from .env
+(ds_user cannot ALTER TABLE):
+
+    python migrate.py            # apply pending migrations
+    python migrate.py --list     # show applied and pending migrations
+
+`relational_schema_1.ipynb` calls `apply_migrations` after creating the tables.
+"""
+
+import argparse
+import logging
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+logging.basicConfig(level=logging.INFO,
+                    format='[%(asctime)s] %(levelname)s in %(module)s: %(message)s]',
+                    datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent / 'migrations'
+
+
+def connect_to_db():
+    """
+    Connect to the database as the admin user from environment variables.
+
+    Returns:
+        Engine object: SQLAlchemy engine.
+    """
+    load_dotenv()
+    db_url = f"postgresql+psycopg2://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
+    return create_engine(db_url, connect_args={'options': '-csearch_path=relational'})
+
+
+def applied_migrations(engine):
+    """
+    Return the versions already applied, creating the bookkeeping table if needed.
+
+    Parameters:
+        engine (Engine): SQLAlchemy engine.
+
+    Returns:
+        set: Applied migration versions (file names without the .sql suffix).
+    """
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS relational.schema_migrations (
+                version varchar(100) PRIMARY KEY,
+                applied_at timestamp(0) NOT NULL DEFAULT now()
+            );
+        """))
+        return {row.version for row in conn.execute(text("SELECT version FROM relational.schema_migrations;"))}
+
+
+def pending_migrations(engine):
+    """
+    Return the migration files that have not been applied yet, in order.
+
+    Parameters:
+        engine (Engine): SQLAlchemy engine.
+
+    Returns:
+        list: Paths of pending migration files.
+    """
+    applied = applied_migrations(engine)
+    return [path for path in sorted(MIGRATIONS_DIR.glob('*.sql')) if path.stem not in applied]
+
+
+def apply_migrations(engine):
+    """
+    Apply every pending migration, each in its own transaction.
+
+    The SQL is sent through the raw DBAPI cursor without parameters, so migrations can use
+    `%` (for example the pg_trgm similarity operator) without escaping.
+
+    Parameters:
+        engine (Engine): SQLAlchemy engine connected as a user allowed to alter the schema.
+    """
+    for path in pending_migrations(engine):
+        connection = engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(path.read_text())
+                cursor.execute("INSERT INTO relational.schema_migrations (version) VALUES (%s);", (path.stem,))
+            connection.commit()
+            logger.info(f"Applied migration {path.stem}.")
+        except Exception as e:
+            connection.rollback()
+            logger.error(f"Migration {path.stem} failed and was rolled back: {e}")
+            raise
+        finally:
+            connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the SQL migrations in migrations/.")
+    parser.add_argument('--list', action='store_true', help="Show applied and pending migrations without applying them.")
+    args = parser.parse_args()
+
+    engine = connect_to_db()
+    if args.list:
+        applied = applied_migrations(engine)
+        for path in sorted(MIGRATIONS_DIR.glob('*.sql')):
+            print(f"{'applied' if path.stem in applied else 'pending'}  {path.stem}")
+        return
+    apply_migrations(engine)
+
+
+if __name__ == '__main__':
+    main()
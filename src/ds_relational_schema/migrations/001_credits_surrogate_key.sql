@@ -0,0 +1,23 @@
+-- Replace the six-column natural primary key of relational.credits, which includes
+-- character varchar(400), with a 4-byte surrogate key. The natural key stays unique through
+-- a 16-byte md5 hash of it, and per-person and per-title lookups get their own indexes.
+
+ALTER TABLE relational.credits DROP CONSTRAINT credits_pkey;
+
+ALTER TABLE relational.credits
+    ALTER COLUMN person_id SET NOT NULL,
+    ADD COLUMN credit_id integer GENERATED BY DEFAULT AS IDENTITY,
+    ADD COLUMN credit_key uuid GENERATED ALWAYS AS (
+        md5(content_id || '|' || person_id || '|' || first_name || '|' || last_name || '|' || "character" || '|' || role)::uuid
+    ) STORED;
+
+ALTER TABLE relational.credits ADD CONSTRAINT credits_pkey PRIMARY KEY (credit_id);
+
+CREATE UNIQUE INDEX credits_credit_key_idx ON relational.credits (credit_key);
+
+-- person_id is only ever compared for equality, so a hash index is smaller than a B-tree.
+CREATE INDEX credits_person_id_idx ON relational.credits USING hash (person_id);
+
+-- content_id was the leading column of the old primary key; keep it indexed for title
+-- lookups and for the foreign key from titles.
+CREATE INDEX credits_content_id_idx ON relational.credits (content_id);
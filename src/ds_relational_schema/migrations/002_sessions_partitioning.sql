@@ -0,0 +1,72 @@
+-- Move relational.sessions to monthly range partitions on start_timestamp.
+--
+-- RecoMaker.get_last_5 runs WHERE user_id = ? ORDER BY start_timestamp DESC LIMIT 5, which
+-- the (start_timestamp, end_timestamp, content_id, user_id) primary key cannot serve. The
+-- (user_id, start_timestamp DESC) index turns it into an index scan per partition, the BRIN
+-- index keeps time-range scans cheap, and old months can be detached with
+-- session_partitions.py instead of deleted row by row.
+
+ALTER TABLE relational.sessions RENAME TO sessions_unpartitioned;
+ALTER TABLE relational.sessions_unpartitioned RENAME CONSTRAINT sessions_pkey TO sessions_unpartitioned_pkey;
+
+CREATE TABLE relational.sessions (
+    start_timestamp timestamp(0) NOT NULL,
+    end_timestamp timestamp(0) NOT NULL,
+    content_id VARCHAR(10) NOT NULL REFERENCES relational.titles(content_id),
+    user_id int NOT NULL REFERENCES relational.users(user_id),
+    user_rating int,
+    PRIMARY KEY (start_timestamp, end_timestamp, content_id, user_id)
+) PARTITION BY RANGE (start_timestamp);
+
+CREATE INDEX sessions_user_id_start_idx ON relational.sessions (user_id, start_timestamp DESC);
+CREATE INDEX sessions_start_brin_idx ON relational.sessions USING brin (start_timestamp);
+
+-- Rows outside every monthly partition land here until their month is created.
+CREATE TABLE relational.sessions_default PARTITION OF relational.sessions DEFAULT;
+
+-- Create the partition for the month containing p_month, moving any rows for that month out
+-- of the default partition first. Returns the partition name; existing partitions are left alone.
+CREATE OR REPLACE FUNCTION relational.create_sessions_partition(p_month date)
+RETURNS text
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_start date := date_trunc('month', p_month)::date;
+    v_end date := (date_trunc('month', p_month) + interval '1 month')::date;
+    v_name text := format('sessions_%s', to_char(p_month, 'YYYY_MM'));
+BEGIN
+    IF to_regclass(format('relational.%I', v_name)) IS NOT NULL THEN
+        RETURN v_name;
+    END IF;
+    EXECUTE format('CREATE TABLE relational.%I (LIKE relational.sessions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_name);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM relational.sessions_default WHERE start_timestamp >= %L AND start_timestamp < %L RETURNING *) '
+        'INSERT INTO relational.%I SELECT * FROM moved',
+        v_start, v_end, v_name);
+    EXECUTE format('ALTER TABLE relational.sessions ATTACH PARTITION relational.%I FOR VALUES FROM (%L) TO (%L)',
+        v_name, v_start, v_end);
+    RETURN v_name;
+END;
+$$;
+
+-- Partitions from the oldest existing session through three months ahead.
+SELECT relational.create_sessions_partition(month::date)
+FROM generate_series(
+    date_trunc('month', coalesce((SELECT min(start_timestamp) FROM relational.sessions_unpartitioned), now())),
+    date_trunc('month', now()) + interval '3 months',
+    interval '1 month'
+) AS month;
+
+INSERT INTO relational.sessions (start_timestamp, end_timestamp, content_id, user_id, user_rating)
+SELECT start_timestamp, end_timestamp, content_id, user_id, user_rating
+FROM relational.sessions_unpartitioned;
+
+DROP TABLE relational.sessions_unpartitioned;
+
+-- The grants on the old table went with it.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'ds_user') THEN
+        GRANT ALL ON relational.sessions TO ds_user;
+    END IF;
+END;
+$$;
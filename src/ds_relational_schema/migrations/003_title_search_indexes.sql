@@ -0,0 +1,13 @@
+-- Trigram indexes behind the /title/find/ endpoint. They serve substring (ILIKE '%...%'),
+-- similarity (%) and word-similarity (<%) matches on titles and on credit names, so ranked
+-- fuzzy search does not have to scan either table.
+--
+-- pg_trgm goes into public; the web API puts public after relational on its search_path.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public;
+
+CREATE INDEX titles_title_trgm_idx ON relational.titles USING gin (title public.gin_trgm_ops);
+
+-- The expression must match the one used in the /title/find/ query.
+CREATE INDEX credits_name_trgm_idx ON relational.credits
+    USING gin ((first_name || ' ' || last_name) public.gin_trgm_ops);
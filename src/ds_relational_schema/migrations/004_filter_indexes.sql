@@ -0,0 +1,20 @@
+-- Composite indexes for the _gte/_lte/_in filters of the web API search endpoints.
+--
+-- Already covered by earlier migrations:
+--   sessions (user_id, start_timestamp DESC)  "sessions for user X in the last 7 days"  (002)
+--   sessions BRIN (start_timestamp)           time-window scans across users           (002)
+--   credits (content_id), hash (person_id)    content_id_in / person_id_in             (001)
+
+-- "imdb_score >= 8 released after 2015": the score range is the selective one, so it leads.
+CREATE INDEX titles_imdb_score_release_year_idx ON relational.titles (imdb_score, release_year);
+CREATE INDEX titles_release_year_idx ON relational.titles (release_year);
+
+-- Per-title session windows, e.g. content_id_in plus start_timestamp_gte.
+CREATE INDEX sessions_content_id_start_idx ON relational.sessions (content_id, start_timestamp);
+
+-- genre_in / country_in: the primary keys lead with content_id and cannot serve these.
+CREATE INDEX genres_genre_content_id_idx ON relational.genres (genre, content_id);
+CREATE INDEX prod_countries_country_content_id_idx ON relational.prod_countries (country, content_id);
+
+-- subscription_type_in plus a subscription_date range.
+CREATE INDEX users_subscription_type_date_idx ON relational.users (subscription_type, subscription_date);
@@ -0,0 +1,64 @@
+-- Server-side genre-overlap recommender behind RecoMaker.
+--
+-- RecoMaker used to read the last five sessions, read the similar-genre titles and then insert
+-- each recommendation, one round trip per step and per row. make_recommendations does all of it
+-- in one statement for any number of users:
+--
+--   history         the last p_history sessions per user (sessions_user_id_start_idx)
+--   history_genres  how many of those titles carry each genre
+--   candidates      titles sharing those genres that the user has never watched, scored by overlap
+--   ranked          top p_limit per user, ties broken by imdb_score and content_id
+--
+-- and inserts the result into relational.recommendations. Pairs already recommended are skipped
+-- by ON CONFLICT; only the newly written rows are returned.
+
+CREATE OR REPLACE FUNCTION relational.make_recommendations(
+    p_user_ids int[],
+    p_history int DEFAULT 5,
+    p_limit int DEFAULT 10
+)
+RETURNS TABLE (user_id int, content_id varchar)
+LANGUAGE sql
+AS $$
+    WITH history AS (
+        SELECT u.user_id, recent.content_id
+        FROM (SELECT DISTINCT unnest(p_user_ids) AS user_id) u
+        CROSS JOIN LATERAL (
+            SELECT s.content_id
+            FROM relational.sessions s
+            WHERE s.user_id = u.user_id
+            ORDER BY s.start_timestamp DESC
+            LIMIT p_history
+        ) recent
+    ),
+    history_genres AS (
+        SELECT h.user_id, g.genre, count(*) AS weight
+        FROM history h
+        JOIN relational.genres g ON g.content_id = h.content_id
+        GROUP BY h.user_id, g.genre
+    ),
+    candidates AS (
+        SELECT hg.user_id, g.content_id, sum(hg.weight) AS overlap
+        FROM history_genres hg
+        JOIN relational.genres g ON g.genre = hg.genre
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM relational.sessions s
+            WHERE s.user_id = hg.user_id AND s.content_id = g.content_id
+        )
+        GROUP BY hg.user_id, g.content_id
+    ),
+    ranked AS (
+        SELECT c.user_id, c.content_id,
+               row_number() OVER (PARTITION BY c.user_id
+                                  ORDER BY c.overlap DESC, t.imdb_score DESC NULLS LAST, c.content_id) AS rank
+        FROM candidates c
+        JOIN relational.titles t ON t.content_id = c.content_id
+    )
+    INSERT INTO relational.recommendations AS r (user_id, content_id)
+    SELECT ranked.user_id, ranked.content_id
+    FROM ranked
+    WHERE ranked.rank <= p_limit
+    ON CONFLICT (content_id, user_id) DO NOTHING
+    RETURNING r.user_id, r.content_id;
+$$;
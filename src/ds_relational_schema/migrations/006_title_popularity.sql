@@ -0,0 +1,201 @@
+-- Time-decayed title popularity, maintained incrementally from relational.sessions.
+--
+-- Every session adds popularity_weight(start_timestamp) to its title, a weight that doubles
+-- every 7 days after a fixed anchor. A title's score is therefore its exponentially decayed
+-- view count scaled by a common factor. Scores only ever grow, so a new session is a single
+-- addition, and ranking by score equals ranking by decayed views at any moment. Dividing by
+-- popularity_weight(t) gives the decayed count as of time t. The rating columns hold the same
+-- weighted sums for the rated sessions, and their ratio is the decayed mean rating.
+--
+-- A statement-level trigger folds each batch of inserted sessions into title_popularity and
+-- genre_popularity with one upsert per table. Updates and deletes of sessions are not tracked;
+-- run SELECT relational.rebuild_popularity() after correcting history. The fixed anchor
+-- overflows double precision around 2039; migration 009 makes it movable.
+
+CREATE FUNCTION relational.popularity_weight(p_at timestamp)
+RETURNS double precision
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT exp(ln(2) * extract(epoch FROM p_at - timestamp '2020-01-01')::double precision / (7 * 86400));
+$$;
+
+CREATE TABLE relational.title_popularity (
+    content_id VARCHAR(10) PRIMARY KEY REFERENCES relational.titles(content_id) ON DELETE CASCADE,
+    score double precision NOT NULL,
+    views bigint NOT NULL,
+    rating_weight double precision NOT NULL,
+    rating_score double precision NOT NULL,
+    last_view timestamp(0) NOT NULL
+);
+CREATE INDEX title_popularity_score_idx ON relational.title_popularity (score DESC);
+
+CREATE TABLE relational.genre_popularity (
+    genre VARCHAR(20) NOT NULL,
+    content_id VARCHAR(10) NOT NULL REFERENCES relational.titles(content_id) ON DELETE CASCADE,
+    score double precision NOT NULL,
+    PRIMARY KEY (genre, content_id)
+);
+CREATE INDEX genre_popularity_genre_score_idx ON relational.genre_popularity (genre, score DESC);
+
+-- Runs as the owner so session writers need no privileges on the aggregate tables. Rows are
+-- upserted in content_id order so concurrent batches lock them in the same order.
+CREATE FUNCTION relational.sessions_popularity_trigger()
+RETURNS trigger
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = relational, pg_temp AS $$
+BEGIN
+    WITH delta AS (
+        SELECT content_id,
+               sum(relational.popularity_weight(start_timestamp)) AS score,
+               count(*) AS views,
+               coalesce(sum(relational.popularity_weight(start_timestamp)) FILTER (WHERE user_rating IS NOT NULL), 0) AS rating_weight,
+               coalesce(sum(relational.popularity_weight(start_timestamp) * user_rating), 0) AS rating_score,
+               max(start_timestamp) AS last_view
+        FROM new_sessions
+        GROUP BY content_id
+    ),
+    titles_upserted AS (
+        INSERT INTO relational.title_popularity AS p (content_id, score, views, rating_weight, rating_score, last_view)
+        SELECT content_id, score, views, rating_weight, rating_score, last_view
+        FROM delta
+        ORDER BY content_id
+        ON CONFLICT (content_id) DO UPDATE
+        SET score = p.score + EXCLUDED.score,
+            views = p.views + EXCLUDED.views,
+            rating_weight = p.rating_weight + EXCLUDED.rating_weight,
+            rating_score = p.rating_score + EXCLUDED.rating_score,
+            last_view = greatest(p.last_view, EXCLUDED.last_view)
+    )
+    INSERT INTO relational.genre_popularity AS p (genre, content_id, score)
+    SELECT g.genre, delta.content_id, delta.score
+    FROM delta
+    JOIN relational.genres g ON g.content_id = delta.content_id
+    ORDER BY g.genre, delta.content_id
+    ON CONFLICT (genre, content_id) DO UPDATE
+    SET score = p.score + EXCLUDED.score;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER sessions_popularity
+    AFTER INSERT ON relational.sessions
+    REFERENCING NEW TABLE AS new_sessions
+    FOR EACH STATEMENT EXECUTE FUNCTION relational.sessions_popularity_trigger();
+
+-- Recompute both tables from the full session history.
+CREATE FUNCTION relational.rebuild_popularity()
+RETURNS void
+LANGUAGE sql SECURITY DEFINER SET search_path = relational, pg_temp AS $$
+    TRUNCATE relational.genre_popularity, relational.title_popularity;
+
+    INSERT INTO relational.title_popularity (content_id, score, views, rating_weight, rating_score, last_view)
+    SELECT content_id,
+           sum(relational.popularity_weight(start_timestamp)),
+           count(*),
+           coalesce(sum(relational.popularity_weight(start_timestamp)) FILTER (WHERE user_rating IS NOT NULL), 0),
+           coalesce(sum(relational.popularity_weight(start_timestamp) * user_rating), 0),
+           max(start_timestamp)
+    FROM relational.sessions
+    GROUP BY content_id;
+
+    INSERT INTO relational.genre_popularity (genre, content_id, score)
+    SELECT g.genre, p.content_id, p.score
+    FROM relational.title_popularity p
+    JOIN relational.genres g ON g.content_id = p.content_id;
+$$;
+
+SELECT relational.rebuild_popularity();
+
+-- Decayed views and mean rating as of now; order by score to use the indexes.
+CREATE VIEW relational.popular_titles AS
+SELECT p.content_id, t.title, t.content_type,
+       p.score / relational.popularity_weight(localtimestamp) AS decayed_views,
+       p.rating_score / nullif(p.rating_weight, 0) AS mean_rating,
+       p.views, p.last_view, p.score
+FROM relational.title_popularity p
+JOIN relational.titles t ON t.content_id = p.content_id;
+
+CREATE VIEW relational.popular_titles_by_genre AS
+SELECT g.genre, g.content_id, t.title, t.content_type,
+       g.score / relational.popularity_weight(localtimestamp) AS decayed_views,
+       p.rating_score / nullif(p.rating_weight, 0) AS mean_rating,
+       p.views, p.last_view, g.score
+FROM relational.genre_popularity g
+JOIN relational.title_popularity p ON p.content_id = g.content_id
+JOIN relational.titles t ON t.content_id = g.content_id;
+
+-- Cold start: users without any sessions get the most popular titles instead of nothing.
+CREATE OR REPLACE FUNCTION relational.make_recommendations(
+    p_user_ids int[],
+    p_history int DEFAULT 5,
+    p_limit int DEFAULT 10
+)
+RETURNS TABLE (user_id int, content_id varchar)
+LANGUAGE sql
+AS $$
+    WITH requested AS (
+        SELECT DISTINCT unnest(p_user_ids) AS user_id
+    ),
+    history AS (
+        SELECT u.user_id, recent.content_id
+        FROM requested u
+        CROSS JOIN LATERAL (
+            SELECT s.content_id
+            FROM relational.sessions s
+            WHERE s.user_id = u.user_id
+            ORDER BY s.start_timestamp DESC
+            LIMIT p_history
+        ) recent
+    ),
+    history_genres AS (
+        SELECT h.user_id, g.genre, count(*) AS weight
+        FROM history h
+        JOIN relational.genres g ON g.content_id = h.content_id
+        GROUP BY h.user_id, g.genre
+    ),
+    candidates AS (
+        SELECT hg.user_id, g.content_id, sum(hg.weight) AS overlap
+        FROM history_genres hg
+        JOIN relational.genres g ON g.genre = hg.genre
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM relational.sessions s
+            WHERE s.user_id = hg.user_id AND s.content_id = g.content_id
+        )
+        GROUP BY hg.user_id, g.content_id
+    ),
+    ranked AS (
+        SELECT c.user_id, c.content_id,
+               row_number() OVER (PARTITION BY c.user_id
+                                  ORDER BY c.overlap DESC, t.imdb_score DESC NULLS LAST, c.content_id) AS rank
+        FROM candidates c
+        JOIN relational.titles t ON t.content_id = c.content_id
+    ),
+    cold_start AS (
+        SELECT u.user_id, popular.content_id
+        FROM requested u
+        CROSS JOIN LATERAL (
+            SELECT p.content_id
+            FROM relational.title_popularity p
+            ORDER BY p.score DESC
+            LIMIT p_limit
+        ) popular
+        WHERE NOT EXISTS (SELECT 1 FROM history h WHERE h.user_id = u.user_id)
+    )
+    INSERT INTO relational.recommendations AS r (user_id, content_id)
+    SELECT ranked.user_id, ranked.content_id
+    FROM ranked
+    WHERE ranked.rank <= p_limit
+    UNION ALL
+    SELECT cold_start.user_id, cold_start.content_id
+    FROM cold_start
+    ON CONFLICT (content_id, user_id) DO NOTHING
+    RETURNING r.user_id, r.content_id;
+$$;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'ds_user') THEN
+        GRANT SELECT ON relational.title_popularity, relational.genre_popularity,
+                        relational.popular_titles, relational.popular_titles_by_genre TO ds_user;
+    END IF;
+END;
+$$;
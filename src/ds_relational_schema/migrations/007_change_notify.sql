@@ -0,0 +1,67 @@
+-- Change notifications for in-process caches (src/api/change_listener.py).
+--
+-- Every insert, update and delete on the cached relational tables sends a NOTIFY on the
+-- relational_changes channel with a JSON payload {"table": ..., "op": ..., "key": ...}. The key
+-- is the column caches are keyed by, passed as the trigger argument. Postgres delivers the
+-- notifications when the transaction commits and drops identical payloads within a
+-- transaction, so a bulk write sends one notification per distinct key.
+--
+-- sessions is left out: it is append-heavy and no cache is keyed on it.
+
+CREATE FUNCTION relational.notify_change()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify('relational_changes', json_build_object(
+            'table', TG_TABLE_NAME, 'op', TG_OP, 'key', to_jsonb(OLD) ->> TG_ARGV[0])::text);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_notify('relational_changes', json_build_object(
+            'table', TG_TABLE_NAME, 'op', TG_OP, 'key', to_jsonb(NEW) ->> TG_ARGV[0])::text);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER titles_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON relational.titles
+    FOR EACH ROW EXECUTE FUNCTION relational.notify_change('content_id');
+
+CREATE TRIGGER genres_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON relational.genres
+    FOR EACH ROW EXECUTE FUNCTION relational.notify_change('content_id');
+
+CREATE TRIGGER prod_countries_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON relational.prod_countries
+    FOR EACH ROW EXECUTE FUNCTION relational.notify_change('content_id');
+
+CREATE TRIGGER credits_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON relational.credits
+    FOR EACH ROW EXECUTE FUNCTION relational.notify_change('content_id');
+
+CREATE TRIGGER users_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON relational.users
+    FOR EACH ROW EXECUTE FUNCTION relational.notify_change('user_id');
+
+-- TRUNCATE has no rows; notify the table with a null key so listeners drop all of it.
+CREATE FUNCTION relational.notify_truncate()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('relational_changes', json_build_object(
+        'table', TG_TABLE_NAME, 'op', TG_OP, 'key', NULL)::text);
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER titles_notify_truncate AFTER TRUNCATE ON relational.titles
+    FOR EACH STATEMENT EXECUTE FUNCTION relational.notify_truncate();
+CREATE TRIGGER genres_notify_truncate AFTER TRUNCATE ON relational.genres
+    FOR EACH STATEMENT EXECUTE FUNCTION relational.notify_truncate();
+CREATE TRIGGER prod_countries_notify_truncate AFTER TRUNCATE ON relational.prod_countries
+    FOR EACH STATEMENT EXECUTE FUNCTION relational.notify_truncate();
+CREATE TRIGGER credits_notify_truncate AFTER TRUNCATE ON relational.credits
+    FOR EACH STATEMENT EXECUTE FUNCTION relational.notify_truncate();
+CREATE TRIGGER users_notify_truncate AFTER TRUNCATE ON relational.users
+    FOR EACH STATEMENT EXECUTE FUNCTION relational.notify_truncate();
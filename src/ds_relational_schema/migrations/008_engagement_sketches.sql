@@ -0,0 +1,44 @@
+-- HyperLogLog sketches of session engagement (src/api/sketches.py).
+--
+-- title_day_users holds, per title and day, a sketch of the distinct users who started a
+-- session on it; user_week_titles holds, per user and week (weeks start on Monday, as with
+-- date_trunc('week', ...)), a sketch of the distinct titles they watched. A sketch is the
+-- zlib-compressed register array of a HyperLogLog; the register count gives its precision.
+-- Sketches merge by taking the register-wise maximum, so a count over any range of days or
+-- weeks reads and merges the rows in it instead of running COUNT(DISTINCT ...) over sessions.
+--
+-- `python sketches.py update` adds new sessions to the sketches. sketch_watermarks records the
+-- latest start_timestamp it has read; each run rereads a lateness window before that, which is
+-- safe because adding a session to a sketch twice does not change it.
+
+CREATE TABLE relational.title_day_users (
+    content_id varchar(10) NOT NULL REFERENCES relational.titles(content_id) ON DELETE CASCADE,
+    day date NOT NULL,
+    registers bytea NOT NULL,
+    PRIMARY KEY (content_id, day)
+);
+
+CREATE INDEX title_day_users_day_idx ON relational.title_day_users (day);
+
+CREATE TABLE relational.user_week_titles (
+    user_id integer NOT NULL REFERENCES relational.users(user_id) ON DELETE CASCADE,
+    week date NOT NULL,
+    registers bytea NOT NULL,
+    PRIMARY KEY (user_id, week)
+);
+
+CREATE INDEX user_week_titles_week_idx ON relational.user_week_titles (week);
+
+CREATE TABLE relational.sketch_watermarks (
+    name varchar(50) PRIMARY KEY,
+    processed_until timestamp(0) NOT NULL
+);
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'ds_user') THEN
+        GRANT SELECT, INSERT, UPDATE, DELETE ON relational.title_day_users, relational.user_week_titles,
+                                                relational.sketch_watermarks TO ds_user;
+    END IF;
+END;
+$$;
@@ -0,0 +1,157 @@
+-- Keep the title popularity weights within double precision.
+--
+-- Migration 006 weights every session by 2 ** (weeks since 2020-01-01). That weight overflows
+-- float8 around 2039, the rating sums sooner, and sessions from before about 1999 underflow;
+-- either one makes the trigger, and so every INSERT or COPY into sessions, fail. The anchor
+-- now lives in relational.popularity_anchor and rescale_popularity() moves it forward,
+-- multiplying the stored sums by the same factor the weights shrink by. Scores stay ordered as
+-- before, and weights stay close to 1. Run it weekly with the admin credentials, e.g. from cron:
+--
+--     psql -c "SELECT relational.rescale_popularity();"
+--
+-- rebuild_popularity() also moves the anchor to the current week. Weights are clamped to
+-- 2 ** -1000 .. 2 ** 900, which only comes into play after some 17 years without a rescale or
+-- for sessions some 19 years older than the anchor, so a missed job cannot break session
+-- inserts.
+--
+-- The trigger reads the anchor FOR SHARE and rescale_popularity() updates it first, so a batch
+-- of sessions is added either entirely before or entirely after a rescale, with its anchor.
+
+CREATE TABLE relational.popularity_anchor (
+    single boolean PRIMARY KEY DEFAULT true CHECK (single),
+    anchor timestamp NOT NULL
+);
+INSERT INTO relational.popularity_anchor (anchor) VALUES (timestamp '2020-01-01');
+
+CREATE FUNCTION relational.popularity_weight(p_at timestamp, p_anchor timestamp)
+RETURNS double precision
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT exp(ln(2) * greatest(least(extract(epoch FROM p_at - p_anchor)::double precision / (7 * 86400), 900), -1000));
+$$;
+
+-- Now reads the anchor, so it is STABLE instead of IMMUTABLE. The views and two_stage.py use
+-- it to turn scores back into decayed view counts.
+CREATE OR REPLACE FUNCTION relational.popularity_weight(p_at timestamp)
+RETURNS double precision
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+    SELECT relational.popularity_weight(p_at, anchor) FROM relational.popularity_anchor;
+$$;
+
+-- p_value * exp(p_log_factor), going to 0 instead of raising an underflow error.
+CREATE FUNCTION relational.popularity_rescaled(p_value double precision, p_log_factor double precision)
+RETURNS double precision
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CASE
+        WHEN p_value <= 0 THEN p_value
+        WHEN ln(p_value) + p_log_factor < -700 THEN 0
+        ELSE exp(ln(p_value) + p_log_factor)
+    END;
+$$;
+
+CREATE OR REPLACE FUNCTION relational.sessions_popularity_trigger()
+RETURNS trigger
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = relational, pg_temp AS $$
+DECLARE
+    v_anchor timestamp;
+BEGIN
+    SELECT anchor INTO v_anchor FROM relational.popularity_anchor FOR SHARE;
+
+    WITH weighted AS (
+        SELECT content_id, start_timestamp, user_rating,
+               relational.popularity_weight(start_timestamp, v_anchor) AS weight
+        FROM new_sessions
+    ),
+    delta AS (
+        SELECT content_id,
+               sum(weight) AS score,
+               count(*) AS views,
+               coalesce(sum(weight) FILTER (WHERE user_rating IS NOT NULL), 0) AS rating_weight,
+               coalesce(sum(weight * user_rating), 0) AS rating_score,
+               max(start_timestamp) AS last_view
+        FROM weighted
+        GROUP BY content_id
+    ),
+    titles_upserted AS (
+        INSERT INTO relational.title_popularity AS p (content_id, score, views, rating_weight, rating_score, last_view)
+        SELECT content_id, score, views, rating_weight, rating_score, last_view
+        FROM delta
+        ORDER BY content_id
+        ON CONFLICT (content_id) DO UPDATE
+        SET score = p.score + EXCLUDED.score,
+            views = p.views + EXCLUDED.views,
+            rating_weight = p.rating_weight + EXCLUDED.rating_weight,
+            rating_score = p.rating_score + EXCLUDED.rating_score,
+            last_view = greatest(p.last_view, EXCLUDED.last_view)
+    )
+    INSERT INTO relational.genre_popularity AS p (genre, content_id, score)
+    SELECT g.genre, delta.content_id, delta.score
+    FROM delta
+    JOIN relational.genres g ON g.content_id = delta.content_id
+    ORDER BY g.genre, delta.content_id
+    ON CONFLICT (genre, content_id) DO UPDATE
+    SET score = p.score + EXCLUDED.score;
+    RETURN NULL;
+END;
+$$;
+
+-- Move the anchor to p_anchor and rescale the stored sums to match. Returns the old anchor.
+CREATE FUNCTION relational.rescale_popularity(p_anchor timestamp DEFAULT date_trunc('week', localtimestamp))
+RETURNS timestamp
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = relational, pg_temp AS $$
+DECLARE
+    v_anchor timestamp;
+    v_log_factor double precision;
+BEGIN
+    SELECT anchor INTO v_anchor FROM relational.popularity_anchor FOR UPDATE;
+    v_log_factor := ln(2) * extract(epoch FROM v_anchor - p_anchor)::double precision / (7 * 86400);
+
+    UPDATE relational.popularity_anchor SET anchor = p_anchor;
+    UPDATE relational.title_popularity
+    SET score = relational.popularity_rescaled(score, v_log_factor),
+        rating_weight = relational.popularity_rescaled(rating_weight, v_log_factor),
+        rating_score = relational.popularity_rescaled(rating_score, v_log_factor);
+    UPDATE relational.genre_popularity
+    SET score = relational.popularity_rescaled(score, v_log_factor);
+    RETURN v_anchor;
+END;
+$$;
+
+-- Recompute both tables from the full session history, against the current week.
+CREATE OR REPLACE FUNCTION relational.rebuild_popularity()
+RETURNS void
+LANGUAGE sql SECURITY DEFINER SET search_path = relational, pg_temp AS $$
+    UPDATE relational.popularity_anchor SET anchor = date_trunc('week', localtimestamp);
+
+    TRUNCATE relational.genre_popularity, relational.title_popularity;
+
+    INSERT INTO relational.title_popularity (content_id, score, views, rating_weight, rating_score, last_view)
+    SELECT content_id,
+           sum(weight),
+           count(*),
+           coalesce(sum(weight) FILTER (WHERE user_rating IS NOT NULL), 0),
+           coalesce(sum(weight * user_rating), 0),
+           max(start_timestamp)
+    FROM (
+        SELECT s.content_id, s.start_timestamp, s.user_rating,
+               relational.popularity_weight(s.start_timestamp, a.anchor) AS weight
+        FROM relational.sessions s
+        CROSS JOIN relational.popularity_anchor a
+    ) weighted
+    GROUP BY content_id;
+
+    INSERT INTO relational.genre_popularity (genre, content_id, score)
+    SELECT g.genre, p.content_id, p.score
+    FROM relational.title_popularity p
+    JOIN relational.genres g ON g.content_id = p.content_id;
+$$;
+
+SELECT relational.rescale_popularity();
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'ds_user') THEN
+        -- popular_titles and two_stage.py call popularity_weight(timestamp) as ds_user.
+        GRANT SELECT ON relational.popularity_anchor TO ds_user;
+    END IF;
+END;
+$$;
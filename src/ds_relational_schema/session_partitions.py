@@ -0,0 +1,177 @@
+"""
+Maintenance for the monthly partitions of relational.sessions.
+
+`migrations/002_sessions_partitioning.sql` partitions sessions by month of start_timestamp.
+This tool keeps partitions created ahead of incoming data and ages out old months by
+detaching them, which is a catalog operation instead of a large DELETE. Run it with the
+admin credentials from .env, for example from a monthly cron job:
+
+    python session_partitions.py list
+    python session_partitions.py ensure --months-ahead 3
+    python session_partitions.py detach --keep-months 12 [--drop]
+
+Detached partitions are renamed to `<name>_detached` and can still be queried, archived or
+re-attached; `--drop` removes them instead.
+"""
+
+import argparse
+import logging
+import re
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+from migrate import connect_to_db
+
+logging.basicConfig(level=logging.INFO,
+                    format='[%(asctime)s] %(levelname)s in %(module)s: %(message)s]',
+                    datefmt='%Y-%m-%d %H:%M:%S')
+logger = logging.getLogger(__name__)
+
+PARTITION_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def add_months(month, months):
+    """
+    Return the first day of the month `months` after the month containing `month`.
+
+    Parameters:
+        month (date): Any day of the starting month.
+        months (int): Number of months to move, may be negative.
+
+    Returns:
+        date: The first day of the resulting month.
+    """
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def parse_bound(bound):
+    """
+    Parse a partition bound expression as returned by pg_get_expr(relpartbound).
+
+    Parameters:
+        bound (str): e.g. "FOR VALUES FROM ('2023-08-01 00:00:00') TO ('2023-09-01 00:00:00')".
+
+    Returns:
+        tuple: (lower, upper) datetimes, or None for the default partition.
+    """
+    match = PARTITION_BOUND.search(bound)
+    if match is None:
+        return None
+    return tuple(datetime.fromisoformat(value) for value in match.groups())
+
+
+def partitions_to_detach(partitions, cutoff):
+    """
+    Select the partitions whose whole range lies before `cutoff`.
+
+    Parameters:
+        partitions (list): (name, bound expression) tuples.
+        cutoff (date): Sessions starting before this date may be aged out.
+
+    Returns:
+        list: Names of the partitions to detach, oldest first.
+    """
+    cutoff = datetime.combine(cutoff, datetime.min.time())
+    expired = []
+    for name, bound in partitions:
+        bounds = parse_bound(bound)
+        if bounds is not None and bounds[1] <= cutoff:
+            expired.append((bounds[0], name))
+    return [name for _, name in sorted(expired)]
+
+
+def list_partitions(conn):
+    """
+    List the attached partitions of relational.sessions.
+
+    Parameters:
+        conn (Connection): An open SQLAlchemy connection.
+
+    Returns:
+        list: (name, bound expression) tuples.
+    """
+    rows = conn.execute(text("""
+        SELECT child.relname AS name, pg_get_expr(child.relpartbound, child.oid) AS bound
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        JOIN pg_namespace ns ON ns.oid = parent.relnamespace
+        WHERE ns.nspname = 'relational' AND parent.relname = 'sessions'
+        ORDER BY child.relname;
+    """))
+    return [(row.name, row.bound) for row in rows]
+
+
+def ensure_partitions(engine, months_ahead=3, today=None):
+    """
+    Create the partitions from the current month through `months_ahead` months ahead.
+
+    Parameters:
+        engine (Engine): SQLAlchemy engine with rights to alter relational.sessions.
+        months_ahead (int, optional): How many future months to create. Default is 3.
+        today (date, optional): Reference date, defaults to today.
+
+    Returns:
+        list: Names of the partitions that now cover the window.
+    """
+    today = today or date.today()
+    with engine.begin() as conn:
+        return [
+            conn.execute(text("SELECT relational.create_sessions_partition(:month);"),
+                         {'month': add_months(today, offset)}).scalar()
+            for offset in range(months_ahead + 1)
+        ]
+
+
+def detach_partitions(engine, keep_months=12, drop=False, today=None):
+    """
+    Detach (or drop) the partitions that end before the retention window.
+
+    Parameters:
+        engine (Engine): SQLAlchemy engine with rights to alter relational.sessions.
+        keep_months (int, optional): Number of months to keep, counting the current one. Default is 12.
+        drop (bool, optional): Drop the detached partitions instead of keeping them. Default is False.
+        today (date, optional): Reference date, defaults to today.
+
+    Returns:
+        list: Names of the partitions that were aged out.
+    """
+    cutoff = add_months(today or date.today(), -(keep_months - 1))
+    with engine.begin() as conn:
+        expired = partitions_to_detach(list_partitions(conn), cutoff)
+        for name in expired:
+            conn.execute(text(f'ALTER TABLE relational.sessions DETACH PARTITION relational."{name}";'))
+            if drop:
+                conn.execute(text(f'DROP TABLE relational."{name}";'))
+            else:
+                conn.execute(text(f'ALTER TABLE relational."{name}" RENAME TO "{name}_detached";'))
+            logger.info(f"{'Dropped' if drop else 'Detached'} partition {name} (sessions before {cutoff}).")
+    return expired
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the monthly partitions of relational.sessions.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help="List the attached partitions and their bounds.")
+    ensure = subparsers.add_parser('ensure', help="Create partitions ahead of incoming sessions.")
+    ensure.add_argument('--months-ahead', type=int, default=3)
+    detach = subparsers.add_parser('detach', help="Detach partitions older than the retention window.")
+    detach.add_argument('--keep-months', type=int, default=12)
+    detach.add_argument('--drop', action='store_true', help="Drop detached partitions instead of keeping them.")
+    args = parser.parse_args()
+
+    engine = connect_to_db()
+    if args.command == 'list':
+        with engine.connect() as conn:
+            for name, bound in list_partitions(conn):
+                print(f"{name:<24} {bound}")
+    elif args.command == 'ensure':
+        ensure_partitions(engine, months_ahead=args.months_ahead)
+    else:
+        detach_partitions(engine, keep_months=args.keep_months, drop=args.drop)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+from benchmarks.bench_query_plans import HOT_QUERIES, check, scan_nodes
+
+
+def test_scan_nodes_folds_partitions():
+    plan = {
+        'Node Type': 'Limit',
+        'Plans': [{
+            'Node Type': 'Merge Append',
+            'Plans': [
+                {'Node Type': 'Index Scan', 'Relation Name': 'sessions_2023_05',
+                 'Index Name': 'sessions_2023_05_user_id_start_timestamp_idx'},
+                {'Node Type': 'Index Scan', 'Relation Name': 'sessions_2023_06',
+                 'Index Name': 'sessions_2023_06_user_id_start_timestamp_idx'},
+                {'Node Type': 'Seq Scan', 'Relation Name': 'sessions_default'},
+            ],
+        }],
+    }
+    assert scan_nodes(plan) == [
+        ['Index Scan', 'sessions_*', 'sessions_*_user_id_start_timestamp_idx'],
+        ['Seq Scan', 'sessions_default', None],
+    ]
+
+
+def test_check_flags_forbidden_seq_scans_plan_changes_and_slowdowns():
+    index_scan = [['Index Scan', 'sessions_*', 'sessions_*_user_id_start_timestamp_idx']]
+    baseline = {'small': {'last_n_sessions': {'p50_ms': 2.0, 'p95_ms': 3.0, 'scans': index_scan}}}
+    assert 'sessions' in HOT_QUERIES['last_n_sessions']['forbid_seq_scan']
+
+    same = {'small': {'last_n_sessions': {'p50_ms': 3.5, 'p95_ms': 5.0, 'scans': index_scan}}}
+    assert check(same, baseline) == []
+
+    slower = {'small': {'last_n_sessions': {'p50_ms': 4.5, 'p95_ms': 6.0, 'scans': index_scan}}}
+    assert len(check(slower, baseline)) == 1
+
+    seq_scan = {'small': {'last_n_sessions': {'p50_ms': 2.0, 'p95_ms': 3.0,
+                                              'scans': [['Seq Scan', 'sessions_*', None]]}}}
+    regressions = check(seq_scan, baseline)
+    assert any('sequential scan on sessions_*' in message for message in regressions)
+    assert any('plan changed' in message for message in regressions)
+    # Without a baseline only the forbidden sequential scans are checked.
+    assert len(check(seq_scan)) == 1
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from etl import create_title_df, fill_main_genre, fill_main_production
+from benchmarks.bench_title_transform import legacy_create_title_df, legacy_fill_main, make_frames
+
+
+@pytest.fixture
+def golden_inputs():
+    merged_df = pd.DataFrame({
+        'content_id': ['ts1 ', 'tm2', 'tm3'],
+        'title': [' Dark', 'Okja', 'Roma '],
+        'release_year': [2017, 2017, 2018],
+        'type': ['SHOW', 'MOVIE ', 'MOVIE'],
+        'age_certification': ['TV-MA', np.nan, ' R'],
+        'runtime': [60, 121, 135],
+        'number_of_seasons': [3.0, np.nan, np.nan],
+        'imdb_id': ['tt5753856', 'tt3967856', 'tt6155172'],
+        'score': [8.7, 7.3, 7.7],
+        'imdb_votes': [384985.0, 112356.0, np.nan],
+        'main_genre': [np.nan, 'drama', np.nan],
+        'main_genre_best_shows': ['scifi', np.nan, np.nan],
+        'main_genre_best_movies_yearly': ['crime', 'action', np.nan],
+        'main_genre_best_shows_yearly': [np.nan, np.nan, 'drama'],
+        'main_production': [np.nan, np.nan, 'MX'],
+        'main_production_best_shows': [np.nan, np.nan, np.nan],
+        'main_production_best_movies_yearly': [np.nan, 'KR', 'US'],
+        'main_production_best_shows_yearly': ['DE', np.nan, np.nan],
+    })
+    best_movies_df = pd.DataFrame({'title': ['Roma ']})
+    best_shows_df = pd.DataFrame({'title': [' Dark']})
+    best_movies_yearly_df = pd.DataFrame({'title': ['Okja']})
+    best_shows_yearly_df = pd.DataFrame({'title': [' Dark']})
+    return merged_df, best_movies_df, best_shows_df, best_movies_yearly_df, best_shows_yearly_df
+
+
+def test_fill_main_columns_golden(golden_inputs):
+    merged_df = fill_main_production(fill_main_genre(golden_inputs[0]))
+    assert merged_df['main_genre'].tolist() == ['scifi', 'drama', 'drama']
+    assert merged_df['main_production'].tolist() == ['DE', 'KR', 'MX']
+
+
+def test_create_title_df_golden(golden_inputs):
+    title_df = create_title_df(*golden_inputs)
+    expected = pd.DataFrame({
+        'content_id': ['ts1', 'tm2', 'tm3'],
+        'title': ['Dark', 'Okja', 'Roma'],
+        'release_year': [2017, 2017, 2018],
+        'content_type': ['SHOW', 'MOVIE', 'MOVIE'],
+        'age_certification': ['TV-MA', np.nan, 'R'],
+        'runtime': [60, 121, 135],
+        'number_of_seasons': [3.0, np.nan, np.nan],
+        'imdb_id': ['tt5753856', 'tt3967856', 'tt6155172'],
+        'imdb_score': [8.7, 7.3, 7.7],
+        'imdb_votes': [384985.0, 112356.0, np.nan],
+        'is_year_best': [True, True, False],
+        'is_all_time_best': [True, False, True],
+    })
+    pd.testing.assert_frame_equal(title_df, expected)
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_title_transform_matches_legacy(seed):
+    merged_df, *best_dfs = make_frames(2_000, seed=seed)
+    for column in ['main_genre', 'main_production']:
+        pd.testing.assert_frame_equal(
+            {'main_genre': fill_main_genre, 'main_production': fill_main_production}[column](merged_df.copy()),
+            legacy_fill_main(merged_df.copy(), column),
+        )
+    pd.testing.assert_frame_equal(create_title_df(merged_df, *best_dfs), legacy_create_title_df(merged_df, *best_dfs))
+
+
+def test_create_title_df_keeps_categoricals(golden_inputs):
+    merged_df, *best_dfs = golden_inputs
+    merged_df = merged_df.astype({'type': 'category', 'age_certification': 'category'})
+    title_df = create_title_df(merged_df, *best_dfs)
+    assert title_df['content_type'].dtype == 'category'
+    assert title_df['content_type'].tolist() == ['SHOW', 'MOVIE', 'MOVIE']
+    assert title_df['age_certification'].astype(object).tolist()[::2] == ['TV-MA', 'R']
@@ -0,0 +1,33 @@
+from datetime import date, datetime
+
+import pytest
+
+from session_partitions import add_months, parse_bound, partitions_to_detach
+
+PARTITIONS = [
+    ('sessions_2023_08', "FOR VALUES FROM ('2023-08-01 00:00:00') TO ('2023-09-01 00:00:00')"),
+    ('sessions_2023_07', "FOR VALUES FROM ('2023-07-01 00:00:00') TO ('2023-08-01 00:00:00')"),
+    ('sessions_2023_09', "FOR VALUES FROM ('2023-09-01 00:00:00') TO ('2023-10-01 00:00:00')"),
+    ('sessions_default', "DEFAULT"),
+]
+
+
+@pytest.mark.parametrize('month, months, expected', [
+    (date(2023, 9, 17), 0, date(2023, 9, 1)),
+    (date(2023, 11, 30), 3, date(2024, 2, 1)),
+    (date(2023, 1, 31), -1, date(2022, 12, 1)),
+    (date(2023, 9, 1), -12, date(2022, 9, 1)),
+])
+def test_add_months(month, months, expected):
+    assert add_months(month, months) == expected
+
+
+def test_parse_bound():
+    assert parse_bound(PARTITIONS[0][1]) == (datetime(2023, 8, 1), datetime(2023, 9, 1))
+    assert parse_bound("DEFAULT") is None
+
+
+def test_partitions_to_detach_keeps_current_window_and_default():
+    assert partitions_to_detach(PARTITIONS, date(2023, 9, 1)) == ['sessions_2023_07', 'sessions_2023_08']
+    assert partitions_to_detach(PARTITIONS, date(2023, 8, 15)) == ['sessions_2023_07']
+    assert partitions_to_detach(PARTITIONS, date(2023, 7, 1)) == []